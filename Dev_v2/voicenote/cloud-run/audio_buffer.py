@@ -0,0 +1,98 @@
+"""
+ジョブ単位の共有音声バッファ
+音声を一度だけ16kHzモノラルfloat32にデコードし、/tmp上にメモリマップして各段階で共有する
+"""
+import os
+import logging
+import tempfile
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TARGET_SAMPLE_RATE = 16000
+BUFFER_DTYPE = np.float32
+
+
+class AudioBuffer:
+    """デコード済み音声のメモリマップバッファ（ゼロコピーでビューを提供）"""
+
+    def __init__(self, buffer_path: str, sample_rate: int = TARGET_SAMPLE_RATE, owned: bool = True):
+        self.buffer_path = buffer_path
+        self.sample_rate = sample_rate
+        self.owned = owned
+        # copy-on-writeで開くことで、torch.from_numpyでも元ファイルを書き換えない
+        self.samples = np.memmap(buffer_path, dtype=BUFFER_DTYPE, mode="c")
+
+    @classmethod
+    def from_file(
+        cls,
+        audio_path: str,
+        work_dir: Optional[str] = None,
+        sample_rate: int = TARGET_SAMPLE_RATE
+    ) -> "AudioBuffer":
+        """音声ファイルを一度だけデコードしてバッファを作成"""
+        import librosa
+
+        base_name = os.path.splitext(os.path.basename(audio_path))[0]
+        if work_dir:
+            os.makedirs(work_dir, exist_ok=True)
+            buffer_path = os.path.join(work_dir, f"{base_name}_{sample_rate}.f32")
+        else:
+            # 作業ディレクトリの指定がない場合は同時実行ジョブと衝突しない一意な名前にする
+            fd, buffer_path = tempfile.mkstemp(prefix=f"{base_name}_", suffix=f"_{sample_rate}.f32")
+            os.close(fd)
+
+        audio, _ = librosa.load(audio_path, sr=sample_rate, mono=True, dtype=BUFFER_DTYPE)
+        if len(audio) == 0:
+            raise ValueError(f"Audio file contains no samples: {audio_path}")
+
+        mapped = np.memmap(buffer_path, dtype=BUFFER_DTYPE, mode="w+", shape=(len(audio),))
+        mapped[:] = audio
+        mapped.flush()
+        del mapped, audio
+
+        logger.info(f"Decoded audio into shared buffer: {buffer_path}")
+        return cls(buffer_path, sample_rate)
+
+    @property
+    def num_samples(self) -> int:
+        return int(self.samples.shape[0])
+
+    @property
+    def duration(self) -> float:
+        """音声時間（秒）"""
+        return self.num_samples / self.sample_rate
+
+    def sample_index(self, seconds: float) -> int:
+        """秒をサンプル位置に変換（範囲内に丸める）"""
+        return min(max(int(round(seconds * self.sample_rate)), 0), self.num_samples)
+
+    def view(self, start_time: float = 0.0, end_time: Optional[float] = None) -> np.ndarray:
+        """指定区間のゼロコピービューを取得"""
+        start = self.sample_index(start_time)
+        end = self.num_samples if end_time is None else self.sample_index(end_time)
+        return self.samples[start:max(start, end)]
+
+    def as_tensor(self, start_time: float = 0.0, end_time: Optional[float] = None):
+        """指定区間を (1, samples) のtorch.Tensorとして取得（ゼロコピー）"""
+        import torch
+
+        return torch.from_numpy(self.view(start_time, end_time)).unsqueeze(0)
+
+    def as_pipeline_input(self, start_time: float = 0.0, end_time: Optional[float] = None) -> Dict[str, Any]:
+        """pyannote.audioにそのまま渡せる {"waveform": (1, samples), "sample_rate"} 形式（ゼロコピー）"""
+        return {"waveform": self.as_tensor(start_time, end_time), "sample_rate": self.sample_rate}
+
+    def release(self):
+        """バッファを解放し、所有している場合はファイルを削除"""
+        if self.samples is None:
+            return
+
+        self.samples = None
+        if self.owned:
+            try:
+                os.unlink(self.buffer_path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,267 @@
+"""
+ブロック単位のストリーミング音声前処理
+16kHzモノラルへの早期変換、窓単位のノイズ除去、2パスのピーク正規化をファイル長に依存しないメモリ量で行う
+"""
+import os
+import math
+import logging
+import tempfile
+from typing import Dict, Any, Callable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from audio_buffer import AudioBuffer, TARGET_SAMPLE_RATE, BUFFER_DTYPE
+from ranged_download import RangedDownload
+
+logger = logging.getLogger(__name__)
+
+DECODE_BLOCK_SECONDS = 10.0
+NOISE_WINDOW_SECONDS = float(os.environ.get("PREPROCESS_WINDOW_SECONDS", 30.0))
+NOISE_OVERLAP_SECONDS = float(os.environ.get("PREPROCESS_OVERLAP_SECONDS", 1.0))
+
+# 処理内容を変更した場合は更新する（前処理キャッシュのキーに含まれる）
+PREPROCESS_VERSION = 2
+
+# 正規化を行わない最小ピーク（librosa.util.normalizeの閾値相当）
+MIN_PEAK = np.finfo(np.float32).tiny
+
+
+def reduce_noise(window: np.ndarray, sample_rate: int) -> np.ndarray:
+    """1窓分のノイズ除去"""
+    import noisereduce as nr
+
+    return nr.reduce_noise(y=window, sr=sample_rate)
+
+
+def open_source_blocks(download: RangedDownload, block_seconds: float = DECODE_BLOCK_SECONDS) -> Tuple[int, Iterator[np.ndarray]]:
+    """ダウンロード中の音声をモノラルfloat32ブロックとして逐次デコード（サンプリングレート, ブロック列）"""
+    import soundfile as sf
+
+    reader = download.open_reader()
+    try:
+        sound_file = sf.SoundFile(reader)
+    except Exception as e:
+        reader.close()
+        # libsndfileが扱えない形式（mp3, m4a等）は完了を待ってaudioreadで逐次デコード
+        logger.info(f"Streaming decode unavailable, waiting for full download: {e}")
+        download.wait_for_bytes(download.size)
+        return _open_audioread_blocks(download.local_path)
+
+    def blocks():
+        with reader, sound_file:
+            block_frames = max(1, int(sound_file.samplerate * block_seconds))
+            for block in sound_file.blocks(blocksize=block_frames, dtype="float32", always_2d=True):
+                yield block.mean(axis=1, dtype=BUFFER_DTYPE)
+
+    return sound_file.samplerate, blocks()
+
+
+def _open_audioread_blocks(audio_path: str) -> Tuple[int, Iterator[np.ndarray]]:
+    import audioread
+
+    audio_file = audioread.audio_open(audio_path)
+
+    def blocks():
+        with audio_file:
+            for buffer in audio_file:
+                samples = np.frombuffer(buffer, dtype="<i2").astype(BUFFER_DTYPE) / 32768.0
+                yield samples.reshape(-1, audio_file.channels).mean(axis=1, dtype=BUFFER_DTYPE)
+
+    return audio_file.samplerate, blocks()
+
+
+class StreamingResampler:
+    """ブロック境界の前後に文脈サンプルを付けてresample_polyを適用する逐次リサンプラー"""
+
+    def __init__(self, source_rate: int, target_rate: int, context_samples: int = 1024):
+        gcd = math.gcd(source_rate, target_rate)
+        self.up = target_rate // gcd
+        self.down = source_rate // gcd
+        # 出力サンプル位置が整数になるよう、文脈長と処理境界はdownの倍数に揃える
+        self.context = self.down * max(1, math.ceil(context_samples / self.down))
+        self._buffer = np.zeros(0, dtype=BUFFER_DTYPE)
+        self._buffer_start = 0  # バッファ先頭の入力サンプル位置
+        self._consumed = 0  # 出力済みの入力サンプル数
+        self._emitted = 0  # 出力済みサンプル数
+
+    def process(self, block: np.ndarray, final: bool = False) -> np.ndarray:
+        """入力ブロックを追加し、確定した出力サンプルを返す"""
+        if self.up == self.down:
+            return block
+
+        from scipy.signal import resample_poly
+
+        self._buffer = np.concatenate([self._buffer, block])
+        total = self._buffer_start + len(self._buffer)
+
+        if final:
+            emit_end = total
+            output_end = math.ceil(total * self.up / self.down)
+        else:
+            emit_end = (total - self.context) // self.down * self.down
+            output_end = emit_end * self.up // self.down
+
+        if emit_end <= self._consumed:
+            return np.zeros(0, dtype=BUFFER_DTYPE)
+
+        context_start = max(self._buffer_start, self._consumed - self.context)
+        context_end = min(total, emit_end + self.context)
+        resampled = resample_poly(
+            self._buffer[context_start - self._buffer_start:context_end - self._buffer_start],
+            self.up,
+            self.down
+        )
+
+        offset = (self._consumed - context_start) * self.up // self.down
+        output = resampled[offset:offset + output_end - self._emitted].astype(BUFFER_DTYPE)
+
+        self._consumed = emit_end
+        self._emitted = output_end
+
+        # 次の処理に必要な文脈のみ保持
+        keep_from = max(self._buffer_start, self._consumed - self.context)
+        self._buffer = self._buffer[keep_from - self._buffer_start:]
+        self._buffer_start = keep_from
+
+        return output
+
+
+class WindowedNoiseReducer:
+    """重なり付きの窓毎にノイズ除去し、重なり部分をクロスフェードで接合"""
+
+    def __init__(self, reduce_fn: Callable[[np.ndarray], np.ndarray], window_samples: int, overlap_samples: int):
+        if not 0 <= overlap_samples < window_samples:
+            raise ValueError(f"Overlap ({overlap_samples}) must be shorter than the window ({window_samples})")
+
+        self.reduce_fn = reduce_fn
+        self.window = window_samples
+        self.overlap = overlap_samples
+        self._buffer = np.zeros(0, dtype=BUFFER_DTYPE)
+        self._tail: Optional[np.ndarray] = None  # 前の窓の重なり部分（処理済み）
+        self._fade_in = np.linspace(0.0, 1.0, overlap_samples, dtype=BUFFER_DTYPE)
+
+    def process(self, samples: np.ndarray, final: bool = False) -> np.ndarray:
+        """サンプルを追加し、確定した出力サンプルを返す"""
+        self._buffer = np.concatenate([self._buffer, samples])
+        hop = self.window - self.overlap
+        outputs = []
+
+        # 最後の窓が短くなりすぎないよう、窓1つ分以上を残して処理する
+        while len(self._buffer) >= self.window + hop:
+            outputs.append(self._reduce(self._buffer[:self.window], keep_tail=True))
+            self._buffer = self._buffer[hop:]
+
+        if final and len(self._buffer) > 0:
+            if self._tail is not None and len(self._buffer) <= self.overlap:
+                outputs.append(self._tail)
+            else:
+                outputs.append(self._reduce(self._buffer, keep_tail=False))
+            self._buffer = np.zeros(0, dtype=BUFFER_DTYPE)
+            self._tail = None
+
+        if not outputs:
+            return np.zeros(0, dtype=BUFFER_DTYPE)
+        return np.concatenate(outputs)
+
+    def _reduce(self, window: np.ndarray, keep_tail: bool) -> np.ndarray:
+        # 入力バッファを書き換えないよう複製（reduce_fnが入力をそのまま返す場合）
+        reduced = np.array(self.reduce_fn(window), dtype=BUFFER_DTYPE)
+
+        if self._tail is not None and self.overlap:
+            # 前の窓と同じ値なら丸め誤差なくそのまま残る形でクロスフェード
+            head = reduced[:self.overlap]
+            reduced[:self.overlap] = self._tail + (head - self._tail) * self._fade_in
+
+        if not keep_tail:
+            return reduced
+
+        self._tail = reduced[len(reduced) - self.overlap:].copy()
+        return reduced[:len(reduced) - self.overlap]
+
+
+class StreamingPreprocessor:
+    """ストリーミング前処理（1パス目: デコード・リサンプル・ノイズ除去、2パス目: ピーク正規化）"""
+
+    def __init__(
+        self,
+        work_dir: str,
+        sample_rate: int = TARGET_SAMPLE_RATE,
+        window_seconds: float = NOISE_WINDOW_SECONDS,
+        overlap_seconds: float = NOISE_OVERLAP_SECONDS,
+        block_seconds: float = DECODE_BLOCK_SECONDS
+    ):
+        self.work_dir = work_dir
+        self.sample_rate = sample_rate
+        self.window_samples = int(window_seconds * sample_rate)
+        self.overlap_samples = int(overlap_seconds * sample_rate)
+        self.block_seconds = block_seconds
+        # 共有音声バッファのバッキングファイル（first_passで毎回新しく作成）
+        self.buffer_path: Optional[str] = None
+        self.num_samples = 0
+
+    def cache_params(self) -> Dict[str, Any]:
+        """出力に影響するパラメータ（前処理キャッシュのキー用）"""
+        return {
+            "version": PREPROCESS_VERSION,
+            "sample_rate": self.sample_rate,
+            "window_samples": self.window_samples,
+            "overlap_samples": self.overlap_samples
+        }
+
+    def first_pass(self, download: RangedDownload) -> float:
+        """デコード・16kHzモノラル化・ノイズ除去を行いバッファファイルへ逐次書き込み（ピーク値を返す）"""
+        source_rate, blocks = open_source_blocks(download, self.block_seconds)
+        resampler = StreamingResampler(source_rate, self.sample_rate)
+        reducer = WindowedNoiseReducer(
+            lambda window: reduce_noise(window, self.sample_rate),
+            self.window_samples,
+            self.overlap_samples
+        )
+
+        peak = 0.0
+        self.num_samples = 0
+
+        # 前回の実行のバッファは前処理キャッシュからハードリンクされている場合があるため、
+        # 既存ファイルを上書き・切り詰めせず、実行毎に一意な新しいファイルへ書き込む
+        fd, self.buffer_path = tempfile.mkstemp(
+            prefix="processed_", suffix=f"_{self.sample_rate}.f32", dir=self.work_dir
+        )
+
+        with os.fdopen(fd, "wb") as buffer_file:
+            def write(samples: np.ndarray):
+                nonlocal peak
+                if len(samples) == 0:
+                    return
+                peak = max(peak, float(np.max(np.abs(samples))))
+                buffer_file.write(samples.astype(BUFFER_DTYPE, copy=False).tobytes())
+                self.num_samples += len(samples)
+
+            for block in blocks:
+                write(reducer.process(resampler.process(block)))
+            write(reducer.process(resampler.process(np.zeros(0, dtype=BUFFER_DTYPE), final=True), final=True))
+
+        if self.num_samples == 0:
+            raise ValueError(f"Audio file contains no samples: {download.local_path}")
+
+        logger.info(f"Noise reduction completed: {self.num_samples} samples at {self.sample_rate}Hz (source {source_rate}Hz)")
+        return peak
+
+    def second_pass(self, peak: float):
+        """バッファファイルをブロック毎にピーク正規化（以降の段階はすべてこのバッファを参照する）"""
+        scale = 1.0 / peak if peak > MIN_PEAK else 1.0
+        if scale == 1.0:
+            return
+
+        block_samples = int(self.block_seconds * self.sample_rate)
+        samples = np.memmap(self.buffer_path, dtype=BUFFER_DTYPE, mode="r+")
+
+        try:
+            for start in range(0, len(samples), block_samples):
+                samples[start:start + block_samples] *= scale
+            samples.flush()
+        finally:
+            del samples
+
+    def buffer(self) -> AudioBuffer:
+        """正規化済みバッファファイルを共有音声バッファとして開く"""
+        return AudioBuffer(self.buffer_path, self.sample_rate)
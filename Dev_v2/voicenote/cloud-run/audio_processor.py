@@ -2,21 +2,39 @@
 音声処理の統合クラス
 全体の処理フローを管理し、各段階を協調させる
 """
+import os
+import shutil
 import asyncio
 import logging
+import threading
 import time
 from typing import Dict, Any, Optional, List
 from pathlib import Path
 
-from google.cloud import firestore, storage
 from pydantic import BaseModel
 
-from speaker_separation import SpeakerSeparationService
+from audio_buffer import AudioBuffer
+from audio_preprocessing import StreamingPreprocessor
+from chunk_manifest import ChunkManifest, ChunkSpec
+from preprocess_cache import PreprocessCache
+from progress_reporter import ProgressReporter
+from ranged_download import RangedDownload
+from segment_intervals import SegmentIntervalIndex, SegmentOverlapMerger
+from speaker_gallery import SpeakerGalleryService
+from speaker_identification import user_embedding_from_profile
+from storage_backend import StorageBackend, GCPStorageBackend, audio_document_path
 from transcription_apis import TranscriptionService, APIConfig
-from voice_learning import VoiceLearningService
 
 logger = logging.getLogger(__name__)
 
+# ジョブ毎の作業ディレクトリ（失敗時はダウンロード途中の音声と進捗のみ残し、再試行時に再開する）
+JOB_WORK_ROOT = os.environ.get("JOB_WORK_DIR", "/tmp/voicenote-jobs")
+SOURCE_FILE_NAME = "source"
+RESUMABLE_FILE_NAMES = (SOURCE_FILE_NAME, f"{SOURCE_FILE_NAME}.state.json")
+# 再試行されないまま残った作業ディレクトリの保持期間
+JOB_WORK_TTL_SECONDS = float(os.environ.get("JOB_WORK_TTL_SECONDS", 24 * 3600))
+AUDIO_BUCKET_NAME = "voicenote-audio-storage"
+
 class ProcessingProgress(BaseModel):
     stage: str
     progress: int
@@ -33,21 +51,56 @@ class ProcessingResult(BaseModel):
 class AudioProcessor:
     """音声処理統合クラス"""
     
-    def __init__(self):
-        self.db = firestore.Client()
-        self.storage_client = storage.Client()
-        self.speaker_service = SpeakerSeparationService()
+    def __init__(self, storage_backend: Optional[StorageBackend] = None):
+        self.storage = storage_backend or GCPStorageBackend()
+        self.progress_reporter = ProgressReporter(self.storage)
+        self.preprocess_cache = PreprocessCache()
+        self.speaker_gallery = SpeakerGalleryService(self.storage)
         self.transcription_service = TranscriptionService()
-        self.voice_learning_service = VoiceLearningService()
+        # 話者分離・音声学習サービスはtorch/pyannoteを読み込むため、初回利用時に作成
+        self._speaker_service = None
+        self._voice_learning_service = None
+        self._service_lock = threading.Lock()
+        # 実行中ジョブの作業ディレクトリ（期限切れ削除の対象外）
+        self._active_work_dirs = set()
         self.initialized = False
     
+    @property
+    def speaker_service(self):
+        """話者分離サービス"""
+        with self._service_lock:
+            if self._speaker_service is None:
+                from speaker_separation import SpeakerSeparationService
+                self._speaker_service = SpeakerSeparationService()
+            return self._speaker_service
+    
+    @property
+    def voice_learning_service(self):
+        """音声学習サービス"""
+        with self._service_lock:
+            if self._voice_learning_service is None:
+                from voice_learning import VoiceLearningService
+                self._voice_learning_service = VoiceLearningService()
+            return self._voice_learning_service
+    
+    def _create_ml_services(self):
+        self.speaker_service
+        self.voice_learning_service
+    
+    def shutdown(self):
+        """作成済みのサービスを終了（話者分離ワーカープール等）"""
+        if self._speaker_service is not None:
+            self._speaker_service.shutdown()
+    
     async def initialize(self):
-        """サービス初期化"""
+        """サービス初期化（ML系ライブラリの読み込みはイベントループを止めないようエグゼキューターで行う）"""
         if self.initialized:
             return
             
         try:
             logger.info("Initializing AudioProcessor...")
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self._create_ml_services)
             await self.speaker_service.initialize()
             await self.transcription_service.initialize()
             await self.voice_learning_service.initialize()
@@ -65,32 +118,39 @@ class AudioProcessor:
     ) -> ProcessingResult:
         """メイン音声処理フロー"""
         start_time = time.time()
+        audio_buffer = None
+        succeeded = False
+        self._purge_stale_work_dirs()
+        work_dir = self._job_work_dir(user_id, audio_id)
+        self._active_work_dirs.add(work_dir)
         
         try:
+            # 初回の処理リクエストでモデルを読み込む（起動時に読み込み済みなら何もしない）
+            await self.initialize()
+            
             await self._update_status(user_id, audio_id, "preprocessing", 5, "前処理を開始しています...")
             
-            # Phase 0: 音声前処理
-            audio_path = await self._download_audio_file(user_id, audio_id)
-            processed_audio_path = await self._preprocess_audio(audio_path, user_id, audio_id)
+            # Phase 0: 音声前処理（前処理済み音声のバッファを以降の全段階で共有）
+            audio_buffer = await self._prepare_audio(user_id, audio_id, work_dir)
             
             await self._update_status(user_id, audio_id, "speaker_analysis", 20, "話者分析を開始しています...")
             
             # Phase 1: 話者分析
             speaker_analysis = await self._analyze_speakers(
-                processed_audio_path, 
+                audio_buffer, 
                 user_id, 
                 audio_id, 
                 config
             )
             
             # Phase 2: 音声長によって処理方式を決定
-            audio_duration = await self._get_audio_duration(processed_audio_path)
+            audio_duration = audio_buffer.duration
             should_chunk = audio_duration > config.get("chunk_threshold", 1800)  # 30分
             
             if should_chunk:
                 await self._update_status(user_id, audio_id, "chunk_processing", 40, "チャンク分割処理を開始しています...")
                 transcription_result = await self._process_with_chunks(
-                    processed_audio_path,
+                    audio_buffer,
                     speaker_analysis,
                     user_id,
                     audio_id,
@@ -99,7 +159,7 @@ class AudioProcessor:
             else:
                 await self._update_status(user_id, audio_id, "transcribing", 60, "文字起こしを開始しています...")
                 transcription_result = await self._process_direct_transcription(
-                    processed_audio_path,
+                    audio_buffer,
                     speaker_analysis,
                     user_id,
                     audio_id,
@@ -126,6 +186,7 @@ class AudioProcessor:
             )
             
             await self._update_status(user_id, audio_id, "completed", 100, "処理が完了しました")
+            succeeded = True
             
             return result
             
@@ -133,52 +194,167 @@ class AudioProcessor:
             logger.error(f"Audio processing failed: {e}")
             await self._update_status(user_id, audio_id, "error", 0, f"処理中にエラーが発生しました: {str(e)}")
             raise
+        
+        finally:
+            if audio_buffer is not None:
+                audio_buffer.release()
+            self._cleanup_work_dir(work_dir, succeeded)
+            self._active_work_dirs.discard(work_dir)
+    
+    def _job_work_dir(self, user_id: str, audio_id: str) -> str:
+        """ジョブ毎の作業ディレクトリ（同時実行ジョブ間でファイルを共有しない）"""
+        work_dir = os.path.join(JOB_WORK_ROOT, user_id, audio_id)
+        os.makedirs(work_dir, exist_ok=True)
+        return work_dir
     
-    async def _download_audio_file(self, user_id: str, audio_id: str) -> str:
-        """Cloud Storageから音声ファイルをダウンロード"""
+    def _cleanup_work_dir(self, work_dir: str, succeeded: bool):
+        """ジョブ終了時の作業ディレクトリ整理（失敗時はダウンロード再開に必要なファイルのみ残す）"""
+        if succeeded:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return
+        
         try:
-            bucket_name = "voicenote-audio-storage"
-            file_path = f"users/{user_id}/audios/{audio_id}"
+            entries = list(os.scandir(work_dir))
+        except OSError:
+            return
+        
+        for entry in entries:
+            if entry.name in RESUMABLE_FILE_NAMES:
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.unlink(entry.path)
+            except OSError as e:
+                logger.warning(f"Failed to remove work file {entry.path}: {e}")
+    
+    def _purge_stale_work_dirs(self, now: Optional[float] = None):
+        """再試行されずに保持期間を過ぎた作業ディレクトリを削除（実行中のジョブは除く）"""
+        now = time.time() if now is None else now
+        if not os.path.isdir(JOB_WORK_ROOT):
+            return
+        
+        for user_entry in os.scandir(JOB_WORK_ROOT):
+            if not user_entry.is_dir(follow_symlinks=False):
+                continue
             
-            bucket = self.storage_client.bucket(bucket_name)
-            blob = bucket.blob(file_path)
+            for job_entry in os.scandir(user_entry.path):
+                if not job_entry.is_dir(follow_symlinks=False) or job_entry.path in self._active_work_dirs:
+                    continue
+                
+                try:
+                    # 最後に書き込まれたファイルの時刻を基準にする
+                    last_modified = max(
+                        [job_entry.stat().st_mtime] + [entry.stat().st_mtime for entry in os.scandir(job_entry.path)]
+                    )
+                except OSError:
+                    continue
+                
+                if now - last_modified > JOB_WORK_TTL_SECONDS:
+                    logger.info(f"Removing stale work directory: {job_entry.path}")
+                    shutil.rmtree(job_entry.path, ignore_errors=True)
+            
+            try:
+                os.rmdir(user_entry.path)
+            except OSError:
+                pass  # 他のジョブが残っている
+    
+    async def _prepare_audio(self, user_id: str, audio_id: str, work_dir: str) -> AudioBuffer:
+        """前処理済み音声の取得（同じ内容・同じ前処理設定のキャッシュがあればダウンロードと前処理を省略）"""
+        loop = asyncio.get_event_loop()
+        preprocessor = StreamingPreprocessor(work_dir)
+        metadata = await self.storage.get_blob_metadata(AUDIO_BUCKET_NAME, self._audio_blob_path(user_id, audio_id))
+        
+        content_hash = self.preprocess_cache.content_hash_from_metadata(metadata)
+        if content_hash:
+            cache_key = self.preprocess_cache.make_key(content_hash, preprocessor.cache_params())
+            cached = self.preprocess_cache.lookup(cache_key)
+            if cached:
+                await self._update_status(user_id, audio_id, "preprocessing", 15, "前処理済みの音声を再利用しています...")
+                return cached
+        
+        download = await self._download_audio_file(user_id, audio_id, work_dir, metadata)
+        
+        try:
+            if not content_hash:
+                # メタデータにハッシュがない場合はダウンロード後にローカルで計算
+                local_path = await download.wait()
+                content_hash = await loop.run_in_executor(None, self.preprocess_cache.content_hash_from_file, local_path)
+                cache_key = self.preprocess_cache.make_key(content_hash, preprocessor.cache_params())
+                cached = self.preprocess_cache.lookup(cache_key)
+                if cached:
+                    await self._update_status(user_id, audio_id, "preprocessing", 15, "前処理済みの音声を再利用しています...")
+                    return cached
+            
+            audio_buffer = await self._preprocess_audio(download, preprocessor, user_id, audio_id)
+        except BaseException:
+            # 再試行時に同じスピルファイル・ステートファイルへ書き込むダウンロードが残らないよう停止
+            await download.cancel()
+            raise
+        
+        try:
+            await loop.run_in_executor(
+                None,
+                self.preprocess_cache.store,
+                cache_key,
+                preprocessor.buffer_path
+            )
+        except Exception as e:
+            # キャッシュ登録の失敗は処理を止めない
+            logger.warning(f"Failed to cache preprocessed audio: {e}")
+        
+        return audio_buffer
+    
+    def _audio_blob_path(self, user_id: str, audio_id: str) -> str:
+        return f"users/{user_id}/audios/{audio_id}"
+    
+    async def _download_audio_file(
+        self,
+        user_id: str,
+        audio_id: str,
+        work_dir: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> RangedDownload:
+        """Cloud Storageから音声ファイルをレンジ分割で並列ダウンロード（前回の中断分から再開）"""
+        try:
+            file_path = self._audio_blob_path(user_id, audio_id)
+            local_path = os.path.join(work_dir, SOURCE_FILE_NAME)
             
-            local_path = f"/tmp/{audio_id}"
-            blob.download_to_filename(local_path)
+            download = RangedDownload(self.storage, AUDIO_BUCKET_NAME, file_path, local_path)
+            await download.start(metadata)
             
-            logger.info(f"Downloaded audio file: {local_path}")
-            return local_path
+            logger.info(f"Started ranged download: {file_path} ({download.size} bytes, {download.num_ranges} ranges)")
+            return download
             
         except Exception as e:
             logger.error(f"Failed to download audio file: {e}")
             raise
     
-    async def _preprocess_audio(self, audio_path: str, user_id: str, audio_id: str) -> str:
-        """音声前処理（ノイズ除去、正規化等）"""
+    async def _preprocess_audio(
+        self,
+        download: RangedDownload,
+        preprocessor: StreamingPreprocessor,
+        user_id: str,
+        audio_id: str
+    ) -> AudioBuffer:
+        """音声前処理（ブロック単位のノイズ除去、2パスのピーク正規化）"""
         try:
-            import librosa
-            import noisereduce as nr
-            import soundfile as sf
+            loop = asyncio.get_event_loop()
             
             await self._update_status(user_id, audio_id, "preprocessing", 10, "ノイズ除去中...")
             
-            # 音声読み込み
-            audio_data, sample_rate = librosa.load(audio_path, sr=None)
-            
-            # ノイズ除去
-            reduced_noise = nr.reduce_noise(y=audio_data, sr=sample_rate)
+            # デコード・16kHzモノラル化・ノイズ除去（ダウンロードと並行）
+            peak = await loop.run_in_executor(None, preprocessor.first_pass, download)
+            await download.wait()
             
             await self._update_status(user_id, audio_id, "preprocessing", 15, "音量正規化中...")
             
-            # 音量正規化
-            normalized_audio = librosa.util.normalize(reduced_noise)
-            
-            # 処理済み音声保存
-            processed_path = audio_path.replace('.', '_processed.')
-            sf.write(processed_path, normalized_audio, sample_rate)
+            # 音量正規化（共有バッファを直接書き換え、WAVは書き出さない）
+            await loop.run_in_executor(None, preprocessor.second_pass, peak)
             
-            logger.info(f"Audio preprocessing completed: {processed_path}")
-            return processed_path
+            logger.info(f"Audio preprocessing completed: {preprocessor.buffer_path}")
+            return preprocessor.buffer()
             
         except Exception as e:
             logger.error(f"Audio preprocessing failed: {e}")
@@ -186,7 +362,7 @@ class AudioProcessor:
     
     async def _analyze_speakers(
         self, 
-        audio_path: str, 
+        audio_buffer: AudioBuffer, 
         user_id: str, 
         audio_id: str, 
         config: Dict[str, Any]
@@ -197,15 +373,44 @@ class AudioProcessor:
             user_embedding = await self._get_user_embedding(user_id)
             
             # 話者分離実行
-            speaker_result = await self.speaker_service.analyze_speakers(
-                audio_path,
-                max_speakers=config.get("max_speakers", 5),
-                user_embedding=user_embedding
+            # デコード済みの共有バッファをそのままパイプラインに渡す（再デコード・再リサンプルなし）
+            streaming_threshold = config.get("streaming_diarization_threshold", config.get("chunk_threshold", 1800))
+            
+            if audio_buffer.duration > streaming_threshold:
+                # 長時間音声は窓毎に話者分離し、確定した区間から途中結果を保存
+                async def save_window(window: Dict[str, Any]):
+                    await self._save_speaker_window(user_id, audio_id, window)
+                
+                speaker_result = await self.speaker_service.analyze_speakers_streaming(
+                    audio_buffer.as_pipeline_input(),
+                    max_speakers=config.get("max_speakers", 5),
+                    user_embedding=user_embedding,
+                    on_window=save_window,
+                    min_speakers=config.get("min_speakers", 1),
+                    match_threshold=config.get("streaming_match_threshold")
+                )
+            else:
+                speaker_result = await self.speaker_service.analyze_speakers(
+                    audio_buffer.as_pipeline_input(),
+                    max_speakers=config.get("max_speakers", 5),
+                    user_embedding=user_embedding,
+                    min_speakers=config.get("min_speakers", 1)
+                )
+            
+            # 既知の話者（話者ギャラリー）へ全話者を一括照合して名前を付与
+            speaker_result["global_speakers"] = await self.speaker_gallery.resolve_speakers(
+                user_id, speaker_result.get("global_speakers", [])
             )
             
             # グローバル話者情報をFirestoreに保存
             await self._save_global_speakers(user_id, audio_id, speaker_result)
             
+            # 照合された登録話者への今回の重心の取り込みは明示的に有効化した場合のみ
+            if config.get("update_speaker_gallery", False):
+                await self.speaker_gallery.update_matched_voices(
+                    user_id, audio_id, speaker_result["global_speakers"]
+                )
+            
             return speaker_result
             
         except Exception as e:
@@ -214,7 +419,7 @@ class AudioProcessor:
     
     async def _process_with_chunks(
         self,
-        audio_path: str,
+        audio_buffer: AudioBuffer,
         speaker_analysis: Dict[str, Any],
         user_id: str,
         audio_id: str,
@@ -225,14 +430,14 @@ class AudioProcessor:
             chunk_duration = config.get("chunk_duration", 30)  # 30分
             overlap_duration = config.get("overlap_duration", 5)  # 5分
             
-            # チャンク分割
-            chunks = await self._split_audio_to_chunks(
-                audio_path, 
+            # チャンク分割（境界のみ決定し、音声は共有バッファから直接読む）
+            manifest = await self._split_audio_to_chunks(
+                audio_buffer, 
                 chunk_duration, 
                 overlap_duration
             )
             
-            total_chunks = len(chunks)
+            total_chunks = len(manifest)
             await self._update_status(
                 user_id, 
                 audio_id, 
@@ -242,31 +447,73 @@ class AudioProcessor:
                 total_chunks=total_chunks
             )
             
-            # 各チャンクを並列処理
-            chunk_results = []
-            for i, chunk_path in enumerate(chunks):
-                await self._update_status(
-                    user_id,
-                    audio_id,
-                    "chunk_processing",
-                    50 + (i / total_chunks) * 30,
-                    f"チャンク {i + 1}/{total_chunks} を処理中...",
-                    current_chunk=i + 1,
-                    total_chunks=total_chunks
-                )
-                
-                # チャンク毎の文字起こし
-                chunk_result = await self._transcribe_chunk(
-                    chunk_path,
-                    speaker_analysis,
-                    config
-                )
-                chunk_results.append(chunk_result)
+            # 各チャンクに重なる話者セグメントのみを割り当て
+            chunk_segments = self._assign_segments_to_chunks(
+                manifest,
+                speaker_analysis.get("segments", [])
+            )
             
-            # チャンク結果統合
-            integrated_result = await self._integrate_chunk_results(chunk_results, speaker_analysis)
+            # 各チャンクを並列処理（同時実行数はCPU数とプロバイダー制限で決定）
+            max_parallel = self._get_chunk_concurrency(config)
+            max_retries = config.get("chunk_max_retries", 2)
+            semaphore = asyncio.Semaphore(max_parallel)
+            logger.info(f"Processing {total_chunks} chunks with concurrency {max_parallel}")
+            
+            async def run_chunk(index: int, chunk: ChunkSpec):
+                async with semaphore:
+                    chunk_result = await self._transcribe_chunk_with_retry(
+                        audio_buffer,
+                        chunk,
+                        chunk_segments[index],
+                        config,
+                        max_retries
+                    )
+                    return index, chunk_result
+            
+            tasks = [
+                asyncio.create_task(run_chunk(i, chunk))
+                for i, chunk in enumerate(manifest)
+            ]
+            
+            # 完了したチャンクから順次統合（重複除去の優先順位を保つためチャンク順に適用）
+            global_speaker_mapping = speaker_analysis.get("global_speaker_mapping", {})
+            integrated_segments = []
+            # 同一話者の重複のみ除去（別話者の同時発話は残す）
+            merger = SegmentOverlapMerger(group_key="speaker_id")
+            pending_results = {}
+            next_index = 0
+            completed = 0
+            
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    index, chunk_result = await finished
+                    pending_results[index] = chunk_result
+                    completed += 1
+                    
+                    while next_index in pending_results:
+                        self._merge_chunk_result(
+                            pending_results.pop(next_index),
+                            integrated_segments,
+                            merger,
+                            global_speaker_mapping
+                        )
+                        next_index += 1
+                    
+                    await self._update_status(
+                        user_id,
+                        audio_id,
+                        "chunk_processing",
+                        50 + (completed / total_chunks) * 30,
+                        f"チャンク {completed}/{total_chunks} の処理が完了しました",
+                        current_chunk=completed,
+                        total_chunks=total_chunks
+                    )
+            finally:
+                for task in tasks:
+                    task.cancel()
             
-            return integrated_result
+            # チャンク結果統合
+            return self._finalize_integrated_segments(integrated_segments)
             
         except Exception as e:
             logger.error(f"Chunk processing failed: {e}")
@@ -274,7 +521,7 @@ class AudioProcessor:
     
     async def _process_direct_transcription(
         self,
-        audio_path: str,
+        audio_buffer: AudioBuffer,
         speaker_analysis: Dict[str, Any],
         user_id: str,
         audio_id: str,
@@ -288,7 +535,7 @@ class AudioProcessor:
             # 話者セグメントに基づく文字起こし
             segments = speaker_analysis.get("segments", [])
             transcription_results = await self.transcription_service.transcribe_segments_batch(
-                audio_path,
+                audio_buffer,
                 segments,
                 api_config
             )
@@ -305,73 +552,135 @@ class AudioProcessor:
     
     async def _split_audio_to_chunks(
         self, 
-        audio_path: str, 
+        audio_buffer: AudioBuffer, 
         chunk_duration_minutes: int, 
         overlap_minutes: int
-    ) -> List[str]:
-        """音声をチャンクに分割"""
+    ) -> ChunkManifest:
+        """音声をチャンクに分割（境界のみを決め、各段階は共有バッファの区間を直接読む）"""
         try:
-            from pydub import AudioSegment
-            
-            audio = AudioSegment.from_file(audio_path)
-            chunk_duration_ms = chunk_duration_minutes * 60 * 1000
-            overlap_ms = overlap_minutes * 60 * 1000
-            
-            chunks = []
-            start = 0
-            chunk_index = 0
-            
-            while start < len(audio):
-                end = min(start + chunk_duration_ms, len(audio))
-                chunk = audio[start:end]
-                
-                chunk_path = f"/tmp/chunk_{chunk_index}.wav"
-                chunk.export(chunk_path, format="wav")
-                chunks.append(chunk_path)
-                
-                chunk_index += 1
-                start += (chunk_duration_ms - overlap_ms)
+            manifest = ChunkManifest.build(
+                audio_buffer.num_samples,
+                audio_buffer.sample_rate,
+                chunk_duration_minutes * 60,
+                overlap_minutes * 60
+            )
             
-            logger.info(f"Split audio into {len(chunks)} chunks")
-            return chunks
+            logger.info(f"Split audio into {len(manifest)} chunks")
+            return manifest
             
         except Exception as e:
             logger.error(f"Audio splitting failed: {e}")
             raise
     
+    def _assign_segments_to_chunks(
+        self,
+        manifest: ChunkManifest,
+        segments: List[Dict[str, Any]]
+    ) -> List[List[Dict[str, Any]]]:
+        """話者セグメントをチャンクに割り当て（各セグメントは最も重なりの大きいチャンク1つのみ）"""
+        segment_index = SegmentIntervalIndex(segments)
+        best_chunks = {}
+        
+        for chunk in manifest:
+            for segment in segment_index.overlapping(chunk.start_time, chunk.end_time):
+                overlap = (
+                    min(segment.get("end", 0), chunk.end_time) -
+                    max(segment.get("start", 0), chunk.start_time)
+                )
+                
+                # 重なりが同じ場合は先のチャンクを優先
+                current = best_chunks.get(id(segment))
+                if current is None or overlap > current[0]:
+                    best_chunks[id(segment)] = (overlap, chunk.index, segment)
+        
+        assigned_segments = [[] for _ in manifest]
+        for _, chunk_index, segment in best_chunks.values():
+            assigned_segments[chunk_index].append(segment)
+        
+        for chunk_segments in assigned_segments:
+            chunk_segments.sort(key=lambda seg: seg.get("start", 0))
+        
+        logger.info(
+            f"Assigned {len(best_chunks)}/{len(segments)} speaker segments to {len(manifest)} chunks"
+        )
+        return assigned_segments
+    
+    def _get_chunk_concurrency(self, config: Dict[str, Any]) -> int:
+        """チャンク同時処理数を決定（CPU数・設定値・プロバイダーの同時接続上限の最小値）"""
+        api_config = self._to_api_config(config.get("transcription_config"))
+        provider_limit = self.transcription_service.get_max_concurrency(api_config) if api_config else 1
+        configured_limit = config.get(
+            "max_parallel_chunks",
+            int(os.environ.get("MAX_PARALLEL_CHUNKS", 3))
+        )
+        return max(1, min(os.cpu_count() or 1, provider_limit, configured_limit))
+    
+    def _to_api_config(self, api_config: Any) -> Optional[APIConfig]:
+        """辞書形式のAPI設定をAPIConfigに変換"""
+        if not api_config or isinstance(api_config, APIConfig):
+            return api_config
+        
+        return APIConfig(
+            provider=api_config.get("provider", "openai"),
+            api_key=api_config.get("api_key", ""),
+            model=api_config.get("model", "whisper-1"),
+            language=api_config.get("language", "ja-JP"),
+            settings=api_config.get("settings") or {}
+        )
+    
+    async def _transcribe_chunk_with_retry(
+        self,
+        audio_buffer: AudioBuffer,
+        chunk: ChunkSpec,
+        chunk_segments: List[Dict[str, Any]],
+        config: Dict[str, Any],
+        max_retries: int
+    ) -> Dict[str, Any]:
+        """失敗したチャンクのみを個別に再試行"""
+        retry_delay = config.get("chunk_retry_delay", 2.0)
+        
+        for attempt in range(max_retries + 1):
+            chunk_result = await self._transcribe_chunk(audio_buffer, chunk, chunk_segments, config)
+            if chunk_result.get("status") == "completed":
+                return chunk_result
+            
+            if attempt < max_retries:
+                logger.warning(
+                    f"Retrying chunk {chunk.index} ({attempt + 1}/{max_retries}): {chunk_result.get('error')}"
+                )
+                await asyncio.sleep(retry_delay * (2 ** attempt))
+        
+        return chunk_result
+    
     async def _transcribe_chunk(
         self,
-        chunk_path: str,
-        speaker_analysis: Dict[str, Any],
+        audio_buffer: AudioBuffer,
+        chunk: ChunkSpec,
+        chunk_segments: List[Dict[str, Any]],
         config: Dict[str, Any]
     ) -> Dict[str, Any]:
-        """単一チャンクの文字起こし"""
+        """単一チャンクの文字起こし（chunk_segmentsは全体タイムライン上の時刻、音声は共有バッファから切り出す）"""
         try:
-            logger.info(f"Transcribing chunk: {chunk_path}")
+            logger.info(f"Transcribing chunk {chunk.index} ({len(chunk_segments)} segments)")
             
             # API設定取得
-            api_config = config.get("transcription_config")
+            api_config = self._to_api_config(config.get("transcription_config"))
             if not api_config:
                 raise ValueError("Transcription API config not found")
             
-            # チャンク内の話者セグメント取得
-            chunk_segments = speaker_analysis.get("segments", [])
-            
-            # セグメント毎に文字起こし実行
-            transcription_results = []
-            
-            for segment in chunk_segments:
+            # セグメント毎に文字起こし実行（送信ペースはプロバイダー毎のレート制御に任せる）
+            async def transcribe_segment(segment: Dict[str, Any]) -> Dict[str, Any]:
                 try:
-                    # セグメント文字起こし
+                    # バッファは音声全体を保持しているため、チャンク境界をまたぐセグメントも全区間を切り出す
                     result = await self.transcription_service.transcribe_segment(
-                        chunk_path,
+                        audio_buffer,
                         segment.get("start", 0),
                         segment.get("end", 0),
                         api_config
                     )
                     
                     # 話者ラベル付与
-                    result_with_speaker = {
+                    return {
                         "text": result.text,
                         "confidence": result.confidence,
                         "start_time": segment.get("start"),
@@ -381,105 +690,95 @@ class AudioProcessor:
                         "word_timestamps": result.word_timestamps
                     }
                     
-                    transcription_results.append(result_with_speaker)
-                    
                 except Exception as e:
+                    # 再試行・フォールバックでも失敗したセグメントもログに残す
                     logger.error(f"Segment transcription failed: {e}")
-                    # エラーセグメントもログに残す
-                    transcription_results.append({
+                    return {
                         "text": "",
                         "confidence": 0.0,
                         "start_time": segment.get("start"),
                         "end_time": segment.get("end"),
                         "speaker_id": segment.get("speaker"),
                         "error": str(e)
-                    })
+                    }
+            
+            transcription_results = list(await asyncio.gather(
+                *[transcribe_segment(segment) for segment in chunk_segments]
+            ))
             
             return {
-                "chunk_path": chunk_path,
+                "chunk_index": chunk.index,
                 "transcription_results": transcription_results,
-                "speaker_analysis": speaker_analysis,
                 "status": "completed"
             }
             
         except Exception as e:
             logger.error(f"Chunk transcription failed: {e}")
             return {
-                "chunk_path": chunk_path,
+                "chunk_index": chunk.index,
                 "transcription_results": [],
                 "error": str(e),
                 "status": "failed"
             }
     
-    async def _integrate_chunk_results(
+    def _merge_chunk_result(
         self,
-        chunk_results: List[Dict[str, Any]],
-        speaker_analysis: Dict[str, Any]
-    ) -> Dict[str, Any]:
-        """チャンク結果の統合"""
-        try:
-            logger.info(f"Integrating {len(chunk_results)} chunk results")
-            
-            # グローバル話者マッピング取得
-            global_speaker_mapping = speaker_analysis.get("global_speaker_mapping", {})
-            
-            # 統合された転写結果
-            integrated_segments = []
-            
-            # チャンク毎の結果を統合
-            for chunk_result in chunk_results:
-                if chunk_result.get("status") != "completed":
-                    logger.warning(f"Skipping failed chunk: {chunk_result.get('error')}")
-                    continue
-                
-                chunk_transcriptions = chunk_result.get("transcription_results", [])
-                
-                for segment in chunk_transcriptions:
-                    # オーバーラップ重複除去チェック
-                    if self._is_duplicate_segment(segment, integrated_segments):
-                        logger.debug(f"Skipping duplicate segment at {segment.get('start_time')}")
-                        continue
-                    
-                    # グローバル話者IDマッピング適用
-                    local_speaker_id = segment.get("speaker_id")
-                    global_speaker_id = global_speaker_mapping.get(
-                        local_speaker_id, local_speaker_id
-                    )
-                    
-                    # 統合セグメント作成
-                    integrated_segment = {
-                        "text": segment.get("text", ""),
-                        "start_time": segment.get("start_time", 0),
-                        "end_time": segment.get("end_time", 0),
-                        "speaker_id": global_speaker_id,
-                        "confidence": segment.get("confidence", 0.0),
-                        "provider": segment.get("provider", "unknown"),
-                        "word_timestamps": segment.get("word_timestamps", [])
-                    }
-                    
-                    integrated_segments.append(integrated_segment)
-            
-            # 時間順でソート
-            integrated_segments.sort(key=lambda x: x.get("start_time", 0))
-            
-            # 話者別統計計算
-            speaker_stats = self._calculate_speaker_statistics(integrated_segments)
-            
-            # 品質統計計算
-            quality_stats = self._calculate_quality_statistics(integrated_segments)
+        chunk_result: Dict[str, Any],
+        integrated_segments: List[Dict[str, Any]],
+        merger: SegmentOverlapMerger,
+        global_speaker_mapping: Dict[str, Any]
+    ):
+        """単一チャンクの結果を統合済みセグメントに追加"""
+        if chunk_result.get("status") != "completed":
+            logger.warning(f"Skipping failed chunk: {chunk_result.get('error')}")
+            return
+        
+        chunk_transcriptions = chunk_result.get("transcription_results", [])
+        
+        for segment in chunk_transcriptions:
+            # オーバーラップ重複除去チェック
+            if not merger.add_if_unique(segment):
+                logger.debug(f"Skipping duplicate segment at {segment.get('start_time')}")
+                continue
+            
+            # グローバル話者IDマッピング適用
+            local_speaker_id = segment.get("speaker_id")
+            global_speaker_id = global_speaker_mapping.get(
+                local_speaker_id, local_speaker_id
+            )
             
-            return {
-                "segments": integrated_segments,
-                "speaker_statistics": speaker_stats,
-                "quality_statistics": quality_stats,
-                "total_segments": len(integrated_segments),
-                "processing_method": "chunk_integrated",
-                "status": "completed"
+            # 統合セグメント作成
+            integrated_segment = {
+                "text": segment.get("text", ""),
+                "start_time": segment.get("start_time", 0),
+                "end_time": segment.get("end_time", 0),
+                "speaker_id": global_speaker_id,
+                "confidence": segment.get("confidence", 0.0),
+                "provider": segment.get("provider", "unknown"),
+                "word_timestamps": segment.get("word_timestamps", [])
             }
             
-        except Exception as e:
-            logger.error(f"Chunk results integration failed: {e}")
-            raise
+            integrated_segments.append(integrated_segment)
+    
+    def _finalize_integrated_segments(self, integrated_segments: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """統合済みセグメントの整列と統計計算"""
+        # 時間順でソート
+        integrated_segments.sort(key=lambda x: x.get("start_time", 0))
+        
+        # 話者別統計計算
+        speaker_stats = self._calculate_speaker_statistics(integrated_segments)
+        
+        # 品質統計計算
+        quality_stats = self._calculate_quality_statistics(integrated_segments)
+        
+        return {
+            "segments": integrated_segments,
+            "speaker_statistics": speaker_stats,
+            "quality_statistics": quality_stats,
+            "total_segments": len(integrated_segments),
+            "processing_method": "chunk_integrated",
+            "status": "completed"
+        }
     
     async def _integrate_results(
         self,
@@ -494,11 +793,10 @@ class AudioProcessor:
             result_data = {
                 "transcription": transcription_result,
                 "speaker_analysis": speaker_analysis,
-                "updatedAt": firestore.SERVER_TIMESTAMP
+                "updatedAt": self.storage.server_timestamp
             }
             
-            doc_ref = self.db.collection('audios').document(user_id).collection('files').document(audio_id)
-            doc_ref.update(result_data)
+            await self.storage.update_document(audio_document_path(user_id, audio_id), result_data)
             
             return result_data
             
@@ -506,46 +804,6 @@ class AudioProcessor:
             logger.error(f"Result integration failed: {e}")
             raise
     
-    def _is_duplicate_segment(
-        self, 
-        segment: Dict[str, Any], 
-        existing_segments: List[Dict[str, Any]],
-        overlap_threshold: float = 0.8
-    ) -> bool:
-        """セグメントの重複チェック（オーバーラップ除去用）"""
-        try:
-            segment_start = segment.get("start_time", 0)
-            segment_end = segment.get("end_time", 0)
-            segment_duration = segment_end - segment_start
-            
-            if segment_duration <= 0:
-                return False
-            
-            for existing in existing_segments:
-                existing_start = existing.get("start_time", 0)
-                existing_end = existing.get("end_time", 0)
-                existing_duration = existing_end - existing_start
-                
-                if existing_duration <= 0:
-                    continue
-                
-                # オーバーラップ範囲計算
-                overlap_start = max(segment_start, existing_start)
-                overlap_end = min(segment_end, existing_end)
-                overlap_duration = max(0, overlap_end - overlap_start)
-                
-                # オーバーラップ率計算
-                overlap_ratio = overlap_duration / min(segment_duration, existing_duration)
-                
-                if overlap_ratio >= overlap_threshold:
-                    return True
-            
-            return False
-            
-        except Exception as e:
-            logger.error(f"Duplicate segment check failed: {e}")
-            return False
-    
     def _calculate_speaker_statistics(
         self, 
         segments: List[Dict[str, Any]]
@@ -610,27 +868,13 @@ class AudioProcessor:
             logger.error(f"Quality statistics calculation failed: {e}")
             return {}
     
-    async def _get_audio_duration(self, audio_path: str) -> float:
-        """音声時間（秒）を取得"""
-        try:
-            import librosa
-            duration = librosa.get_duration(path=audio_path)
-            return duration
-        except Exception as e:
-            logger.error(f"Failed to get audio duration: {e}")
-            return 0.0
-    
     async def _get_user_embedding(self, user_id: str) -> Optional[List[float]]:
         """ユーザー音声埋め込み取得"""
         try:
-            doc_ref = self.db.collection('userEmbeddings').document(user_id)
-            doc = doc_ref.get()
+            data = await self.storage.get_document(f"userEmbeddings/{user_id}")
             
-            if doc.exists:
-                data = doc.to_dict()
-                return data.get('embedding')
-            
-            return None
+            # 話者重心と異なるモデルで登録された旧プロファイルは使わない
+            return user_embedding_from_profile(data, user_id)
             
         except Exception as e:
             logger.error(f"Failed to get user embedding: {e}")
@@ -639,11 +883,9 @@ class AudioProcessor:
     async def _get_transcription_api_config(self, user_id: str) -> APIConfig:
         """ユーザーの文字起こしAPI設定取得"""
         try:
-            doc_ref = self.db.collection('apiConfigs').document(user_id)
-            doc = doc_ref.get()
+            data = await self.storage.get_document(f"apiConfigs/{user_id}")
             
-            if doc.exists:
-                data = doc.to_dict()
+            if data is not None:
                 return APIConfig(
                     provider=data.get('speechProvider', 'openai'),
                     api_key=data.get('speechApiKey', ''),
@@ -672,20 +914,48 @@ class AudioProcessor:
     ):
         """グローバル話者情報をFirestoreに保存"""
         try:
-            doc_ref = self.db.collection('globalSpeakers').document(audio_id)
-            doc_ref.set({
+            await self.storage.set_document(f"globalSpeakers/{audio_id}", {
                 "userId": user_id,
                 "speakerClusters": speaker_result.get("global_speakers", []),
                 "userSpeakerMapping": speaker_result.get("user_mapping", {}),
                 "speakersCount": speaker_result.get("speaker_count", 0),
                 "confidenceScores": speaker_result.get("confidence_scores", []),
-                "createdAt": firestore.SERVER_TIMESTAMP
+                "createdAt": self.storage.server_timestamp
             })
             
         except Exception as e:
             logger.error(f"Failed to save global speakers: {e}")
             raise
     
+    async def _save_speaker_window(self, user_id: str, audio_id: str, window: Dict[str, Any]):
+        """ストリーミング話者分離の途中結果（窓毎の話者タイムライン）を保存"""
+        try:
+            window_index = window["window_index"]
+            await self.storage.set_document(
+                f"{audio_document_path(user_id, audio_id)}/speakerWindows/{window_index:04d}",
+                {
+                    "windowIndex": window_index,
+                    "startTime": window["window_start"],
+                    "endTime": window["window_end"],
+                    "segments": window["segments"],
+                    "speakerCount": window["speaker_count"],
+                    "createdAt": self.storage.server_timestamp
+                }
+            )
+            
+            total_windows = window["total_windows"]
+            await self._update_status(
+                user_id,
+                audio_id,
+                "speaker_analysis",
+                20 + int((window_index + 1) / total_windows * 15),
+                f"話者分析中 ({window_index + 1}/{total_windows})"
+            )
+            
+        except Exception as e:
+            logger.error(f"Failed to save speaker window: {e}")
+            # 途中結果の保存失敗は処理を止めない
+    
     async def _update_status(
         self,
         user_id: str,
@@ -696,15 +966,13 @@ class AudioProcessor:
         current_chunk: Optional[int] = None,
         total_chunks: Optional[int] = None
     ):
-        """処理ステータス更新"""
+        """処理ステータス更新（書き込みはProgressReporterで集約）"""
         try:
-            doc_ref = self.db.collection('audios').document(user_id).collection('files').document(audio_id)
-            
             update_data = {
                 'status': status,
                 'processingProgress': progress,
                 'statusMessage': message,
-                'updatedAt': firestore.SERVER_TIMESTAMP
+                'updatedAt': self.storage.server_timestamp
             }
             
             if current_chunk is not None:
@@ -712,7 +980,7 @@ class AudioProcessor:
             if total_chunks is not None:
                 update_data['totalChunks'] = total_chunks
             
-            doc_ref.update(update_data)
+            await self.progress_reporter.report(user_id, audio_id, update_data)
             
             logger.info(f"Status updated: {user_id}/{audio_id} - {status} ({progress}%): {message}")
             
@@ -0,0 +1,109 @@
+"""
+チャンク分割のマニフェスト
+実際の分割境界（サンプル位置）を1か所で決め、話者分離・文字起こしの双方が同じ境界を参照する
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Any, Iterator, List, Optional
+
+
+@dataclass
+class ChunkSpec:
+    """1チャンクの範囲（[start_sample, end_sample)）"""
+    index: int
+    start_sample: int
+    end_sample: int
+    sample_rate: int
+    overlap_samples: int  # 直前のチャンクとの重なり（先頭チャンクは0）
+    path: Optional[str] = None  # 書き出し済みの場合のファイルパス
+
+    @property
+    def start_time(self) -> float:
+        return self.start_sample / self.sample_rate
+
+    @property
+    def end_time(self) -> float:
+        return self.end_sample / self.sample_rate
+
+    @property
+    def duration(self) -> float:
+        return (self.end_sample - self.start_sample) / self.sample_rate
+
+    @property
+    def num_samples(self) -> int:
+        return self.end_sample - self.start_sample
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "path": self.path,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "overlap_seconds": self.overlap_samples / self.sample_rate
+        }
+
+
+@dataclass
+class ChunkManifest:
+    """音声全体のチャンク分割結果"""
+    sample_rate: int
+    total_samples: int
+    chunk_samples: int
+    overlap_samples: int
+    chunks: List[ChunkSpec] = field(default_factory=list)
+
+    @classmethod
+    def build(
+        cls,
+        total_samples: int,
+        sample_rate: int,
+        chunk_seconds: float,
+        overlap_seconds: float
+    ) -> "ChunkManifest":
+        """チャンク長・オーバーラップ長から分割境界を決定"""
+        chunk_samples = int(round(chunk_seconds * sample_rate))
+        overlap_samples = int(round(overlap_seconds * sample_rate))
+
+        if chunk_samples <= 0:
+            raise ValueError(f"Chunk duration must be positive: {chunk_seconds}s")
+        if not 0 <= overlap_samples < chunk_samples:
+            raise ValueError(
+                f"Chunk overlap ({overlap_seconds}s) must be shorter than the chunk duration ({chunk_seconds}s)"
+            )
+
+        manifest = cls(sample_rate, total_samples, chunk_samples, overlap_samples)
+        step = chunk_samples - overlap_samples
+        start = 0
+
+        while start < total_samples:
+            end = min(start + chunk_samples, total_samples)
+            manifest.chunks.append(ChunkSpec(
+                index=len(manifest.chunks),
+                start_sample=start,
+                end_sample=end,
+                sample_rate=sample_rate,
+                overlap_samples=overlap_samples if manifest.chunks else 0
+            ))
+
+            # 末尾に達したら終了（オーバーラップ内に収まるだけのチャンクを作らない）
+            if end >= total_samples:
+                break
+            start += step
+
+        return manifest
+
+    @property
+    def overlap_seconds(self) -> float:
+        return self.overlap_samples / self.sample_rate
+
+    @property
+    def duration(self) -> float:
+        return self.total_samples / self.sample_rate
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def __iter__(self) -> Iterator[ChunkSpec]:
+        return iter(self.chunks)
+
+    def __getitem__(self, index: int) -> ChunkSpec:
+        return self.chunks[index]
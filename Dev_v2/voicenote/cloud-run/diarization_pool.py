@@ -0,0 +1,82 @@
+"""
+チャンク単位の話者分離を並列実行するプロセスプール
+各ワーカープロセスでpyannote.audioパイプラインを一度だけ読み込み、CPUコアをワーカー間で分割する
+"""
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 1以下ならプロセスプールを使わず、現在のプロセスで順次処理する
+DIARIZATION_WORKERS = int(os.environ.get("DIARIZATION_WORKERS", 1))
+
+# ワーカープロセス内の話者分離サービス（初期化時に1度だけ作成）
+_worker_service = None
+
+
+def _initialize_worker(torch_threads: int):
+    """ワーカー初期化: スレッド数を分割してからモデルを読み込む"""
+    global _worker_service
+
+    import torch
+
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+
+    from speaker_separation import SpeakerSeparationService
+
+    _worker_service = SpeakerSeparationService()
+    asyncio.run(_worker_service.initialize())
+
+
+def buffer_slice(buffer_path: str, sample_rate: int, start_time: float, end_time: float) -> Dict[str, Any]:
+    """ワーカーに渡す共有バッファの区間（ワーカー側で同じファイルをメモリマップして読む）"""
+    return {"buffer_path": buffer_path, "sample_rate": sample_rate, "start_time": start_time, "end_time": end_time}
+
+
+def _diarize_chunk(audio: Any, max_speakers: int, user_embedding: Optional[List[float]]) -> Dict[str, Any]:
+    """ワーカー内でチャンクの話者分離を実行（audioはファイルパスまたはbuffer_slice）"""
+    if isinstance(audio, str):
+        return asyncio.run(
+            _worker_service.analyze_speakers(audio, max_speakers=max_speakers, user_embedding=user_embedding)
+        )
+
+    from audio_buffer import AudioBuffer
+
+    audio_buffer = AudioBuffer(audio["buffer_path"], audio["sample_rate"], owned=False)
+    try:
+        return asyncio.run(_worker_service.analyze_speakers(
+            audio_buffer.as_pipeline_input(audio["start_time"], audio["end_time"]),
+            max_speakers=max_speakers,
+            user_embedding=user_embedding
+        ))
+    finally:
+        audio_buffer.release()
+
+
+class DiarizationPool:
+    """話者分離ワーカープール（spawnで起動し、親プロセスのtorch状態を引き継がない）"""
+
+    def __init__(self, workers: int = DIARIZATION_WORKERS, torch_threads: Optional[int] = None):
+        self.workers = workers
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // workers)
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_initialize_worker,
+            initargs=(self.torch_threads,)
+        )
+        logger.info(f"Started diarization pool: {workers} workers x {self.torch_threads} torch threads")
+
+    async def diarize(self, audio: Any, max_speakers: int = 5,
+                      user_embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """チャンクの話者分離をワーカーで実行（audioはファイルパスまたはbuffer_slice）"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, _diarize_chunk, audio, max_speakers, user_embedding)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,27 +1,25 @@
 import os
 import logging
 import asyncio
+import tempfile
 from contextlib import asynccontextmanager
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
 
-# Google Cloud
-from google.cloud import firestore, storage, logging as cloud_logging
-
-# pyannote.audio認証設定
-import torch
-from huggingface_hub import login
 from dotenv import load_dotenv
 
-# 自作モジュール
+# 自作モジュール（torch/pyannote等のML系ライブラリは初回のモデル読み込み時に読み込む）
+from audio_buffer import AudioBuffer
 from audio_processor import AudioProcessor
-from speaker_separation import SpeakerSeparationService
-from transcription_apis import TranscriptionService, APIConfig
-from voice_learning import VoiceLearningService
+from chunk_manifest import ChunkManifest
+from transcription_apis import APIConfig
+from storage_backend import audio_document_path
+from speaker_identification import user_embedding_from_profile
+from model_registry import model_registry, MODEL_WARMUP
 
 # 環境変数読み込み
 load_dotenv()
@@ -31,6 +29,8 @@ def setup_pyannote_authentication():
     try:
         hf_token = os.getenv('HUGGINGFACE_TOKEN')
         if hf_token:
+            from huggingface_hub import login
+            
             login(token=hf_token)
             logger.info("✅ Hugging Face authentication successful")
         else:
@@ -41,8 +41,11 @@ def setup_pyannote_authentication():
 def setup_pytorch_settings():
     """PyTorch設定最適化"""
     try:
+        import torch
+        
         # CPUのみでの動作を設定（Cloud Run環境）
-        torch.set_num_threads(4)  # Cloud Runの4vCPUに最適化
+        # Cloud Runの4vCPUに最適化（話者分離ワーカープール使用時は各ワーカーで別途分割）
+        torch.set_num_threads(int(os.getenv("TORCH_NUM_THREADS", 4)))
         
         # メモリ効率化
         if torch.cuda.is_available():
@@ -54,45 +57,72 @@ def setup_pytorch_settings():
     except Exception as e:
         logger.error(f"❌ PyTorch setup failed: {e}")
 
+# `python main.py` で起動した場合、話者分離ワーカー（spawn）は本モジュールを __mp_main__ として再読み込みする
+# ワーカーはサービスを使わないため、クライアント作成等の初期化は行わない
+IS_SPAWNED_WORKER = __name__ == "__mp_main__"
+
+# 指定された場合のみAudioProcessorへ渡す処理設定（未指定ならAudioProcessor側の既定値・環境変数を使う）
+OPTIONAL_PROCESSING_KEYS = (
+    "chunk_threshold",
+    "streaming_diarization_threshold",
+    "streaming_match_threshold",
+    "max_parallel_chunks",
+    "chunk_max_retries",
+    "chunk_retry_delay",
+    "update_speaker_gallery"
+)
+
 # ログ設定
-if os.getenv('GOOGLE_CLOUD_PROJECT'):
+if os.getenv('GOOGLE_CLOUD_PROJECT') and not IS_SPAWNED_WORKER:
     # Cloud Runでの実行時
+    from google.cloud import logging as cloud_logging
+    
     client = cloud_logging.Client()
     client.setup_logging()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 認証・設定初期化
-setup_pyannote_authentication()
-setup_pytorch_settings()
-
-# Firebase クライアント初期化
-db = firestore.Client()
-storage_client = storage.Client()
+if not IS_SPAWNED_WORKER:
+    # 認証・設定初期化（最初のモデル読み込みの直前に実行）
+    model_registry.add_setup_hook(setup_pyannote_authentication)
+    model_registry.add_setup_hook(setup_pytorch_settings)
+    
+    # サービス初期化（Firestore/Storageアクセスとモデルは AudioProcessor のサービスを共有）
+    audio_processor = AudioProcessor()
+    storage = audio_processor.storage
+    transcription_service = audio_processor.transcription_service
 
-# サービス初期化
-audio_processor = AudioProcessor()
-speaker_service = SpeakerSeparationService()
-transcription_service = TranscriptionService()
-voice_learning_service = VoiceLearningService()
+async def warm_up_models():
+    """モデルの事前読み込み"""
+    try:
+        await audio_processor.initialize()
+        logger.info("✅ Audio processor initialized")
+    except Exception as e:
+        logger.error(f"❌ Failed to initialize audio processor: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """アプリケーションライフサイクル管理"""
     logger.info("🚀 VoiceNote Audio Processing Service starting...")
     
-    # 初期化処理
-    try:
-        await audio_processor.initialize()
-        logger.info("✅ Audio processor initialized")
-    except Exception as e:
-        logger.error(f"❌ Failed to initialize audio processor: {e}")
+    # 初期化処理（既定ではモデル読み込みをバックグラウンドで行い、/healthを待たせない）
+    warm_up_task = None
+    if MODEL_WARMUP == "blocking":
+        await warm_up_models()
+    elif MODEL_WARMUP == "background":
+        warm_up_task = asyncio.create_task(warm_up_models())
     
     yield
     
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    
     # クリーンアップ処理
     logger.info("🔄 Shutting down VoiceNote Audio Processing Service...")
+    await audio_processor.progress_reporter.flush_all()
+    audio_processor.shutdown()
+    await transcription_service.aclose()
 
 # FastAPI アプリ作成
 app = FastAPI(
@@ -122,6 +152,12 @@ class VoiceLearningRequest(BaseModel):
     audio_data: str  # Base64エンコードされた音声データ
     session_id: str
 
+class GalleryEnrollRequest(BaseModel):
+    user_id: str
+    audio_id: str
+    # 録音の話者IDと登録名（voice_idを指定すると既存の登録話者に統合）
+    speakers: List[Dict[str, Any]]
+
 class TranscriptionRequest(BaseModel):
     user_id: str
     audio_path: str
@@ -173,6 +209,7 @@ async def run_audio_processing(user_id: str, audio_id: str, config: Dict[str, An
         processing_config = {
             "enable_speaker_separation": config.get("enable_speaker_separation", True),
             "max_speakers": config.get("max_speakers", 5),
+            "min_speakers": config.get("min_speakers", 1),
             "use_user_embedding": config.get("use_user_embedding", True),
             "language": config.get("language", "ja"),
             "chunk_duration": config.get("chunk_duration", 30),
@@ -191,6 +228,7 @@ async def run_audio_processing(user_id: str, audio_id: str, config: Dict[str, An
                 "settings": config.get("llm_settings", {})
             }
         }
+        processing_config.update({key: config[key] for key in OPTIONAL_PROCESSING_KEYS if key in config})
         
         logger.info(f"Processing config: {dict(processing_config, transcription_config={'provider': processing_config['transcription_config']['provider'], 'api_key': '***masked***'}, llm_config={'provider': processing_config['llm_config']['provider'], 'api_key': '***masked***'})}")
         
@@ -223,20 +261,32 @@ async def speaker_separation(request: ProcessAudioRequest):
         # ユーザー埋め込みの取得
         user_embedding = await get_user_embedding(request.user_id)
         
-        # 話者分離実行
+        # 話者分離実行（初回はモデルを読み込む）
+        await audio_processor.initialize()
+        speaker_service = audio_processor.speaker_service
         if request.config.get("use_chunking", False):
-            # チャンク分割処理
-            chunks = await split_audio_to_chunks(audio_path, request.config)
-            result = await speaker_service.analyze_speakers_chunked(
-                chunks, 
-                user_embedding=user_embedding
-            )
+            # チャンク分割処理（作業ファイルはリクエスト毎の一時ディレクトリに置き、終了時に削除）
+            work_dir = tempfile.TemporaryDirectory(prefix="voicenote-speaker-")
+            audio_buffer = None
+            try:
+                audio_buffer, chunks = await split_audio_to_chunks(audio_path, request.config, work_dir.name)
+                result = await speaker_service.analyze_speakers_chunked(
+                    chunks, 
+                    user_embedding=user_embedding,
+                    audio_buffer=audio_buffer,
+                    max_speakers=request.config.get("max_speakers", 5)
+                )
+            finally:
+                if audio_buffer is not None:
+                    audio_buffer.release()
+                await asyncio.get_event_loop().run_in_executor(None, work_dir.cleanup)
         else:
             # 直接処理
             result = await speaker_service.analyze_speakers(
                 audio_path,
                 max_speakers=request.config.get("max_speakers", 5),
-                user_embedding=user_embedding
+                user_embedding=user_embedding,
+                min_speakers=request.config.get("min_speakers", 1)
             )
         
         return {
@@ -270,9 +320,8 @@ async def transcription(request: TranscriptionRequest):
                 api_config
             )
         else:
-            # 全体文字起こし
-            api_client = transcription_service.create_api_client(api_config)
-            result = await api_client.transcribe(request.audio_path)
+            # 全体文字起こし（レート制御下で実行）
+            result = await transcription_service.transcribe_with_fallback(request.audio_path, api_config)
             results = [result]
         
         return {
@@ -300,7 +349,8 @@ async def transcription(request: TranscriptionRequest):
 async def voice_learning(request: VoiceLearningRequest):
     """音声学習エンドポイント"""
     try:
-        result = await voice_learning_service.process_learning_audio(
+        await audio_processor.initialize()
+        result = await audio_processor.voice_learning_service.process_learning_audio(
             user_id=request.user_id,
             audio_data=request.audio_data,
             session_id=request.session_id
@@ -315,6 +365,45 @@ async def voice_learning(request: VoiceLearningRequest):
         logger.error(f"Voice learning failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# 話者ギャラリー登録
+@app.post("/speaker-gallery/enroll")
+async def enroll_gallery_speakers(request: GalleryEnrollRequest):
+    """録音内の話者を名前付きで話者ギャラリーに登録"""
+    try:
+        data = await storage.get_document(f"globalSpeakers/{request.audio_id}")
+        if data is None or data.get("userId") != request.user_id:
+            raise HTTPException(status_code=404, detail="Speaker analysis not found")
+        
+        clusters = {cluster["id"]: cluster for cluster in data.get("speakerClusters", [])}
+        entries = []
+        for speaker in request.speakers:
+            cluster = clusters.get(speaker["speaker_id"])
+            if cluster is None:
+                raise HTTPException(status_code=400, detail=f"Unknown speaker: {speaker['speaker_id']}")
+            entries.append({
+                "name": speaker["name"],
+                "embedding": cluster["embedding"],
+                "embedding_model": cluster.get("embedding_model"),
+                "voice_id": speaker.get("voice_id") or cluster.get("voice_id")
+            })
+        
+        enrolled = await audio_processor.speaker_gallery.enroll_speakers(
+            request.user_id, entries, audio_id=request.audio_id
+        )
+        
+        return {
+            "status": "success",
+            "voices": enrolled
+        }
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Speaker gallery enrollment failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # 処理キャンセル
 @app.post("/cancel-processing")
 async def cancel_processing(request: ProcessAudioRequest):
@@ -325,7 +414,7 @@ async def cancel_processing(request: ProcessAudioRequest):
             request.audio_id, 
             "cancelled", 
             0, 
-            {"cancelled_at": firestore.SERVER_TIMESTAMP}
+            {"cancelled_at": storage.server_timestamp}
         )
         
         return {
@@ -342,14 +431,11 @@ async def cancel_processing(request: ProcessAudioRequest):
 async def get_processing_status(user_id: str, audio_id: str):
     """処理状況確認"""
     try:
-        doc_ref = db.collection('audios').document(user_id).collection('files').document(audio_id)
-        doc = doc_ref.get()
+        data = await storage.get_document(audio_document_path(user_id, audio_id))
         
-        if not doc.exists:
+        if data is None:
             raise HTTPException(status_code=404, detail="Audio file not found")
         
-        data = doc.to_dict()
-        
         return {
             "status": data.get("status", "unknown"),
             "progress": data.get("processingProgress", 0),
@@ -368,18 +454,16 @@ async def update_audio_status(user_id: str, audio_id: str, status: str,
                             progress: int, additional_data: Dict[str, Any] = None):
     """音声ファイルの状態更新"""
     try:
-        doc_ref = db.collection('audios').document(user_id).collection('files').document(audio_id)
-        
         update_data = {
             'status': status,
             'processingProgress': progress,
-            'updatedAt': firestore.SERVER_TIMESTAMP
+            'updatedAt': storage.server_timestamp
         }
         
         if additional_data:
             update_data.update(additional_data)
         
-        doc_ref.update(update_data)
+        await storage.update_document(audio_document_path(user_id, audio_id), update_data)
         
     except Exception as e:
         logger.error(f"Failed to update audio status: {e}")
@@ -393,30 +477,40 @@ async def download_audio_file(user_id: str, audio_id: str) -> str:
 async def get_user_embedding(user_id: str) -> Optional[list]:
     """ユーザー音声埋め込みを取得"""
     try:
-        doc_ref = db.collection('userEmbeddings').document(user_id)
-        doc = doc_ref.get()
+        data = await storage.get_document(f"userEmbeddings/{user_id}")
         
-        if doc.exists:
-            data = doc.to_dict()
-            return data.get('embedding')
-        
-        return None
+        # 話者重心と異なるモデルで登録された旧プロファイルは使わない
+        return user_embedding_from_profile(data, user_id)
         
     except Exception as e:
         logger.error(f"Failed to get user embedding: {e}")
         return None
 
-async def split_audio_to_chunks(audio_path: str, config: Dict[str, Any]) -> list:
-    """音声をチャンクに分割"""
-    # 実装予定
-    pass
+async def split_audio_to_chunks(audio_path: str, config: Dict[str, Any],
+                                work_dir: str) -> Tuple[AudioBuffer, ChunkManifest]:
+    """音声をチャンクに分割（AudioProcessorと同じ分割境界・同じ設定キー、バッファの解放は呼び出し側）"""
+    loop = asyncio.get_event_loop()
+    audio_buffer = await loop.run_in_executor(None, AudioBuffer.from_file, audio_path, work_dir)
+    
+    try:
+        manifest = await audio_processor._split_audio_to_chunks(
+            audio_buffer,
+            config.get("chunk_duration", 30),
+            config.get("overlap_duration", 5)
+        )
+    except Exception:
+        audio_buffer.release()
+        raise
+    
+    return audio_buffer, manifest
 
 # メイン実行
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
     
+    # アプリを直接渡し、本モジュールを "main" として二重に読み込まない
     uvicorn.run(
-        "main:app",
+        app,
         host="0.0.0.0",
         port=port,
         log_level="info",
@@ -0,0 +1,124 @@
+"""
+プロセス共有のモデルレジストリ
+pyannote.audioの話者分離パイプライン・埋め込みモデルを初回利用時に1度だけ読み込み、全サービスで共有する
+"""
+import os
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 起動時のモデル読み込み方法
+# "background": 起動後にバックグラウンドで読み込む（/healthは即座に応答）
+# "blocking": 読み込み完了まで起動を待つ
+# "off": 初回の処理リクエストで読み込む
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "background")
+
+DIARIZATION_MODEL = "pyannote/speaker-diarization-3.1"
+# 話者分離パイプライン（3.1）が内部で使う埋め込みモデルと同じにし、話者重心と同じ埋め込み空間に揃える
+SEGMENT_EMBEDDING_MODEL = "pyannote/wespeaker-voxceleb-resnet34-LM"
+SEGMENT_EMBEDDING_DIMENSION = 256
+
+
+class ModelRegistry:
+    """名前付きモデルの遅延読み込み（モデル毎のロックで同時読み込みを1回にまとめる）"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+        self._setup_hooks: List[Callable[[], None]] = []
+        self._setup_done = False
+
+    def add_setup_hook(self, hook: Callable[[], None]):
+        """最初のモデル読み込みの前に1度だけ実行する処理（認証・スレッド数設定など）"""
+        with self._registry_lock:
+            self._setup_hooks.append(hook)
+
+    def _run_setup_hooks(self):
+        with self._registry_lock:
+            if self._setup_done:
+                return
+            for hook in self._setup_hooks:
+                hook()
+            self._setup_done = True
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """モデルの読み込み関数を登録（既に登録済みなら何もしない）"""
+        with self._registry_lock:
+            if name not in self._factories:
+                self._factories[name] = factory
+                self._locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Optional[Any]:
+        """モデルを取得（未読み込みならこのスレッドで読み込む。失敗時はNoneを保持）"""
+        if name in self._models:
+            return self._models[name]
+
+        with self._locks[name]:
+            if name not in self._models:
+                try:
+                    self._run_setup_hooks()
+                    self._models[name] = self._factories[name]()
+                    logger.info(f"Model loaded: {name}")
+                except Exception as e:
+                    logger.error(f"Failed to load model {name}: {e}")
+                    self._models[name] = None
+            return self._models[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    async def warm_up(self, names: Optional[Iterable[str]] = None):
+        """モデルをエグゼキューター上で並行して読み込む（イベントループはブロックしない）"""
+        names = list(names) if names is not None else list(self._factories)
+        pending = [name for name in names if not self.is_loaded(name)]
+        if not pending:
+            return
+
+        loop = asyncio.get_event_loop()
+        await asyncio.gather(*[loop.run_in_executor(None, self.get, name) for name in pending])
+
+
+def _torch_device(device: str):
+    import torch
+
+    use_cuda = device == "cuda" and torch.cuda.is_available()
+    return torch.device("cuda" if use_cuda else "cpu")
+
+
+def _load_diarization_pipeline(device: str):
+    from pyannote.audio import Pipeline
+
+    pipeline = Pipeline.from_pretrained(DIARIZATION_MODEL, use_auth_token=os.environ.get("HUGGINGFACE_TOKEN"))
+    if pipeline is None:
+        raise RuntimeError(f"Pipeline could not be loaded: {DIARIZATION_MODEL}")
+    return pipeline.to(_torch_device(device))
+
+
+def _load_segment_embedding(device: str):
+    from speaker_embedding import SpeakerEmbeddingExtractor
+
+    return SpeakerEmbeddingExtractor(
+        SEGMENT_EMBEDDING_MODEL,
+        device=_torch_device(device),
+        use_auth_token=os.environ.get("HUGGINGFACE_TOKEN")
+    )
+
+
+model_registry = ModelRegistry()
+
+
+def diarization_pipeline_key(device: str = "cpu") -> str:
+    key = f"diarization:{device}"
+    model_registry.register(key, lambda: _load_diarization_pipeline(device))
+    return key
+
+
+def segment_embedding_key(device: str = "cpu") -> str:
+    key = f"segment_embedding:{device}"
+    model_registry.register(key, lambda: _load_segment_embedding(device))
+    return key
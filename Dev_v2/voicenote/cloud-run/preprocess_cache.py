@@ -0,0 +1,148 @@
+"""
+前処理済み音声のローカルキャッシュ
+元音声の内容ハッシュと前処理パラメータをキーに、前処理済みの共有バッファファイルを保持する（LRU・容量上限付き）
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+from typing import Dict, Any, List, Optional, Tuple
+
+from audio_buffer import AudioBuffer, TARGET_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+PREPROCESS_CACHE_DIR = os.environ.get("PREPROCESS_CACHE_DIR", "/tmp/voicenote-cache")
+# Cloud Runの/tmpはメモリ上にあるため控えめな上限にする（0以下で無効）
+PREPROCESS_CACHE_MAX_BYTES = int(os.environ.get("PREPROCESS_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+CACHED_BUFFER_NAME = "buffer.f32"
+TEMP_ENTRY_PREFIX = ".tmp-"
+
+
+class PreprocessCache:
+    """内容アドレス方式の前処理キャッシュ（エントリ毎にディレクトリ、更新時刻でLRU管理）"""
+
+    def __init__(self, cache_dir: str = PREPROCESS_CACHE_DIR, max_bytes: int = PREPROCESS_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def content_hash_from_metadata(metadata: Dict[str, Any]) -> Optional[str]:
+        """Cloud Storageのメタデータから内容ハッシュを取得（複合オブジェクトはmd5を持たないためcrc32cを使用）"""
+        if metadata.get("md5_hash"):
+            return f"md5:{metadata['md5_hash']}"
+        if metadata.get("crc32c"):
+            return f"crc32c:{metadata['crc32c']}:{metadata.get('size')}"
+        return None
+
+    @staticmethod
+    def content_hash_from_file(path: str, block_size: int = 4 * 1024 * 1024) -> str:
+        """ローカルファイルのSHA-256（メタデータにハッシュがない場合に使用）"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as source_file:
+            for block in iter(lambda: source_file.read(block_size), b""):
+                digest.update(block)
+        return f"sha256:{digest.hexdigest()}"
+
+    @staticmethod
+    def make_key(content_hash: str, params: Dict[str, Any]) -> str:
+        """内容ハッシュと前処理パラメータからキャッシュキーを作成"""
+        payload = json.dumps({"content": content_hash, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def lookup(self, key: str, sample_rate: int = TARGET_SAMPLE_RATE) -> Optional[AudioBuffer]:
+        """キャッシュ済みなら共有バッファを返す（バッファはキャッシュ所有）"""
+        if not self.enabled:
+            return None
+
+        entry_dir = os.path.join(self.cache_dir, key)
+        buffer_path = os.path.join(entry_dir, CACHED_BUFFER_NAME)
+
+        try:
+            # LRU順序のため最終利用時刻を更新
+            os.utime(entry_dir)
+            audio_buffer = AudioBuffer(buffer_path, sample_rate, owned=False)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        logger.info(f"Preprocess cache hit: {key}")
+        return audio_buffer
+
+    def store(self, key: str, buffer_path: str):
+        """前処理結果を登録（一時ディレクトリに用意してからアトミックに公開）"""
+        if not self.enabled:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_dir = os.path.join(self.cache_dir, key)
+        if os.path.isdir(entry_dir):
+            return
+
+        # 単独で上限を超えるエントリは登録しない（登録直後のエントリは追い出し対象外のため上限を超え続ける）
+        entry_bytes = os.path.getsize(buffer_path)
+        if entry_bytes > self.max_bytes:
+            logger.info(
+                f"Skipping preprocess cache entry {key}: {entry_bytes} bytes exceeds the {self.max_bytes} byte budget"
+            )
+            return
+
+        temp_dir = tempfile.mkdtemp(prefix=TEMP_ENTRY_PREFIX, dir=self.cache_dir)
+        try:
+            self._link_or_copy(buffer_path, os.path.join(temp_dir, CACHED_BUFFER_NAME))
+            os.rename(temp_dir, entry_dir)
+        except OSError as e:
+            # 同時に同じキーが登録された場合もここに来る
+            logger.warning(f"Failed to store preprocess cache entry {key}: {e}")
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return
+
+        logger.info(f"Stored preprocess cache entry: {key}")
+        self._evict(keep=key)
+
+    def _link_or_copy(self, source: str, destination: str):
+        # 同一ファイルシステムならハードリンク（作業ディレクトリ削除後も実体が残る）
+        # 前処理は実行毎に新しいファイルへ書き込むため、登録後に同じ実体が書き換えられることはない
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copyfile(source, destination)
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(最終利用時刻, サイズ, パス) の一覧"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(TEMP_ENTRY_PREFIX):
+                continue
+
+            entry_dir = os.path.join(self.cache_dir, name)
+            try:
+                size = sum(
+                    os.path.getsize(os.path.join(entry_dir, file_name))
+                    for file_name in os.listdir(entry_dir)
+                )
+                entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+            except OSError:
+                continue
+        return entries
+
+    def _evict(self, keep: str):
+        """容量上限を超えた分を最終利用の古い順に削除"""
+        entries = sorted(self._entries())
+        total_bytes = sum(size for _, size, _ in entries)
+
+        for _, size, entry_dir in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            if os.path.basename(entry_dir) == keep:
+                continue
+
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_bytes -= size
+            logger.info(f"Evicted preprocess cache entry: {entry_dir}")
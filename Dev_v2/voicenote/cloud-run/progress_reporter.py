@@ -0,0 +1,108 @@
+"""
+処理進捗のFirestore書き込みを集約するレポーター
+ドキュメント毎に書き込み間隔を制限し、終了状態のみ即時に書き込む
+"""
+import os
+import asyncio
+import logging
+from typing import Dict, Any, Tuple
+
+from storage_backend import StorageBackend, audio_document_path
+
+logger = logging.getLogger(__name__)
+
+# 即時に書き込む終了状態
+TERMINAL_STATUSES = {"completed", "error", "cancelled"}
+
+# ドキュメント毎の最短書き込み間隔（秒）
+DEFAULT_MIN_INTERVAL = float(os.environ.get("PROGRESS_UPDATE_INTERVAL", 2.0))
+
+
+class ProgressReporter:
+    """進捗更新の集約・レート制限付きライター"""
+
+    def __init__(self, storage: StorageBackend, min_interval: float = DEFAULT_MIN_INTERVAL):
+        self.storage = storage
+        self.min_interval = min_interval
+        self._pending: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._last_write: Dict[Tuple[str, str], float] = {}
+        self._scheduled: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    async def report(self, user_id: str, audio_id: str, update_data: Dict[str, Any]):
+        """進捗を登録（間隔内の更新は最新値にまとめて遅延書き込み）"""
+        key = (user_id, audio_id)
+        self._pending.setdefault(key, {}).update(update_data)
+
+        if update_data.get("status") in TERMINAL_STATUSES:
+            # 遅延書き込み待ちのタスクは不要（保留中の更新ごと即時に書き込む）
+            scheduled = self._scheduled.pop(key, None)
+            if scheduled:
+                scheduled.cancel()
+            await self._flush(key)
+            self._forget(key)
+            return
+
+        loop = asyncio.get_event_loop()
+        elapsed = loop.time() - self._last_write.get(key, float("-inf"))
+
+        if elapsed >= self.min_interval:
+            await self._flush(key)
+        elif key not in self._scheduled:
+            self._scheduled[key] = asyncio.create_task(
+                self._delayed_flush(key, self.min_interval - elapsed)
+            )
+
+    async def flush_all(self):
+        """保留中の全更新を一括書き込み"""
+        for scheduled in self._scheduled.values():
+            scheduled.cancel()
+        self._scheduled.clear()
+
+        operations = [
+            ("update", audio_document_path(user_id, audio_id), update_data)
+            for (user_id, audio_id), update_data in self._pending.items()
+        ]
+        self._pending.clear()
+
+        if operations:
+            try:
+                await self.storage.write_batch(operations)
+            except Exception as e:
+                logger.error(f"Failed to flush pending progress updates: {e}")
+
+    def _forget(self, key: Tuple[str, str]):
+        """終了したジョブの管理情報を破棄"""
+        lock = self._locks.get(key)
+        if key in self._pending or key in self._scheduled or (lock and lock.locked()):
+            return
+
+        self._last_write.pop(key, None)
+        self._locks.pop(key, None)
+
+    async def _delayed_flush(self, key: Tuple[str, str], delay: float):
+        """間隔経過後に保留中の更新を書き込み"""
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self._scheduled.pop(key, None)
+        await self._flush(key)
+
+    async def _flush(self, key: Tuple[str, str]):
+        """保留中の更新を書き込み（ドキュメント毎に直列化し、順序を保証）"""
+        lock = self._locks.setdefault(key, asyncio.Lock())
+
+        async with lock:
+            update_data = self._pending.pop(key, None)
+            if not update_data:
+                return
+
+            self._last_write[key] = asyncio.get_event_loop().time()
+
+            user_id, audio_id = key
+
+            try:
+                await self.storage.update_document(audio_document_path(user_id, audio_id), update_data)
+            except Exception as e:
+                logger.error(f"Failed to write progress for {user_id}/{audio_id}: {e}")
+                # ステータス更新失敗は処理を止めない
@@ -0,0 +1,168 @@
+"""
+文字起こしAPIクライアントのプール
+(プロバイダー, APIキーのハッシュ, モデル) 毎にクライアントを1つだけ作成してジョブ間で共有し、
+HTTP接続（TLSセッション）をキープアライブで再利用する
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 保持するクライアント数の上限（超えたら最も長く使われていないものから破棄）
+CLIENT_POOL_MAX_SIZE = int(os.environ.get("CLIENT_POOL_MAX_SIZE", 64))
+# クライアントの寿命（秒）。キーのローテーションや長時間接続の劣化に備えて定期的に作り直す
+CLIENT_TTL_SECONDS = float(os.environ.get("CLIENT_TTL_SECONDS", 1800))
+# 破棄したクライアントを閉じるまでの猶予（実行中のリクエストの完了を待つ）
+CLIENT_RETIRE_GRACE_SECONDS = float(os.environ.get("CLIENT_RETIRE_GRACE_SECONDS", 300))
+
+# 共有HTTPクライアントの接続設定
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY_SECONDS", 60))
+
+# クライアントキー: (プロバイダー, APIキーと接続設定のハッシュ, モデル)
+ClientKey = Tuple[str, str, str]
+
+
+def client_key(config: Any) -> ClientKey:
+    """API設定からプールのキーを作成（APIキーそのものは保持しない）"""
+    credentials = json.dumps(
+        {"api_key": config.api_key, "language": config.language, "settings": config.settings or {}},
+        sort_keys=True,
+        default=str
+    )
+    return config.provider, hashlib.sha256(credentials.encode()).hexdigest()[:16], config.model
+
+
+class SharedConnections:
+    """プロバイダー間で共有する接続（キープアライブ付きHTTPクライアント、Google Speechクライアント）"""
+
+    def __init__(self):
+        self._http_client = None
+        self._google_speech_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def http_client(self):
+        """非同期HTTPクライアント（ホスト毎の接続プールを全クライアントで共有）"""
+        with self._lock:
+            if self._http_client is None:
+                import httpx
+
+                self._http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS
+                    ),
+                    timeout=httpx.Timeout(600.0, connect=10.0)
+                )
+            return self._http_client
+
+    @property
+    def google_speech_client(self):
+        """Google Speechクライアント（認証はサービスアカウントのためAPIキーに依存せず1つで足りる）"""
+        with self._lock:
+            if self._google_speech_client is None:
+                from google.cloud import speech
+
+                self._google_speech_client = speech.SpeechClient()
+            return self._google_speech_client
+
+    async def aclose(self):
+        with self._lock:
+            http_client, self._http_client = self._http_client, None
+            google_client, self._google_speech_client = self._google_speech_client, None
+
+        if http_client is not None:
+            await http_client.aclose()
+        if google_client is not None:
+            google_client.transport.close()
+
+
+class ProviderClientPool:
+    """プロバイダークライアントのLRUプール（寿命付き）"""
+
+    def __init__(self, factory: Callable[[Any], Any], max_size: int = CLIENT_POOL_MAX_SIZE,
+                 ttl_seconds: float = CLIENT_TTL_SECONDS):
+        self.factory = factory
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clients: "OrderedDict[ClientKey, Tuple[Any, float]]" = OrderedDict()
+        self._retired: List[Any] = []  # 破棄済みで未クローズのクライアント
+        self._close_tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+
+    def get(self, config: Any) -> Any:
+        """設定に対応するクライアントを取得（なければ作成）"""
+        key = client_key(config)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None and now - entry[1] <= self.ttl_seconds:
+                self._clients.move_to_end(key)
+                return entry[0]
+
+            if entry is not None:
+                self._retire(self._clients.pop(key)[0])
+
+            client = self.factory(config)
+            self._clients[key] = (client, now)
+
+            while len(self._clients) > self.max_size:
+                _, (evicted, _) = self._clients.popitem(last=False)
+                self._retire(evicted)
+
+            return client
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def _retire(self, client: Any):
+        """破棄したクライアントは猶予後に閉じる（イベントループ外では終了時にまとめて閉じる）"""
+        self._retired.append(client)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self._close_later(client))
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_tasks.discard)
+
+    async def _close_later(self, client: Any):
+        await asyncio.sleep(CLIENT_RETIRE_GRACE_SECONDS)
+        with self._lock:
+            if client not in self._retired:
+                return
+            self._retired.remove(client)
+        await self._close(client)
+
+    async def _close(self, client: Any):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Failed to close {client.__class__.__name__}: {e}")
+
+    async def aclose(self):
+        """全クライアントを閉じる（シャットダウン時）"""
+        for task in list(self._close_tasks):
+            task.cancel()
+
+        with self._lock:
+            clients = [client for client, _ in self._clients.values()] + self._retired
+            self._clients.clear()
+            self._retired = []
+
+        for client in clients:
+            await self._close(client)
+
+
+shared_connections = SharedConnections()
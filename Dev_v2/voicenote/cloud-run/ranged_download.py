@@ -0,0 +1,282 @@
+"""
+Cloud Storageからのレンジ分割並列ダウンロード
+スピルファイルに書き込みながら先頭から読み出しでき、中断時は完了済みレンジから再開する
+"""
+import io
+import os
+import json
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Set
+
+from storage_backend import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RANGE_SIZE = int(os.environ.get("DOWNLOAD_RANGE_SIZE", 8 * 1024 * 1024))
+DEFAULT_MAX_PARALLEL = int(os.environ.get("DOWNLOAD_MAX_PARALLEL", 4))
+MAX_RANGE_RETRIES = 3
+
+
+class RangedDownload:
+    """レンジ分割並列ダウンロード（スピルファイル + 再開用ステートファイル）"""
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        bucket_name: str,
+        blob_path: str,
+        local_path: str,
+        range_size: int = DEFAULT_RANGE_SIZE,
+        max_parallel: int = DEFAULT_MAX_PARALLEL
+    ):
+        self.storage = storage
+        self.bucket_name = bucket_name
+        self.blob_path = blob_path
+        self.local_path = local_path
+        self.state_path = f"{local_path}.state.json"
+        self.range_size = range_size
+        self.max_parallel = max_parallel
+
+        self.metadata: Dict[str, Any] = {}
+        self.size = 0
+        self._completed: Set[int] = set()
+        self._watermark = 0  # 先頭から連続して書き込み済みのバイト数
+        self._error: Optional[Exception] = None
+        self._condition = threading.Condition()
+        self._task: Optional[asyncio.Task] = None
+        # 実行中のファイル書き込み（停止時に完了を待ち、再試行と同時に書き込まない）
+        self._pending_io: Set[asyncio.Future] = set()
+        self._state_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def num_ranges(self) -> int:
+        return (self.size + self.range_size - 1) // self.range_size
+
+    @property
+    def is_complete(self) -> bool:
+        return self._watermark >= self.size
+
+    async def start(self, metadata: Optional[Dict[str, Any]] = None) -> "RangedDownload":
+        """メタデータ取得とスピルファイル確保を行い、バックグラウンドでダウンロード開始"""
+        self.metadata = metadata or await self.storage.get_blob_metadata(self.bucket_name, self.blob_path)
+        self.size = self.metadata["size"]
+
+        os.makedirs(os.path.dirname(self.local_path) or ".", exist_ok=True)
+        self._completed = self._load_state()
+
+        # スピルファイルをオブジェクトサイズで確保（再開時は既存内容を保持）
+        mode = "r+b" if os.path.exists(self.local_path) else "wb"
+        with open(self.local_path, mode) as spill_file:
+            spill_file.truncate(self.size)
+
+        self._advance_watermark()
+        if self._completed:
+            logger.info(
+                f"Resuming download of {self.blob_path}: "
+                f"{len(self._completed)}/{self.num_ranges} ranges already present"
+            )
+
+        self._state_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def cancel(self):
+        """バックグラウンドのダウンロードを停止し、実行中のファイル書き込みが終わるまで待機"""
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+        if self._pending_io:
+            await asyncio.wait(list(self._pending_io))
+
+    async def wait(self) -> str:
+        """ダウンロード完了まで待機してローカルパスを返す"""
+        await self._task
+        return self.local_path
+
+    def open_reader(self, buffer_size: int = 1024 * 1024) -> io.BufferedReader:
+        """到着済みの範囲から読み出すファイルオブジェクト（スレッドから使用）"""
+        return io.BufferedReader(SpillFileReader(self), buffer_size=buffer_size)
+
+    def wait_for_bytes(self, end: int, timeout: Optional[float] = None):
+        """先頭からendバイトまで到着するまでブロック（イベントループ外のスレッド用）"""
+        end = min(end, self.size)
+        with self._condition:
+            while self._watermark < end and self._error is None:
+                if not self._condition.wait(timeout):
+                    raise TimeoutError(f"Timed out waiting for {self.blob_path} bytes up to {end}")
+            if self._watermark < end:
+                raise IOError(f"Download failed: {self._error}")
+
+    async def _run(self):
+        """未完了レンジを先頭から順に並列取得"""
+        pending = [i for i in range(self.num_ranges) if i not in self._completed]
+        queue: asyncio.Queue = asyncio.Queue()
+        for index in pending:
+            queue.put_nowait(index)
+
+        async def worker():
+            while not queue.empty():
+                index = queue.get_nowait()
+                await self._download_range(index)
+
+        try:
+            workers = [asyncio.create_task(worker()) for _ in range(min(self.max_parallel, len(pending)))]
+            try:
+                await asyncio.gather(*workers)
+            except BaseException:
+                for task in workers:
+                    task.cancel()
+                raise
+
+            await self._run_io(self._remove_state)
+            logger.info(f"Downloaded audio file: {self.local_path} ({self.size} bytes)")
+
+        except BaseException as e:
+            with self._condition:
+                self._error = e
+                self._condition.notify_all()
+            logger.error(f"Ranged download failed for {self.blob_path}: {e}")
+            raise
+
+    async def _download_range(self, index: int):
+        """単一レンジの取得と書き込み（一時的な失敗は再試行）"""
+        start = index * self.range_size
+        end = min(start + self.range_size, self.size)
+
+        for attempt in range(MAX_RANGE_RETRIES):
+            try:
+                data = await self.storage.read_blob_range(
+                    self.bucket_name,
+                    self.blob_path,
+                    start,
+                    end,
+                    generation=self.metadata.get("generation")
+                )
+                if len(data) != end - start:
+                    raise IOError(f"Short read for range {start}-{end}: {len(data)} bytes")
+                break
+            except Exception as e:
+                if attempt == MAX_RANGE_RETRIES - 1:
+                    raise
+                logger.warning(f"Range {start}-{end} failed ({attempt + 1}/{MAX_RANGE_RETRIES}): {e}")
+                await asyncio.sleep(2 ** attempt)
+
+        await self._run_io(self._write_range, start, data)
+
+        self._completed.add(index)
+        async with self._state_lock:
+            await self._run_io(self._save_state, sorted(self._completed))
+        self._advance_watermark()
+
+    async def _run_io(self, func, *args):
+        """ファイルI/Oをエグゼキューターで実行（呼び出し元が取り消されても書き込み自体は完了させる）"""
+        loop = asyncio.get_event_loop()
+        future = loop.run_in_executor(None, func, *args)
+        self._pending_io.add(future)
+        future.add_done_callback(self._pending_io.discard)
+        return await asyncio.shield(future)
+
+    def _write_range(self, offset: int, data: bytes):
+        fd = os.open(self.local_path, os.O_WRONLY)
+        try:
+            os.pwrite(fd, data, offset)
+        finally:
+            os.close(fd)
+
+    def _advance_watermark(self):
+        with self._condition:
+            next_index = self._watermark // self.range_size
+            while next_index in self._completed:
+                next_index += 1
+            self._watermark = min(next_index * self.range_size, self.size)
+            self._condition.notify_all()
+
+    def _load_state(self) -> Set[int]:
+        """同じ世代・レンジサイズの中断済みダウンロードがあれば完了レンジを復元"""
+        if not (os.path.exists(self.state_path) and os.path.exists(self.local_path)):
+            return set()
+
+        try:
+            with open(self.state_path) as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            return set()
+
+        if (state.get("generation") != self.metadata.get("generation")
+                or state.get("size") != self.size
+                or state.get("range_size") != self.range_size):
+            return set()
+
+        return set(state.get("completed", []))
+
+    def _save_state(self, completed: List[int]):
+        state = {
+            "generation": self.metadata.get("generation"),
+            "size": self.size,
+            "range_size": self.range_size,
+            "completed": completed
+        }
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as state_file:
+            json.dump(state, state_file)
+        os.replace(tmp_path, self.state_path)
+
+    def _remove_state(self):
+        try:
+            os.unlink(self.state_path)
+        except FileNotFoundError:
+            pass
+
+
+class SpillFileReader(io.RawIOBase):
+    """ダウンロード中のスピルファイルを読むファイルオブジェクト（未到着部分は到着までブロック）"""
+
+    def __init__(self, download: RangedDownload):
+        super().__init__()
+        self.download = download
+        self._file = open(download.local_path, "rb")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = self.download.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        end = min(self._position + len(buffer), self.download.size)
+        if end <= self._position:
+            return 0
+
+        self.download.wait_for_bytes(end)
+        self._file.seek(self._position)
+        read_size = self._file.readinto(memoryview(buffer)[:end - self._position])
+        self._position += read_size
+        return read_size
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
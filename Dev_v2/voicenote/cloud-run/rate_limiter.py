@@ -0,0 +1,165 @@
+"""
+プロバイダー・APIキー毎の送信レート制御
+トークンバケット（リクエスト/秒）とセマフォ（同時リクエスト数）で全ジョブの送信をまとめて調整し、
+429応答（Retry-After）を受けたら送信レートを半減、成功が続けば設定値まで徐々に戻す（AIMD）
+"""
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# プロバイダー毎の既定の送信レート（リクエスト/秒、settings["requests_per_second"]で上書き可能）
+PROVIDER_REQUESTS_PER_SECOND = {
+    "openai": 5.0,
+    "azure": 5.0,
+    "google": 10.0,
+    "assemblyai": 5.0,
+    "deepgram": 10.0
+}
+
+# 429応答時の送信レートの縮小率と下限
+RATE_DECREASE_FACTOR = 0.5
+MIN_REQUESTS_PER_SECOND = 0.1
+# 成功1回あたりの送信レートの回復量（設定レートに対する割合）
+RATE_INCREASE_RATIO = 0.05
+# Retry-Afterがない429応答で送信を止める秒数
+DEFAULT_RETRY_AFTER_SECONDS = float(os.environ.get("DEFAULT_RETRY_AFTER_SECONDS", 1.0))
+# 429応答のリクエストを再送する回数（処理されていないため、他の失敗とは別に数える）
+RATE_LIMIT_MAX_RETRIES = int(os.environ.get("RATE_LIMIT_MAX_RETRIES", 5))
+
+
+# レート制限を表す各社SDKの例外（モジュール名, クラス名）
+SDK_RATE_LIMIT_ERRORS = [
+    ("openai", "RateLimitError"),
+    ("google.api_core.exceptions", "ResourceExhausted")
+]
+
+
+def _is_sdk_rate_limit_error(error: Exception) -> bool:
+    """各社SDKのレート制限例外か（SDKが未読み込みならその例外は発生し得ないため読み込まない）"""
+    for module_name, class_name in SDK_RATE_LIMIT_ERRORS:
+        error_type = getattr(sys.modules.get(module_name), class_name, None)
+        if isinstance(error_type, type) and isinstance(error, error_type):
+            return True
+    return False
+
+
+def rate_limit_retry_after(error: Exception) -> Optional[float]:
+    """429（レート制限）の例外なら待機秒数（Retry-Afterヘッダー、なければ既定値）、それ以外はNone"""
+    response = getattr(error, "response", None)
+    # status_code: openai/anthropic・httpx、status: Deepgram・aiohttp（Deepgramは文字列）
+    status_code = (
+        getattr(error, "status_code", None)
+        or getattr(response, "status_code", None)
+        or getattr(error, "status", None)
+    )
+
+    if str(status_code) != "429" and not _is_sdk_rate_limit_error(error):
+        return None
+
+    headers = getattr(response, "headers", None) or {}
+    try:
+        retry_after = headers.get("retry-after") or headers.get("Retry-After")
+        return max(0.0, float(retry_after)) if retry_after is not None else DEFAULT_RETRY_AFTER_SECONDS
+    except (TypeError, ValueError):
+        # HTTP日付形式のRetry-Afterは既定値で代用
+        return DEFAULT_RETRY_AFTER_SECONDS
+
+
+class ProviderRateLimiter:
+    """1つのAPIキーに対するトークンバケット + 同時実行数の制御"""
+
+    def __init__(self, requests_per_second: float, max_concurrency: int, burst: Optional[float] = None):
+        self.max_rate = requests_per_second
+        self.rate = requests_per_second
+        self.capacity = burst or max(1.0, requests_per_second)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def slot(self):
+        """送信枠を確保（同時実行数の枠を取ってからトークンを待つ）"""
+        async with self._semaphore:
+            await self._take_token()
+            yield
+
+    async def _take_token(self):
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1.0:
+                        self.tokens -= 1.0
+                        return
+                    wait = (1.0 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        """成功時: 送信レートを設定値まで加算的に回復"""
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_INCREASE_RATIO)
+
+    def on_rate_limited(self, retry_after: float):
+        """429応答時: 送信レートを乗算的に縮小し、Retry-Afterの間は全リクエストの送信を止める"""
+        now = time.monotonic()
+        self.rate = max(MIN_REQUESTS_PER_SECOND, self.rate * RATE_DECREASE_FACTOR)
+        self.tokens = 0.0
+        self.updated = max(self.updated, now + retry_after)
+        self.paused_until = max(self.paused_until, now + retry_after)
+        logger.warning(f"Rate limited: pausing {retry_after:.1f}s, rate reduced to {self.rate:.2f} req/s")
+
+
+class RateLimiterRegistry:
+    """(プロバイダー, APIキーのハッシュ) 毎のレート制御をプロセス内で共有"""
+
+    def __init__(self):
+        self._limiters: Dict[Tuple[str, str], ProviderRateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, config: Any, max_concurrency: int) -> ProviderRateLimiter:
+        settings = config.settings or {}
+        key = (config.provider, hashlib.sha256(config.api_key.encode()).hexdigest()[:16])
+
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = ProviderRateLimiter(
+                    settings.get("requests_per_second", PROVIDER_REQUESTS_PER_SECOND.get(config.provider, 1.0)),
+                    max_concurrency,
+                    settings.get("burst")
+                )
+                self._limiters[key] = limiter
+            return limiter
+
+    async def call(self, config: Any, max_concurrency: int, request_factory):
+        """レート制御下でリクエストを実行（429応答はRetry-After後に再送）"""
+        limiter = self.get(config, max_concurrency)
+
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            async with limiter.slot():
+                try:
+                    result = await request_factory()
+                except Exception as e:
+                    retry_after = rate_limit_retry_after(e)
+                    if retry_after is None or attempt == RATE_LIMIT_MAX_RETRIES:
+                        raise
+                    limiter.on_rate_limited(retry_after)
+                    continue
+
+            limiter.on_success()
+            return result
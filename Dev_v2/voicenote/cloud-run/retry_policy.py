@@ -0,0 +1,189 @@
+"""
+APIリクエストの再試行・タイムアウト・ヘッジ
+一時的な失敗はジッター付き指数バックオフで再試行し、セグメントの呼び出しが直近のp95レイテンシ（音声長で正規化）を
+超えたらフォールバック先のプロバイダーにも同じリクエストを送り、先に成功した結果を使う
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RETRY_MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", 3))
+RETRY_BASE_DELAY_SECONDS = float(os.environ.get("RETRY_BASE_DELAY_SECONDS", 0.5))
+RETRY_MAX_DELAY_SECONDS = float(os.environ.get("RETRY_MAX_DELAY_SECONDS", 20.0))
+
+# 1回の呼び出しのタイムアウト（セグメント単位 / ファイル全体）
+SEGMENT_TIMEOUT_SECONDS = float(os.environ.get("SEGMENT_TIMEOUT_SECONDS", 120.0))
+FILE_TIMEOUT_SECONDS = float(os.environ.get("FILE_TIMEOUT_SECONDS", 1800.0))
+
+# ヘッジの開始条件（この件数のレイテンシが集まるまではヘッジしない）
+HEDGE_QUANTILE = float(os.environ.get("HEDGE_QUANTILE", 0.95))
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", 20))
+HEDGE_MIN_DELAY_SECONDS = float(os.environ.get("HEDGE_MIN_DELAY_SECONDS", 1.0))
+# 同時に出せるヘッジ数の上限（実行中のリクエスト数に対する割合、ただし最低HEDGE_BUDGET_MIN件）
+HEDGE_BUDGET_RATIO = float(os.environ.get("HEDGE_BUDGET_RATIO", 0.1))
+HEDGE_BUDGET_MIN = int(os.environ.get("HEDGE_BUDGET_MIN", 1))
+LATENCY_WINDOW = 200
+# ヘッジする操作（ファイル全体の文字起こしは音声長に比例して時間がかかり、重複送信の費用も大きいためヘッジしない）
+HEDGED_OPERATIONS = {"segment"}
+
+# 再試行しても結果が変わらないHTTPステータス（リクエスト内容・認証の誤り）
+NON_RETRYABLE_STATUS_CODES = {400, 401, 403, 404, 413, 415, 422}
+
+def is_retryable(error: Exception) -> bool:
+    """一時的な失敗（タイムアウト・接続断・5xx等）か"""
+    if isinstance(error, (ValueError, TypeError, NotImplementedError)):
+        return False
+
+    response = getattr(error, "response", None)
+    status_code = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    return status_code not in NON_RETRYABLE_STATUS_CODES
+
+
+class RetryPolicy:
+    """ジッター付き指数バックオフ（full jitter）による再試行"""
+
+    def __init__(self, max_attempts: int = RETRY_MAX_ATTEMPTS,
+                 base_delay: float = RETRY_BASE_DELAY_SECONDS,
+                 max_delay: float = RETRY_MAX_DELAY_SECONDS):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        """attempt回目（0始まり）の失敗後の待機秒数"""
+        return random.uniform(0.0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def run(self, request_factory: Callable[[], Awaitable[Any]], description: str = "request") -> Any:
+        for attempt in range(self.max_attempts):
+            try:
+                return await request_factory()
+            except Exception as e:
+                if attempt == self.max_attempts - 1 or not is_retryable(e):
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(
+                    f"{description} failed ({attempt + 1}/{self.max_attempts}), retrying in {delay:.2f}s: "
+                    f"{type(e).__name__}: {e}"
+                )
+                await asyncio.sleep(delay)
+
+
+class LatencyTracker:
+    """(プロバイダー, 操作種別) 毎の直近レイテンシ
+
+    音声長を渡した呼び出しは音声1秒あたりの処理秒数として記録し、ヘッジ開始までの秒数も対象の音声長に比例させる
+    （長いセグメントが常にp95を超えてヘッジされないようにする）
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+
+    def record(self, key: Tuple[str, str], seconds: float):
+        self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def hedge_delay(self, key: Tuple[str, str], audio_seconds: Optional[float] = None) -> Optional[float]:
+        """ヘッジを開始するまでの秒数（直近のp95、音声長を渡した場合はp95の処理速度×音声長、サンプル不足ならNone）"""
+        samples = self._samples.get(key)
+        if samples is None or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(HEDGE_QUANTILE * len(ordered)))
+        delay = ordered[index] * audio_seconds if audio_seconds else ordered[index]
+        return max(HEDGE_MIN_DELAY_SECONDS, delay)
+
+    async def timed(self, key: Tuple[str, str], request_factory: Callable[[], Awaitable[Any]],
+                    timeout: Optional[float], audio_seconds: Optional[float] = None) -> Any:
+        """タイムアウト付きで実行し、成功した呼び出しのレイテンシ（音声長を渡した場合は音声1秒あたり）を記録"""
+        start = time.monotonic()
+        result = await asyncio.wait_for(request_factory(), timeout)
+        elapsed = time.monotonic() - start
+        self.record(key, elapsed / audio_seconds if audio_seconds else elapsed)
+        return result
+
+
+class HedgeBudget:
+    """同時に出せるヘッジ数の上限（送信枠待ちが続く飽和時にヘッジでさらに負荷をかけない）"""
+
+    def __init__(self, ratio: float = HEDGE_BUDGET_RATIO, minimum: int = HEDGE_BUDGET_MIN):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.in_flight = 0
+        self.hedges = 0
+
+    @property
+    def limit(self) -> int:
+        return max(self.minimum, int(self.in_flight * self.ratio))
+
+    @contextmanager
+    def track(self):
+        """実行中のリクエストとして数える"""
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    def try_acquire(self) -> bool:
+        if self.hedges >= self.limit:
+            return False
+        self.hedges += 1
+        return True
+
+    def release(self):
+        self.hedges -= 1
+
+
+async def hedge(primary: Callable[[], Awaitable[Any]], secondary: Callable[[], Awaitable[Any]],
+                delay: float, started: Optional[asyncio.Event] = None,
+                budget: Optional[HedgeBudget] = None) -> Any:
+    """primaryがdelay秒以内に終わらなければsecondaryも開始し、先に成功した方の結果を返す
+
+    startedを渡した場合は、primaryが送信枠を確保してset()した時点から計測する
+    （delayは送信枠内のレイテンシから求めるため、枠待ちの時間を含めない）
+    budgetの上限に達している場合はヘッジせずprimaryを待つ
+    """
+    primary_task = asyncio.ensure_future(primary())
+
+    if started is not None:
+        started_task = asyncio.ensure_future(started.wait())
+        try:
+            await asyncio.wait({primary_task, started_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            started_task.cancel()
+        if primary_task.done():
+            return primary_task.result()
+
+    done, _ = await asyncio.wait({primary_task}, timeout=delay)
+    if done:
+        return primary_task.result()
+
+    if budget is not None and not budget.try_acquire():
+        logger.debug(f"Request exceeded {delay:.2f}s but the hedge budget is exhausted")
+        return await primary_task
+
+    logger.info(f"Request exceeded {delay:.2f}s, sending hedged request")
+    pending = {primary_task, asyncio.ensure_future(secondary())}
+    error: Optional[BaseException] = None
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+        if budget is not None:
+            budget.release()
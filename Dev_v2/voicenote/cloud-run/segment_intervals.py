@@ -0,0 +1,135 @@
+"""
+話者セグメントの区間インデックス
+開始時刻でソートした区間に対し、指定範囲と重なるセグメントを高速に検索する
+"""
+import bisect
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class SegmentIntervalIndex:
+    """セグメント区間インデックス（ソート済み開始時刻 + 終了時刻の累積最大値）"""
+
+    def __init__(self, segments: List[Dict[str, Any]], start_key: str = "start", end_key: str = "end"):
+        self.start_key = start_key
+        self.end_key = end_key
+        self.segments = sorted(segments, key=lambda seg: seg.get(start_key, 0))
+        self.starts = [seg.get(start_key, 0) for seg in self.segments]
+
+        # 先頭からi番目までの終了時刻の最大値（検索の打ち切りに使用）
+        self.max_ends = []
+        max_end = float("-inf")
+        for seg in self.segments:
+            max_end = max(max_end, seg.get(end_key, 0))
+            self.max_ends.append(max_end)
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def overlapping(self, start_time: float, end_time: float) -> List[Dict[str, Any]]:
+        """[start_time, end_time) と重なるセグメントを開始時刻順に取得"""
+        # 開始時刻がend_time未満のセグメントのみが候補
+        hi = bisect.bisect_left(self.starts, end_time)
+
+        result = []
+        for i in range(hi - 1, -1, -1):
+            # これより前のセグメントは全てstart_time以前に終了している
+            if self.max_ends[i] <= start_time:
+                break
+            if self.segments[i].get(self.end_key, 0) > start_time:
+                result.append(self.segments[i])
+
+        result.reverse()
+        return result
+
+
+class SegmentOverlapMerger:
+    """オーバーラップ重複除去エンジン（開始時刻順の区間に二分探索で照合・挿入）
+
+    group_keyを指定した場合は同じグループ（話者）の区間同士のみを重複とみなす（別話者の同時発話は残す）
+    """
+
+    def __init__(self, overlap_threshold: float = 0.8,
+                 start_key: str = "start_time", end_key: str = "end_time",
+                 group_key: Optional[str] = None):
+        self.overlap_threshold = overlap_threshold
+        self.start_key = start_key
+        self.end_key = end_key
+        self.group_key = group_key
+        # グループ毎の (開始時刻のリスト, 終了時刻のリスト)
+        self._intervals: Dict[Any, Tuple[List[float], List[float]]] = {}
+        self.max_duration = 0.0
+
+    def __len__(self) -> int:
+        return sum(len(starts) for starts, _ in self._intervals.values())
+
+    def _group(self, segment: Dict[str, Any]) -> Any:
+        return segment.get(self.group_key) if self.group_key else None
+
+    def is_duplicate(self, segment: Dict[str, Any]) -> bool:
+        """同じグループの既存区間のいずれかと閾値以上重なっているか（短い方の長さに対する重なり率）"""
+        segment_start = segment.get(self.start_key, 0)
+        segment_end = segment.get(self.end_key, 0)
+        segment_duration = segment_end - segment_start
+
+        if segment_duration <= 0:
+            return False
+
+        starts, ends = self._intervals.get(self._group(segment), ([], []))
+
+        # 開始時刻が (segment_start - 最大区間長) 未満の区間は重ならない
+        lo = bisect.bisect_left(starts, segment_start - self.max_duration)
+        hi = bisect.bisect_left(starts, segment_end)
+
+        for i in range(lo, hi):
+            existing_duration = ends[i] - starts[i]
+            if existing_duration <= 0:
+                continue
+
+            overlap_duration = max(0, min(segment_end, ends[i]) - max(segment_start, starts[i]))
+            overlap_ratio = overlap_duration / min(segment_duration, existing_duration)
+
+            if overlap_ratio >= self.overlap_threshold:
+                return True
+
+        return False
+
+    def add(self, segment: Dict[str, Any]):
+        """区間を登録"""
+        segment_start = segment.get(self.start_key, 0)
+        segment_end = segment.get(self.end_key, 0)
+        starts, ends = self._intervals.setdefault(self._group(segment), ([], []))
+
+        position = bisect.bisect_right(starts, segment_start)
+        starts.insert(position, segment_start)
+        ends.insert(position, segment_end)
+        self.max_duration = max(self.max_duration, segment_end - segment_start)
+
+    def add_if_unique(self, segment: Dict[str, Any]) -> bool:
+        """重複していなければ登録してTrueを返す"""
+        if self.is_duplicate(segment):
+            return False
+
+        self.add(segment)
+        return True
+
+
+def merge_speaker_overlaps(segments: List[Dict[str, Any]], speaker_key: str = "speaker",
+                           start_key: str = "start", end_key: str = "end") -> List[Dict[str, Any]]:
+    """同じ話者の重なり合うセグメント（チャンク間オーバーラップでの二重検出）を1つに統合し、開始時刻順に返す
+
+    別話者同士の重なり（同時発話）はそのまま残す。入力のセグメントは変更しない
+    """
+    merged: List[Dict[str, Any]] = []
+    last_by_speaker: Dict[Any, Dict[str, Any]] = {}
+
+    for segment in sorted(segments, key=lambda seg: seg.get(start_key, 0)):
+        previous = last_by_speaker.get(segment.get(speaker_key))
+        if previous is not None and segment.get(start_key, 0) < previous.get(end_key, 0):
+            # チャンク境界で切れた方と切れていない方の和集合を残す
+            previous[end_key] = max(previous.get(end_key, 0), segment.get(end_key, 0))
+            continue
+
+        merged.append(dict(segment))
+        last_by_speaker[segment.get(speaker_key)] = merged[-1]
+
+    return merged
@@ -0,0 +1,121 @@
+"""
+話者埋め込みのクラスタリング
+埋め込み数が多い場合はミニバッチk-meansで微小クラスタに集約してから、重心に対して階層クラスタリングを行う
+"""
+import os
+from typing import Optional
+
+import numpy as np
+
+# これを超える埋め込み数では微小クラスタに事前集約する（階層クラスタリングはO(n²)のメモリを使うため）
+MICRO_CLUSTER_THRESHOLD = int(os.environ.get("SPEAKER_MICRO_CLUSTER_THRESHOLD", 2000))
+MICRO_CLUSTER_COUNT = int(os.environ.get("SPEAKER_MICRO_CLUSTERS", 256))
+
+# 全埋め込み間のコサイン類似度がこれ以上なら話者は1人とみなす
+SINGLE_SPEAKER_SIMILARITY = float(os.environ.get("SINGLE_SPEAKER_SIMILARITY", 0.6))
+# 話者数推定で各行に残す近傍の割合（親和行列の枝刈り）
+AFFINITY_PRUNING_RATIO = 0.3
+
+
+def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """L2正規化（ゼロベクトルはそのまま）"""
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class SpeakerClusterer:
+    """話者クラスタリング（少数なら直接、多数なら微小クラスタ経由で階層クラスタリング）"""
+
+    def __init__(self, micro_cluster_threshold: int = MICRO_CLUSTER_THRESHOLD,
+                 micro_cluster_count: int = MICRO_CLUSTER_COUNT):
+        self.micro_cluster_threshold = micro_cluster_threshold
+        self.micro_cluster_count = micro_cluster_count
+
+    def estimate_speaker_count(self, embeddings: np.ndarray, min_speakers: int = 1,
+                               max_speakers: int = 5) -> int:
+        """コサイン親和行列の固有値ギャップから話者数を推定（min/max_speakersの範囲内）"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        max_speakers = max(1, min(max_speakers, len(embeddings)))
+        min_speakers = max(1, min(min_speakers, max_speakers))
+
+        if max_speakers == 1:
+            return 1
+
+        points = normalize_embeddings(embeddings)
+        if len(points) > self.micro_cluster_threshold:
+            points = normalize_embeddings(self._micro_centroids(points)[0])
+            max_speakers = min(max_speakers, len(points))
+
+        similarity = points @ points.T
+
+        # 全体が十分似ていれば1人（クラスタリング自体を省略できる）
+        if min_speakers == 1 and similarity.min() >= SINGLE_SPEAKER_SIMILARITY:
+            return 1
+
+        # 各行の上位近傍のみ残した対称親和行列
+        affinity = np.clip(similarity, 0.0, 1.0)
+        keep = max(2, int(np.ceil(AFFINITY_PRUNING_RATIO * len(points))))
+        if keep < len(points):
+            threshold = np.partition(affinity, -keep, axis=1)[:, -keep][:, None]
+            affinity = np.where(affinity >= threshold, affinity, 0.0)
+        affinity = (affinity + affinity.T) / 2
+
+        # 正規化ラプラシアンの小さい側の固有値
+        degree = np.maximum(affinity.sum(axis=1), 1e-12)
+        inv_sqrt_degree = 1.0 / np.sqrt(degree)
+        laplacian = np.eye(len(points)) - inv_sqrt_degree[:, None] * affinity * inv_sqrt_degree[None, :]
+        eigenvalues = np.sort(np.linalg.eigvalsh(laplacian))[:max_speakers + 1]
+
+        # k番目と(k+1)番目の固有値の差が最大となるk
+        gaps = np.diff(eigenvalues)
+        candidates = np.arange(min_speakers, min(max_speakers, len(gaps)) + 1)
+        if len(candidates) == 0:
+            return min_speakers
+        return int(candidates[np.argmax(gaps[candidates - 1])])
+
+    def fit_predict(self, embeddings: np.ndarray, n_clusters: int,
+                    max_speakers: Optional[int] = None) -> np.ndarray:
+        """各埋め込みのクラスタ番号（0始まりの連番）を返す"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        n_clusters = min(n_clusters, max_speakers or n_clusters, len(embeddings))
+
+        if n_clusters <= 1:
+            return np.zeros(len(embeddings), dtype=int)
+
+        if len(embeddings) <= self.micro_cluster_threshold:
+            return self._agglomerative(embeddings, n_clusters)
+
+        centroids, micro_labels = self._micro_centroids(normalize_embeddings(embeddings))
+
+        if len(centroids) <= n_clusters:
+            return micro_labels
+
+        centroid_labels = self._agglomerative(centroids, n_clusters)
+        return centroid_labels[micro_labels]
+
+    def _micro_centroids(self, normalized: np.ndarray):
+        """微小クラスタへ集約（コサイン距離に合わせて正規化した空間でk-means）し、(重心, 各点の所属) を返す"""
+        from sklearn.cluster import MiniBatchKMeans
+
+        micro_count = min(self.micro_cluster_count, len(normalized))
+        kmeans = MiniBatchKMeans(
+            n_clusters=micro_count,
+            batch_size=1024,
+            n_init=3,
+            random_state=0
+        )
+        micro_labels = kmeans.fit_predict(normalized)
+
+        # 空の微小クラスタを除いて番号を詰める
+        used_labels, micro_labels = np.unique(micro_labels, return_inverse=True)
+        return kmeans.cluster_centers_[used_labels], micro_labels
+
+    def _agglomerative(self, embeddings: np.ndarray, n_clusters: int) -> np.ndarray:
+        from sklearn.cluster import AgglomerativeClustering
+
+        clustering = AgglomerativeClustering(
+            n_clusters=n_clusters,
+            metric='cosine',
+            linkage='average'
+        )
+        return clustering.fit_predict(embeddings)
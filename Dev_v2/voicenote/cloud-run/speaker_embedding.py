@@ -0,0 +1,107 @@
+"""
+話者埋め込みのバッチ推論
+メモリ上の波形からセグメントを切り出し、長さの近いもの同士をまとめて1回の順伝播で埋め込みを計算する
+"""
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+from pyannote.audio.pipelines.speaker_verification import PretrainedSpeakerEmbedding
+
+from model_registry import SEGMENT_EMBEDDING_MODEL
+
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 32))
+# これより長いセグメントは中央部分のみを使用（話者性は数秒で十分に表れる）
+MAX_EMBEDDING_SECONDS = float(os.environ.get("MAX_EMBEDDING_SECONDS", 10.0))
+
+
+class SpeakerEmbeddingExtractor:
+    """セグメント単位の話者埋め込みをバッチで抽出"""
+
+    def __init__(
+        self,
+        model_name: str = SEGMENT_EMBEDDING_MODEL,
+        device: Optional[torch.device] = None,
+        use_auth_token: Optional[str] = None,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_segment_seconds: float = MAX_EMBEDDING_SECONDS
+    ):
+        self.model_name = model_name
+        self.model = PretrainedSpeakerEmbedding(
+            model_name,
+            device=device or torch.device("cpu"),
+            use_auth_token=use_auth_token
+        )
+        self.batch_size = batch_size
+        self.max_segment_seconds = max_segment_seconds
+
+    @property
+    def sample_rate(self) -> int:
+        return self.model.sample_rate
+
+    @property
+    def dimension(self) -> int:
+        return self.model.dimension
+
+    def extract(
+        self,
+        waveform: torch.Tensor,
+        sample_rate: int,
+        spans: List[Tuple[float, float]]
+    ) -> List[Optional[np.ndarray]]:
+        """(開始秒, 終了秒) の各区間の埋め込みを取得（短すぎて計算できない区間はNone）"""
+        if sample_rate != self.sample_rate:
+            import torchaudio
+
+            waveform = torchaudio.functional.resample(waveform, sample_rate, self.sample_rate)
+            sample_rate = self.sample_rate
+
+        # モノラル (samples,) に揃える
+        waveform = waveform.mean(dim=0) if waveform.dim() == 2 else waveform
+        ranges = [self._sample_range(start, end, sample_rate, waveform.shape[0]) for start, end in spans]
+
+        # 長さ順に並べてバッチ内のパディングを最小化
+        order = sorted(
+            (i for i, (start, end) in enumerate(ranges) if end > start),
+            key=lambda i: ranges[i][1] - ranges[i][0],
+            reverse=True
+        )
+
+        embeddings: List[Optional[np.ndarray]] = [None] * len(spans)
+
+        with torch.inference_mode():
+            for batch_start in range(0, len(order), self.batch_size):
+                batch_indices = order[batch_start:batch_start + self.batch_size]
+                batch_waveforms, batch_masks = self._build_batch(waveform, [ranges[i] for i in batch_indices])
+                batch_embeddings = self.model(batch_waveforms, masks=batch_masks)
+
+                for index, embedding in zip(batch_indices, batch_embeddings):
+                    if not np.any(np.isnan(embedding)):
+                        embeddings[index] = np.asarray(embedding, dtype=np.float32)
+
+        return embeddings
+
+    def _sample_range(self, start: float, end: float, sample_rate: int, num_samples: int) -> Tuple[int, int]:
+        start_sample = min(max(int(start * sample_rate), 0), num_samples)
+        end_sample = min(max(int(end * sample_rate), start_sample), num_samples)
+
+        # 長いセグメントは中央をクロップ
+        max_samples = int(self.max_segment_seconds * sample_rate)
+        if end_sample - start_sample > max_samples:
+            start_sample += (end_sample - start_sample - max_samples) // 2
+            end_sample = start_sample + max_samples
+
+        return start_sample, end_sample
+
+    def _build_batch(self, waveform: torch.Tensor, ranges: List[Tuple[int, int]]) -> Tuple[torch.Tensor, torch.Tensor]:
+        """ゼロパディングした (batch, 1, samples) の波形と有効サンプルのマスク"""
+        max_length = max(end - start for start, end in ranges)
+        batch_waveforms = torch.zeros(len(ranges), 1, max_length, dtype=waveform.dtype)
+        batch_masks = torch.zeros(len(ranges), max_length)
+
+        for row, (start, end) in enumerate(ranges):
+            batch_waveforms[row, 0, :end - start] = waveform[start:end]
+            batch_masks[row, :end - start] = 1.0
+
+        return batch_waveforms, batch_masks
@@ -0,0 +1,271 @@
+"""
+話者ギャラリー
+ユーザー毎に名前付きの話者埋め込み（同僚・家族など）を保持し、録音毎の話者クラスタを既知の話者へ一括で対応付ける
+登録数が多い場合はhnswlibの近似最近傍インデックスで候補を絞り込む（未インストール時は行列積による全件照合）
+"""
+import os
+import time
+import uuid
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from model_registry import SEGMENT_EMBEDDING_MODEL, SEGMENT_EMBEDDING_DIMENSION
+from speaker_clustering import normalize_embeddings
+from speaker_identification import match_speakers
+from storage_backend import StorageBackend
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+# 登録話者と同一人物とみなすコサイン類似度の下限（録音環境が異なるためユーザー照合より低め）
+GALLERY_MATCH_THRESHOLD = float(os.environ.get("SPEAKER_GALLERY_THRESHOLD", 0.75))
+# 登録数がこれを超えたら近似最近傍インデックスで候補を絞り込む
+GALLERY_INDEX_MIN_SIZE = int(os.environ.get("SPEAKER_GALLERY_INDEX_MIN_SIZE", 256))
+# 近似探索で話者クラスタ毎に取得する候補数
+GALLERY_CANDIDATES = int(os.environ.get("SPEAKER_GALLERY_CANDIDATES", 8))
+# 読み込んだギャラリーを再利用する秒数（他インスタンスでの登録が反映されるまでの上限）
+GALLERY_CACHE_SECONDS = float(os.environ.get("SPEAKER_GALLERY_CACHE_SECONDS", 300))
+
+# ユーザー本人と判定済みの話者名（ギャラリー照合の対象外）
+USER_SPEAKER_NAME = "あなた"
+
+
+def gallery_collection_path(user_id: str) -> str:
+    """登録話者コレクションのパス"""
+    return f"speakerGalleries/{user_id}/voices"
+
+
+@dataclass
+class SpeakerGallery:
+    """1ユーザー分の登録話者（埋め込みは正規化済みの行列で保持）"""
+    user_id: str
+    voice_ids: List[str]
+    names: List[str]
+    embeddings: np.ndarray  # (登録数, 次元)
+    sample_counts: List[int]
+    last_audio_ids: List[Optional[str]]
+    loaded_at: float = field(default_factory=time.monotonic)
+    _index: Any = field(default=None, repr=False)
+
+    @classmethod
+    def from_documents(cls, user_id: str, documents: Dict[str, Dict[str, Any]],
+                       dimension: int = SEGMENT_EMBEDDING_DIMENSION) -> "SpeakerGallery":
+        """登録話者を読み込む（別の埋め込みモデルで登録された次元の異なる埋め込みは除外）"""
+        voice_ids, names, embeddings, sample_counts, last_audio_ids = [], [], [], [], []
+        skipped = 0
+        for voice_id, data in documents.items():
+            if not data.get("embedding"):
+                continue
+            if len(data["embedding"]) != dimension:
+                skipped += 1
+                continue
+            voice_ids.append(voice_id)
+            names.append(data.get("name", voice_id))
+            embeddings.append(data["embedding"])
+            sample_counts.append(int(data.get("sampleCount", 1)))
+            last_audio_ids.append(data.get("lastAudioId"))
+
+        if skipped:
+            logger.warning(f"Ignored {skipped} gallery voices of user {user_id} without {dimension}-d embeddings")
+
+        matrix = (
+            normalize_embeddings(np.array(embeddings, dtype=np.float32))
+            if embeddings else np.zeros((0, dimension), dtype=np.float32)
+        )
+        return cls(user_id, voice_ids, names, matrix, sample_counts, last_audio_ids)
+
+    @property
+    def dimension(self) -> int:
+        return int(self.embeddings.shape[1])
+
+    def __len__(self) -> int:
+        return len(self.voice_ids)
+
+    def position(self, voice_id: str) -> Optional[int]:
+        try:
+            return self.voice_ids.index(voice_id)
+        except ValueError:
+            return None
+
+    def match(self, centroids: np.ndarray,
+              threshold: float = GALLERY_MATCH_THRESHOLD) -> Tuple[np.ndarray, np.ndarray]:
+        """各話者クラスタに対応する登録番号（対応なしは-1）と類似度（1対1の割り当て）"""
+        centroids = np.asarray(centroids, dtype=np.float32)
+        if len(self) == 0 or len(centroids) == 0:
+            return np.full(len(centroids), -1, dtype=int), np.zeros(len(centroids), dtype=np.float32)
+
+        candidates = self._candidates(centroids)
+        assignments, scores = match_speakers(centroids, self.embeddings[candidates], threshold)
+        return np.where(assignments >= 0, candidates[assignments], -1), scores
+
+    def _candidates(self, centroids: np.ndarray) -> np.ndarray:
+        """照合対象の登録番号（近似探索時は各クラスタの近傍候補の和集合）"""
+        if hnswlib is None or len(self) <= max(GALLERY_INDEX_MIN_SIZE, GALLERY_CANDIDATES):
+            return np.arange(len(self))
+
+        labels, _ = self._get_index().knn_query(normalize_embeddings(centroids), k=GALLERY_CANDIDATES)
+        return np.unique(labels.astype(int))
+
+    def _get_index(self):
+        if self._index is None:
+            index = hnswlib.Index(space="ip", dim=self.embeddings.shape[1])
+            index.init_index(max_elements=len(self), ef_construction=200, M=16)
+            index.add_items(self.embeddings, np.arange(len(self)))
+            index.set_ef(max(64, GALLERY_CANDIDATES * 4))
+            self._index = index
+        return self._index
+
+
+class SpeakerGalleryService:
+    """話者ギャラリーの読み込み・照合・登録（ギャラリーはユーザー毎にキャッシュ）"""
+
+    def __init__(self, storage: StorageBackend, threshold: float = GALLERY_MATCH_THRESHOLD,
+                 cache_seconds: float = GALLERY_CACHE_SECONDS):
+        self.storage = storage
+        self.threshold = threshold
+        self.cache_seconds = cache_seconds
+        self._galleries: Dict[str, SpeakerGallery] = {}
+
+    async def get_gallery(self, user_id: str) -> SpeakerGallery:
+        """ユーザーのギャラリーを取得（キャッシュが古ければ再読み込み）"""
+        gallery = self._galleries.get(user_id)
+        if gallery is None or time.monotonic() - gallery.loaded_at > self.cache_seconds:
+            documents = await self.storage.list_documents(gallery_collection_path(user_id))
+            gallery = SpeakerGallery.from_documents(user_id, documents)
+            self._galleries[user_id] = gallery
+        return gallery
+
+    def invalidate(self, user_id: str):
+        self._galleries.pop(user_id, None)
+
+    async def resolve_speakers(self, user_id: str, speakers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """録音の話者クラスタを登録話者へ一括照合し、一致した話者に名前とvoice_idを付与"""
+        try:
+            targets = [
+                i for i, speaker in enumerate(speakers)
+                if speaker.get("name") != USER_SPEAKER_NAME and np.any(speaker.get("embedding"))
+            ]
+            if not targets:
+                return speakers
+
+            gallery = await self.get_gallery(user_id)
+            if len(gallery) == 0:
+                return speakers
+
+            assignments, scores = gallery.match(
+                np.array([speakers[i]["embedding"] for i in targets], dtype=np.float32),
+                self.threshold
+            )
+
+            resolved = [dict(speaker) for speaker in speakers]
+            for i, voice_index, score in zip(targets, assignments, scores):
+                if voice_index < 0:
+                    continue
+                resolved[i].update({
+                    "name": gallery.names[voice_index],
+                    "voice_id": gallery.voice_ids[voice_index],
+                    "gallery_similarity": float(score)
+                })
+
+            logger.info(f"Resolved {int(np.sum(assignments >= 0))}/{len(targets)} speakers from gallery ({len(gallery)} voices)")
+            return resolved
+
+        except Exception as e:
+            logger.error(f"Speaker gallery lookup failed: {e}")
+            return speakers
+
+    async def update_matched_voices(self, user_id: str, audio_id: str, speakers: List[Dict[str, Any]]):
+        """照合された登録話者の埋め込みに今回の重心を取り込む（1回のバッチ書き込み、同じ録音は一度だけ）"""
+        matched = [speaker for speaker in speakers if speaker.get("voice_id")]
+        if not matched:
+            return
+
+        try:
+            gallery = await self.get_gallery(user_id)
+            operations = []
+            for speaker in matched:
+                position = gallery.position(speaker["voice_id"])
+                # 再試行されたジョブが同じ録音を二重に取り込まないよう、取り込み済みの録音は飛ばす
+                if position is None or gallery.last_audio_ids[position] == audio_id:
+                    continue
+                operations.append(("update", f"{gallery_collection_path(user_id)}/{speaker['voice_id']}",
+                                   self._merged_fields(gallery, position, speaker["embedding"], audio_id)))
+
+            if operations:
+                await self.storage.write_batch(operations)
+                self.invalidate(user_id)
+
+        except Exception as e:
+            logger.error(f"Speaker gallery update failed: {e}")
+
+    async def enroll_speakers(self, user_id: str, entries: List[Dict[str, Any]],
+                              audio_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """話者を一括登録（entry: name, embedding, 任意でvoice_id・embedding_model。既存のvoice_idには埋め込みを統合）"""
+        gallery = await self.get_gallery(user_id)
+        operations = []
+        enrolled = []
+
+        for entry in entries:
+            # モック結果・埋め込みを計算できなかった話者（ゼロベクトル）は照合に使えないため登録しない
+            embedding_model = entry.get("embedding_model") or SEGMENT_EMBEDDING_MODEL
+            if embedding_model != SEGMENT_EMBEDDING_MODEL or not np.any(entry["embedding"]):
+                raise ValueError(
+                    f"Speaker {entry['name']} has no usable embedding (model: {embedding_model})"
+                )
+            if len(entry["embedding"]) != gallery.dimension:
+                raise ValueError(
+                    f"Speaker {entry['name']} has a {len(entry['embedding'])}-d embedding; "
+                    f"the gallery expects {gallery.dimension}-d"
+                )
+
+            voice_id = entry.get("voice_id") or uuid.uuid4().hex
+            position = gallery.position(voice_id)
+            path = f"{gallery_collection_path(user_id)}/{voice_id}"
+
+            if position is None:
+                embedding = normalize_embeddings(np.asarray(entry["embedding"], dtype=np.float32).reshape(1, -1))[0]
+                operations.append(("set", path, {
+                    "name": entry["name"],
+                    "embedding": embedding.tolist(),
+                    "embeddingModel": embedding_model,
+                    "embeddingDim": len(embedding),
+                    "sampleCount": 1,
+                    "lastAudioId": audio_id,
+                    "createdAt": self.storage.server_timestamp,
+                    "updatedAt": self.storage.server_timestamp
+                }))
+            else:
+                fields = self._merged_fields(gallery, position, entry["embedding"], audio_id)
+                fields["name"] = entry["name"]
+                operations.append(("update", path, fields))
+
+            enrolled.append({"voice_id": voice_id, "name": entry["name"]})
+
+        if operations:
+            await self.storage.write_batch(operations)
+            self.invalidate(user_id)
+
+        return enrolled
+
+    def _merged_fields(self, gallery: SpeakerGallery, position: int,
+                       embedding: List[float], audio_id: Optional[str]) -> Dict[str, Any]:
+        """登録埋め込みと新しい埋め込みのサンプル数重み付き平均"""
+        count = gallery.sample_counts[position]
+        new_embedding = normalize_embeddings(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+        merged = normalize_embeddings(
+            (gallery.embeddings[position] * count + new_embedding).reshape(1, -1)
+        )[0]
+        return {
+            "embedding": merged.tolist(),
+            "embeddingDim": len(merged),
+            "sampleCount": count + 1,
+            "lastAudioId": audio_id,
+            "updatedAt": self.storage.server_timestamp
+        }
@@ -0,0 +1,86 @@
+"""
+話者の照合
+話者クラスタの重心行列と登録済み音声（ユーザー本人や既知の話者）の行列を一度だけ正規化し、
+1回の行列積で全組のコサイン類似度を求めて1対1に対応付ける
+"""
+import os
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from model_registry import SEGMENT_EMBEDDING_MODEL, SEGMENT_EMBEDDING_DIMENSION
+from speaker_clustering import normalize_embeddings
+
+logger = logging.getLogger(__name__)
+
+# 登録済み音声と同一人物とみなすコサイン類似度の下限
+SPEAKER_MATCH_THRESHOLD = float(os.environ.get("SPEAKER_MATCH_THRESHOLD", 0.8))
+
+
+def match_speakers(centroids: np.ndarray, references: np.ndarray,
+                   threshold: float = SPEAKER_MATCH_THRESHOLD) -> Tuple[np.ndarray, np.ndarray]:
+    """各重心に対応する登録音声の番号（対応なしは-1）と類似度を返す
+
+    類似度の合計が最大となる1対1の割り当てのうち、閾値を超える組のみ採用する
+    （同じ登録音声が複数のクラスタに割り当てられることはない）
+    """
+    centroids = np.asarray(centroids, dtype=np.float32)
+    references = np.asarray(references, dtype=np.float32)
+    assignments = np.full(len(centroids), -1, dtype=int)
+    scores = np.zeros(len(centroids), dtype=np.float32)
+
+    if len(centroids) == 0 or len(references) == 0:
+        return assignments, scores
+
+    centroids = centroids.reshape(len(centroids), -1)
+    references = references.reshape(len(references), -1)
+    # 別の埋め込みモデルで計算された音声（次元が異なる）は比較できないため対応なしとする
+    if references.shape[1] != centroids.shape[1]:
+        logger.warning(
+            f"Cannot match {centroids.shape[1]}-d speaker centroids against "
+            f"{references.shape[1]}-d reference embeddings; skipping"
+        )
+        return assignments, scores
+
+    from scipy.optimize import linear_sum_assignment
+
+    similarity = normalize_embeddings(centroids) @ normalize_embeddings(references).T
+
+    rows, cols = linear_sum_assignment(similarity, maximize=True)
+    accepted = similarity[rows, cols] > threshold
+    assignments[rows[accepted]] = cols[accepted]
+    scores[rows[accepted]] = similarity[rows[accepted], cols[accepted]]
+
+    return assignments, scores
+
+
+def reference_embedding(embeddings: Sequence[Optional[np.ndarray]]) -> Optional[np.ndarray]:
+    """区間毎の埋め込みから登録音声の代表埋め込みを作成（正規化した埋め込みの平均、計算できない区間は除く）"""
+    valid = [np.asarray(embedding, dtype=np.float32).reshape(-1) for embedding in embeddings if embedding is not None]
+    if not valid:
+        return None
+
+    mean = normalize_embeddings(np.stack(valid)).mean(axis=0)
+    return mean / max(float(np.linalg.norm(mean)), 1e-12)
+
+
+def user_embedding_from_profile(profile: Optional[Dict[str, Any]],
+                                user_id: Optional[str] = None) -> Optional[List[float]]:
+    """ユーザー音声プロファイル（userEmbeddings）の埋め込みを取得
+
+    話者重心と異なるモデルで登録された旧プロファイル（ECAPA 192次元など）は照合できないためNoneを返す
+    （次回の音声学習で置き換えられる）
+    """
+    if not profile or not profile.get("embedding"):
+        return None
+
+    embedding = profile["embedding"]
+    if profile.get("embeddingModel") != SEGMENT_EMBEDDING_MODEL or len(embedding) != SEGMENT_EMBEDDING_DIMENSION:
+        logger.warning(
+            f"User embedding for {user_id or 'unknown user'} was computed with "
+            f"{profile.get('embeddingModel') or 'a legacy model'} ({len(embedding)}-d); re-enrollment required"
+        )
+        return None
+
+    return embedding
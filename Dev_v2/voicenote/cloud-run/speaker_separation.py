@@ -1,19 +1,44 @@
 import os
+import asyncio
 import torch
 import torchaudio
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Union, Any, Callable, Awaitable
 from dataclasses import dataclass
-import tempfile
 from datetime import datetime
 
 # pyannote.audioのインポート
 from pyannote.audio import Pipeline
 from pyannote.core import Annotation, Segment
-from sklearn.cluster import AgglomerativeClustering
 from sklearn.metrics.pairwise import cosine_similarity
 import librosa
 
+from audio_buffer import TARGET_SAMPLE_RATE
+from chunk_manifest import ChunkManifest, ChunkSpec
+from diarization_pool import DiarizationPool, DIARIZATION_WORKERS, buffer_slice
+from model_registry import (
+    model_registry, diarization_pipeline_key, segment_embedding_key,
+    SEGMENT_EMBEDDING_MODEL, SEGMENT_EMBEDDING_DIMENSION
+)
+from segment_intervals import merge_speaker_overlaps
+from speaker_clustering import SpeakerClusterer
+from speaker_embedding import SpeakerEmbeddingExtractor
+from speaker_identification import match_speakers
+
+# 話者埋め込みの取得方法
+# "pipeline": 話者分離パイプラインが内部で計算した話者重心を再利用（追加の埋め込み計算なし）
+# "segment": セグメント毎に埋め込みモデルで再計算してクラスタリング
+SPEAKER_EMBEDDING_MODE = os.environ.get("SPEAKER_EMBEDDING_MODE", "pipeline")
+
+# ストリーミング話者分離の窓設定（窓の重なり部分の中央で担当区間を切り替える）
+STREAMING_WINDOW_SECONDS = float(os.environ.get("STREAMING_WINDOW_SECONDS", 600.0))
+STREAMING_OVERLAP_SECONDS = float(os.environ.get("STREAMING_OVERLAP_SECONDS", 60.0))
+# 窓内の話者を既存の話者に対応付けるコサイン類似度の下限
+STREAMING_MATCH_THRESHOLD = float(os.environ.get("STREAMING_MATCH_THRESHOLD", 0.5))
+
+# 音声ファイルパス、または {"waveform": (1, samples) のTensor, "sample_rate": int}
+AudioInput = Union[str, Dict[str, Any]]
+
 @dataclass
 class SpeakerSegment:
     start: float
@@ -30,66 +55,106 @@ class GlobalSpeaker:
     confidence: float
     segments_count: int
 
+@dataclass
+class RunningSpeaker:
+    """ストリーミング話者分離で窓を跨いで保持する話者状態"""
+    id: str
+    centroid: np.ndarray
+    weight: float  # これまでの発話時間（秒）
+    segments_count: int = 0
+
 class SpeakerSeparationService:
     """高精度話者分離サービス"""
     
-    def __init__(self, device: str = "cpu"):
+    def __init__(self, device: str = "cpu", embedding_mode: str = SPEAKER_EMBEDDING_MODE,
+                 diarization_workers: int = DIARIZATION_WORKERS):
         self.device = device
-        self.pipeline = None
-        self.embedding_model = None
-        self._initialize_models()
+        self.embedding_mode = embedding_mode
+        self.diarization_workers = diarization_workers
+        self.diarization_pool: Optional[DiarizationPool] = None
+        self.clusterer = SpeakerClusterer()
+        # モデルはプロセス内で共有（初回利用時に1度だけ読み込み、失敗時はNoneでモック処理）
+        self.pipeline_key = diarization_pipeline_key(device)
+        self.embedding_key = segment_embedding_key(device)
     
-    def _initialize_models(self):
-        """pyannote.audioモデルの初期化"""
-        try:
-            # 話者分離パイプライン
-            self.pipeline = Pipeline.from_pretrained(
-                "pyannote/speaker-diarization-3.1",
-                use_auth_token=os.environ.get("HUGGINGFACE_TOKEN")
-            )
-            
-            # 話者埋め込みモデル
-            self.embedding_model = Pipeline.from_pretrained(
-                "pyannote/embedding",
-                use_auth_token=os.environ.get("HUGGINGFACE_TOKEN")
-            )
-            
-            if torch.cuda.is_available() and self.device == "cuda":
-                self.pipeline = self.pipeline.to(torch.device("cuda"))
-                self.embedding_model = self.embedding_model.to(torch.device("cuda"))
-                
-            print("✅ pyannote.audio models initialized successfully")
-            
-        except Exception as e:
-            print(f"❌ Failed to initialize pyannote.audio models: {str(e)}")
-            # フォールバックとしてモック処理
-            self.pipeline = None
-            self.embedding_model = None
-    
-    async def analyze_speakers(self, audio_path: str, max_speakers: int = 5, 
-                             user_embedding: Optional[np.ndarray] = None) -> Dict[str, any]:
-        """音声ファイルの話者分離分析"""
+    @property
+    def pipeline(self) -> Optional[Pipeline]:
+        """話者分離パイプライン"""
+        return model_registry.get(self.pipeline_key)
+    
+    @property
+    def embedding_model(self) -> Optional[SpeakerEmbeddingExtractor]:
+        """話者埋め込みモデル（セグメントをまとめてバッチ推論）"""
+        return model_registry.get(self.embedding_key)
+    
+    async def initialize(self):
+        """pyannote.audioモデルの読み込み（読み込み済みなら何もしない）"""
+        await model_registry.warm_up([self.pipeline_key, self.embedding_key])
+        if self.pipeline is None:
+            print("❌ Failed to initialize pyannote.audio models, falling back to mock analysis")
+    
+    async def analyze_speakers(self, audio: AudioInput, max_speakers: int = 5, 
+                             user_embedding: Optional[np.ndarray] = None,
+                             min_speakers: int = 1) -> Dict[str, any]:
+        """話者分離分析（メモリ上の波形を渡した場合はパイプラインと埋め込み抽出で共有）"""
         try:
+            await self.initialize()
             if self.pipeline is None:
-                return await self._mock_speaker_analysis(audio_path, max_speakers)
+                return await self._mock_speaker_analysis(audio, max_speakers)
             
-            # 音声読み込み
-            waveform, sample_rate = torchaudio.load(audio_path)
+            # 音声読み込み（パスの場合も一度だけデコードし、以降は同じTensorを使う）
+            audio_input = self._load_audio_input(audio)
+            waveform, sample_rate = audio_input["waveform"], audio_input["sample_rate"]
             
             # pyannote.audioで話者分離実行
-            diarization = self.pipeline(audio_path)
+            captured = {}
+            
+            def capture_embeddings(step_name, step_artifact, file=None, total=None, completed=None):
+                # バッチ毎の進捗通知（total付き）は無視し、全チャンク分の埋め込みのみ保持
+                if step_name == "embeddings" and total is None:
+                    captured["chunk_embeddings"] = step_artifact
+            
+            # 推論はイベントループを塞がないようスレッドで実行
+            loop = asyncio.get_event_loop()
+            if self.embedding_mode == "pipeline":
+                diarization, centroids = await loop.run_in_executor(None, lambda: self.pipeline(
+                    audio_input, hook=capture_embeddings, return_embeddings=True,
+                    min_speakers=min_speakers, max_speakers=max_speakers
+                ))
+            else:
+                diarization, centroids = await loop.run_in_executor(None, lambda: self.pipeline(
+                    audio_input, min_speakers=min_speakers, max_speakers=max_speakers
+                )), None
             
             # セグメント抽出
             segments = self._extract_segments(diarization, waveform, sample_rate)
             
-            # 話者埋め込み抽出
-            segments_with_embeddings = await self._extract_speaker_embeddings(
-                audio_path, segments
-            )
+            # 話者埋め込み（パイプラインの話者重心が使えればそのまま使用）
+            speaker_centroids = self._get_pipeline_centroids(diarization, centroids, segments, waveform, sample_rate)
+            
+            if speaker_centroids is not None:
+                embedding_source = "pipeline"
+                for segment in segments:
+                    segment.embedding = speaker_centroids[segment.speaker]
+                segments_with_embeddings = segments
+                speaker_confidences = self._calculate_centroid_confidences(
+                    speaker_centroids, captured.get("chunk_embeddings")
+                )
+            else:
+                embedding_source = "segment"
+                segments_with_embeddings = await self._extract_speaker_embeddings(
+                    segments, waveform, sample_rate
+                )
+                speaker_confidences = None
             
             # グローバル話者クラスタリング
             global_speakers = await self._create_global_speakers(
-                segments_with_embeddings, user_embedding
+                segments_with_embeddings,
+                user_embedding,
+                speaker_centroids=speaker_centroids,
+                speaker_confidences=speaker_confidences,
+                min_speakers=min_speakers,
+                max_speakers=max_speakers
             )
             
             # セグメントに最終話者ラベルを適用
@@ -106,38 +171,280 @@ class SpeakerSeparationService:
                     "model": "pyannote/speaker-diarization-3.1",
                     "device": self.device,
                     "total_segments": len(final_segments),
-                    "audio_duration": self._get_audio_duration(audio_path)
+                    "audio_duration": waveform.shape[1] / sample_rate,
+                    "embedding_source": embedding_source
                 }
             }
             
         except Exception as e:
             print(f"Speaker analysis failed: {str(e)}")
-            return await self._mock_speaker_analysis(audio_path, max_speakers)
+            return await self._mock_speaker_analysis(audio, max_speakers)
     
-    async def analyze_speakers_chunked(self, audio_chunks: List[str], 
-                                     chunk_overlap_sec: float = 300.0,
-                                     user_embedding: Optional[np.ndarray] = None) -> Dict[str, any]:
-        """チャンク分割音声の話者分離（8時間対応）"""
+    def _load_audio_input(self, audio: AudioInput) -> Dict[str, Any]:
+        """パイプライン入力形式（16kHzモノラルの波形）に変換"""
+        if not isinstance(audio, str):
+            return audio
+        
+        waveform, sample_rate = torchaudio.load(audio)
+        waveform = waveform.mean(dim=0, keepdim=True)
+        if sample_rate != TARGET_SAMPLE_RATE:
+            waveform = torchaudio.functional.resample(waveform, sample_rate, TARGET_SAMPLE_RATE)
+        
+        return {"waveform": waveform, "sample_rate": TARGET_SAMPLE_RATE}
+    
+    async def analyze_speakers_streaming(
+        self,
+        audio: AudioInput,
+        max_speakers: int = 5,
+        user_embedding: Optional[np.ndarray] = None,
+        window_seconds: float = STREAMING_WINDOW_SECONDS,
+        overlap_seconds: float = STREAMING_OVERLAP_SECONDS,
+        on_window: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+        min_speakers: int = 1,
+        match_threshold: Optional[float] = None
+    ) -> Dict[str, any]:
+        """重なり付きの窓毎に話者分離し、話者重心を引き継いでラベルを揃える（長時間音声用）
+
+        話者数の上下限は各窓の話者分離に渡し、窓間の話者は類似度の合計が最大となる1対1の割り当てで対応付ける
+        """
         try:
-            all_chunk_results = []
-            global_embeddings = []
+            await self.initialize()
+            if self.pipeline is None:
+                return await self._mock_speaker_analysis(audio, max_speakers)
+            
+            if match_threshold is None:
+                match_threshold = STREAMING_MATCH_THRESHOLD
+            
+            if not 0 <= overlap_seconds < window_seconds:
+                raise ValueError(f"Overlap ({overlap_seconds}s) must be shorter than the window ({window_seconds}s)")
+            
+            audio_input = self._load_audio_input(audio)
+            waveform, sample_rate = audio_input["waveform"], audio_input["sample_rate"]
+            duration = waveform.shape[-1] / sample_rate
             
-            # 各チャンクを個別に処理
-            for i, chunk_path in enumerate(audio_chunks):
-                print(f"Processing chunk {i+1}/{len(audio_chunks)}")
+            step = window_seconds - overlap_seconds
+            window_count = max(1, int(np.ceil(max(duration - overlap_seconds, 0) / step)))
+            
+            running_speakers: List[RunningSpeaker] = []
+            final_segments: List[SpeakerSegment] = []
+            loop = asyncio.get_event_loop()
+            
+            for window_index in range(window_count):
+                window_start = window_index * step
+                window_end = duration if window_index == window_count - 1 else window_start + window_seconds
+                
+                # 担当区間: 前後の窓との重なりの中央で区切る
+                core_start = 0.0 if window_index == 0 else window_start + overlap_seconds / 2
+                core_end = duration if window_index == window_count - 1 else window_end - overlap_seconds / 2
+                
+                start_sample = int(window_start * sample_rate)
+                end_sample = int(window_end * sample_rate)
+                window_waveform = waveform[:, start_sample:end_sample]
                 
-                chunk_result = await self.analyze_speakers(
-                    chunk_path, max_speakers=10, user_embedding=user_embedding
+                window_segments, local_centroids = await loop.run_in_executor(
+                    None,
+                    self._diarize_window,
+                    {"waveform": window_waveform, "sample_rate": sample_rate},
+                    max_speakers,
+                    min_speakers
                 )
                 
+                # 窓内の話者を既存話者に対応付け、重心を発話時間で重み付け更新
+                label_mapping = self._update_running_speakers(
+                    running_speakers, local_centroids, window_segments, max_speakers, match_threshold
+                )
+                
+                new_segments = []
+                for segment in window_segments:
+                    start = max(segment.start + window_start, core_start)
+                    end = min(segment.end + window_start, core_end)
+                    if end <= start or segment.speaker not in label_mapping:
+                        continue
+                    
+                    speaker = running_speakers[label_mapping[segment.speaker]]
+                    speaker.segments_count += 1
+                    new_segments.append(SpeakerSegment(
+                        start=start,
+                        end=end,
+                        speaker=speaker.id,
+                        confidence=segment.confidence
+                    ))
+                
+                new_segments.sort(key=lambda seg: seg.start)
+                final_segments.extend(new_segments)
+                
+                if on_window is not None:
+                    await on_window({
+                        "window_index": window_index,
+                        "total_windows": window_count,
+                        "window_start": core_start,
+                        "window_end": core_end,
+                        "segments": [self._segment_to_dict(seg) for seg in new_segments],
+                        "speaker_count": len(running_speakers)
+                    })
+            
+            active_indices = [index for index, speaker in enumerate(running_speakers) if speaker.segments_count > 0]
+            user_index = self._find_user_speaker(
+                [running_speakers[index].centroid for index in active_indices], user_embedding
+            )
+            
+            global_speakers = [
+                GlobalSpeaker(
+                    id=running_speakers[index].id,
+                    name="あなた" if position == user_index else f"話者{index + 1}",
+                    embedding=running_speakers[index].centroid,
+                    confidence=0.9,
+                    segments_count=running_speakers[index].segments_count
+                )
+                for position, index in enumerate(active_indices)
+            ]
+            
+            return {
+                "speaker_count": len(global_speakers),
+                "segments": [self._segment_to_dict(seg) for seg in final_segments],
+                "global_speakers": [self._speaker_to_dict(spk) for spk in global_speakers],
+                "consistency_score": self._calculate_consistency_score(final_segments),
+                "processing_info": {
+                    "model": "pyannote/speaker-diarization-3.1",
+                    "device": self.device,
+                    "total_segments": len(final_segments),
+                    "audio_duration": duration,
+                    "embedding_source": "streaming",
+                    "windows": window_count
+                }
+            }
+            
+        except Exception as e:
+            print(f"Streaming speaker analysis failed: {str(e)}")
+            return await self._mock_speaker_analysis(audio, max_speakers)
+    
+    def _diarize_window(self, window_input: Dict[str, Any], max_speakers: int = 5,
+                        min_speakers: int = 1) -> Tuple[List[SpeakerSegment], Dict[str, np.ndarray]]:
+        """1窓分の話者分離と話者毎の重心（パイプラインの重心が使えなければセグメント埋め込みの平均）"""
+        diarization, centroids = self.pipeline(
+            window_input, return_embeddings=True, min_speakers=min_speakers, max_speakers=max_speakers
+        )
+        segments = self._extract_segments(diarization, window_input["waveform"], window_input["sample_rate"])
+        
+        speaker_centroids = self._get_pipeline_centroids(
+            diarization, centroids, segments, window_input["waveform"], window_input["sample_rate"]
+        )
+        if speaker_centroids is not None or self.embedding_model is None or not segments:
+            return segments, speaker_centroids or {}
+        
+        embeddings = self.embedding_model.extract(
+            window_input["waveform"],
+            window_input["sample_rate"],
+            [(segment.start, segment.end) for segment in segments]
+        )
+        
+        grouped: Dict[str, List[np.ndarray]] = {}
+        for segment, embedding in zip(segments, embeddings):
+            if embedding is not None:
+                grouped.setdefault(segment.speaker, []).append(embedding)
+        
+        return segments, {label: np.mean(values, axis=0) for label, values in grouped.items()}
+    
+    def _update_running_speakers(self, running_speakers: List[RunningSpeaker],
+                                 local_centroids: Dict[str, np.ndarray],
+                                 window_segments: List[SpeakerSegment],
+                                 max_speakers: int,
+                                 match_threshold: float = STREAMING_MATCH_THRESHOLD) -> Dict[str, int]:
+        """窓内話者と既存話者を1対1で対応付け（類似度の合計が最大となる割り当てのうち閾値を超える組を採用）"""
+        durations: Dict[str, float] = {}
+        for segment in window_segments:
+            durations[segment.speaker] = durations.get(segment.speaker, 0.0) + (segment.end - segment.start)
+        
+        labels = [label for label in local_centroids if durations.get(label, 0.0) > 0]
+        mapping: Dict[str, int] = {}
+        
+        if labels and running_speakers:
+            assignments, _ = match_speakers(
+                np.array([local_centroids[label] for label in labels]),
+                np.array([speaker.centroid for speaker in running_speakers]),
+                match_threshold
+            )
+            for label, speaker_index in zip(labels, assignments):
+                if speaker_index >= 0:
+                    mapping[label] = int(speaker_index)
+        
+        # 対応しない話者は新規話者（上限到達後は最も近い既存話者に統合）
+        for label in labels:
+            if label in mapping:
+                continue
+            if len(running_speakers) < max_speakers:
+                running_speakers.append(RunningSpeaker(
+                    id=f"SPEAKER_{len(running_speakers):02d}",
+                    centroid=np.asarray(local_centroids[label], dtype=np.float32),
+                    weight=0.0
+                ))
+                mapping[label] = len(running_speakers) - 1
+            else:
+                similarities = cosine_similarity(
+                    np.asarray(local_centroids[label]).reshape(1, -1),
+                    np.array([speaker.centroid for speaker in running_speakers])
+                )[0]
+                mapping[label] = int(np.argmax(similarities))
+        
+        for label, speaker_index in mapping.items():
+            speaker = running_speakers[speaker_index]
+            total_weight = speaker.weight + durations[label]
+            speaker.centroid = (
+                speaker.centroid * speaker.weight + local_centroids[label] * durations[label]
+            ) / total_weight
+            speaker.weight = total_weight
+        
+        return mapping
+    
+    async def analyze_speakers_chunked(self, manifest: ChunkManifest,
+                                     user_embedding: Optional[np.ndarray] = None,
+                                     audio_buffer=None,
+                                     max_speakers: int = 5) -> Dict[str, any]:
+        """チャンク分割音声の話者分離（8時間対応、時刻はマニフェストの実際の分割境界で補正）"""
+        try:
+            all_chunk_results = []
+            global_embeddings = []
+            chunk_overlap_sec = manifest.overlap_seconds
+            
+            if self.diarization_workers > 1 and len(manifest) > 1:
+                # ワーカープロセスでチャンクを並列処理（ワーカーには共有バッファのパスと区間を渡す）
+                pool = self._get_diarization_pool()
+                print(f"Processing {len(manifest)} chunks on {pool.workers} diarization workers")
+                chunk_results = await asyncio.gather(*[
+                    pool.diarize(
+                        self._chunk_worker_input(chunk, audio_buffer),
+                        max_speakers=max_speakers,
+                        user_embedding=user_embedding
+                    )
+                    for chunk in manifest
+                ])
+            else:
+                # 各チャンクを個別に処理
+                chunk_results = []
+                for chunk in manifest:
+                    print(f"Processing chunk {chunk.index + 1}/{len(manifest)}")
+                    
+                    chunk_results.append(await self.analyze_speakers(
+                        self._chunk_audio_input(chunk, audio_buffer),
+                        max_speakers=max_speakers,
+                        user_embedding=user_embedding
+                    ))
+            
+            for chunk, chunk_result in zip(manifest, chunk_results):
+                i = chunk.index
+                
                 # チャンク結果にオフセットを適用
-                chunk_offset = i * (30 * 60 - chunk_overlap_sec)  # 30分 - オーバーラップ
-                chunk_result = self._apply_time_offset(chunk_result, chunk_offset)
+                chunk_result = self._apply_time_offset(chunk_result, chunk.start_time)
+                for segment in chunk_result["segments"]:
+                    segment["chunk_id"] = i
                 
                 all_chunk_results.append(chunk_result)
                 
-                # グローバル埋め込み収集
+                # グローバル埋め込み収集（別モデルの埋め込み、例えばモック結果は統合に混ぜない）
                 for speaker in chunk_result["global_speakers"]:
+                    if speaker.get("embedding_model") != SEGMENT_EMBEDDING_MODEL:
+                        print(f"Skipping chunk {i} speaker {speaker['id']} embedded with {speaker.get('embedding_model')}")
+                        continue
                     global_embeddings.append({
                         "embedding": speaker["embedding"], 
                         "chunk_id": i,
@@ -146,7 +453,7 @@ class SpeakerSeparationService:
             
             # グローバル話者統合
             unified_speakers = await self._unify_global_speakers(
-                all_chunk_results, global_embeddings, user_embedding
+                all_chunk_results, global_embeddings, user_embedding, max_speakers
             )
             
             # 全セグメントを統合
@@ -154,23 +461,21 @@ class SpeakerSeparationService:
             for chunk_result in all_chunk_results:
                 all_segments.extend(chunk_result["segments"])
             
-            # 重複セグメントの処理
-            cleaned_segments = self._resolve_overlapping_segments(
-                all_segments, chunk_overlap_sec
-            )
-            
             # 最終話者ラベル適用
-            final_segments = self._apply_unified_speaker_labels(
-                cleaned_segments, unified_speakers
+            labeled_segments = self._apply_unified_speaker_labels(
+                all_segments, unified_speakers
             )
             
+            # チャンク間オーバーラップで二重検出された同一話者のセグメントを統合（別話者の同時発話は残す）
+            final_segments = merge_speaker_overlaps(labeled_segments)
+            
             return {
                 "speaker_count": len(unified_speakers),
                 "segments": final_segments,
                 "global_speakers": unified_speakers,
                 "consistency_score": self._calculate_global_consistency_score(final_segments),
                 "chunk_info": {
-                    "total_chunks": len(audio_chunks),
+                    "total_chunks": len(manifest),
                     "overlap_seconds": chunk_overlap_sec,
                     "unified_speakers": len(unified_speakers)
                 }
@@ -180,46 +485,172 @@ class SpeakerSeparationService:
             print(f"Chunked speaker analysis failed: {str(e)}")
             raise
     
-    async def _extract_speaker_embeddings(self, audio_path: str, 
-                                        segments: List[SpeakerSegment]) -> List[SpeakerSegment]:
-        """各セグメントの話者埋め込みを抽出"""
-        if self.embedding_model is None:
+    def _chunk_audio_input(self, chunk: ChunkSpec, audio_buffer=None) -> AudioInput:
+        """チャンクの音声入力（共有バッファがあればそのビュー、なければ書き出し済みのファイル）"""
+        if audio_buffer is not None:
+            return audio_buffer.as_pipeline_input(chunk.start_time, chunk.end_time)
+        if chunk.path:
+            return chunk.path
+        raise ValueError(f"Chunk {chunk.index} has neither a file nor a source buffer")
+    
+    def _chunk_worker_input(self, chunk: ChunkSpec, audio_buffer=None) -> AudioInput:
+        """ワーカープロセスに渡せるチャンクの音声入力（共有バッファがあれば再読み込みせずその区間を渡す）"""
+        if audio_buffer is not None:
+            return buffer_slice(audio_buffer.buffer_path, audio_buffer.sample_rate, chunk.start_time, chunk.end_time)
+        if chunk.path:
+            return chunk.path
+        raise ValueError(f"Chunk {chunk.index} has neither a file nor a source buffer")
+    
+    def shutdown(self):
+        """話者分離ワーカープールを停止"""
+        if self.diarization_pool is not None:
+            self.diarization_pool.shutdown()
+            self.diarization_pool = None
+    
+    def _get_diarization_pool(self) -> DiarizationPool:
+        """話者分離ワーカープール（初回利用時に起動）"""
+        if self.diarization_pool is None:
+            self.diarization_pool = DiarizationPool(self.diarization_workers)
+        return self.diarization_pool
+    
+    def _apply_time_offset(self, chunk_result: Dict, offset: float) -> Dict:
+        """チャンク内の時刻を音声全体の時刻に変換"""
+        shifted_result = dict(chunk_result)
+        shifted_result["segments"] = [
+            dict(segment, start=segment["start"] + offset, end=segment["end"] + offset)
+            for segment in chunk_result["segments"]
+        ]
+        return shifted_result
+    
+    async def _extract_speaker_embeddings(self, segments: List[SpeakerSegment],
+                                        waveform: torch.Tensor,
+                                        sample_rate: int) -> List[SpeakerSegment]:
+        """各セグメントの話者埋め込みを抽出（メモリ上の波形からバッチ推論）"""
+        if self.embedding_model is None or not segments:
             return segments
         
         try:
-            # 音声読み込み
-            waveform, sample_rate = torchaudio.load(audio_path)
-            
-            segments_with_embeddings = []
+            loop = asyncio.get_event_loop()
+            embeddings = await loop.run_in_executor(
+                None,
+                self.embedding_model.extract,
+                waveform,
+                sample_rate,
+                [(segment.start, segment.end) for segment in segments]
+            )
             
-            for segment in segments:
-                # セグメント音声抽出
-                start_sample = int(segment.start * sample_rate)
-                end_sample = int(segment.end * sample_rate)
-                segment_waveform = waveform[:, start_sample:end_sample]
-                
-                # 埋め込み抽出
-                if segment_waveform.shape[1] > 0:
-                    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-                        torchaudio.save(tmp_file.name, segment_waveform, sample_rate)
-                        
-                        embedding = self.embedding_model(tmp_file.name)
-                        segment.embedding = np.array(embedding.data).flatten()
-                        
-                        os.unlink(tmp_file.name)
-                
-                segments_with_embeddings.append(segment)
+            for segment, embedding in zip(segments, embeddings):
+                segment.embedding = embedding
             
-            return segments_with_embeddings
+            return segments
             
         except Exception as e:
             print(f"Embedding extraction failed: {str(e)}")
             return segments
     
+    def _get_pipeline_centroids(self, diarization: Annotation,
+                                centroids: Optional[np.ndarray],
+                                segments: List[SpeakerSegment],
+                                waveform: torch.Tensor,
+                                sample_rate: int) -> Optional[Dict[str, np.ndarray]]:
+        """パイプラインの話者重心をラベル毎に取得（欠損・NaNの話者のみ同じ埋め込みモデルで再計算、揃わなければNone）"""
+        if centroids is None:
+            return None
+        
+        # 重心はdiarization.labels()の順に並んでいる
+        labels = diarization.labels()
+        if len(labels) == 0 or centroids.shape[0] < len(labels):
+            return None
+        
+        speaker_centroids = {}
+        missing_labels = []
+        for label, centroid in zip(labels, centroids):
+            # クラスタに割り当てられなかった話者はNaNまたはゼロ埋めの重心になる
+            if np.any(np.isnan(centroid)) or not np.any(centroid):
+                missing_labels.append(label)
+            else:
+                speaker_centroids[label] = np.asarray(centroid, dtype=np.float32)
+        
+        if missing_labels:
+            recomputed = self._recompute_centroids(
+                missing_labels, segments, waveform, sample_rate, centroids.shape[1]
+            )
+            if recomputed is None:
+                print(f"Pipeline centroids for {missing_labels} are unavailable, falling back to segment embeddings")
+                return None
+            speaker_centroids.update(recomputed)
+        
+        return {label: speaker_centroids[label] for label in labels}
+    
+    def _recompute_centroids(self, labels: List[str], segments: List[SpeakerSegment],
+                             waveform: torch.Tensor, sample_rate: int,
+                             dimension: int) -> Optional[Dict[str, np.ndarray]]:
+        """欠損した話者の重心をセグメント埋め込みの平均で補う（パイプラインと同じ埋め込み空間の場合のみ）"""
+        if self.embedding_model is None or self.embedding_model.dimension != dimension:
+            return None
+        
+        label_segments = [segment for segment in segments if segment.speaker in labels]
+        embeddings = self.embedding_model.extract(
+            waveform, sample_rate, [(segment.start, segment.end) for segment in label_segments]
+        )
+        
+        grouped: Dict[str, List[np.ndarray]] = {}
+        for segment, embedding in zip(label_segments, embeddings):
+            if embedding is not None:
+                grouped.setdefault(segment.speaker, []).append(embedding)
+        
+        if any(label not in grouped for label in labels):
+            return None
+        return {label: np.mean(grouped[label], axis=0).astype(np.float32) for label in labels}
+    
+    def _calculate_centroid_confidences(self, speaker_centroids: Dict[str, np.ndarray],
+                                        chunk_embeddings: Optional[np.ndarray]) -> Optional[Dict[str, float]]:
+        """チャンク毎の埋め込みと最寄りの話者重心との類似度の平均（話者毎のまとまりの良さ）"""
+        if chunk_embeddings is None:
+            return None
+        
+        # (チャンク数, ローカル話者数, 次元) から有効な埋め込みのみ取り出す
+        embeddings = chunk_embeddings.reshape(-1, chunk_embeddings.shape[-1])
+        embeddings = embeddings[~np.any(np.isnan(embeddings), axis=1)]
+        if len(embeddings) == 0:
+            return None
+        
+        labels = list(speaker_centroids.keys())
+        similarities = cosine_similarity(embeddings, np.array([speaker_centroids[label] for label in labels]))
+        nearest = np.argmax(similarities, axis=1)
+        
+        confidences = {}
+        for index, label in enumerate(labels):
+            members = similarities[nearest == index, index]
+            if len(members) > 0:
+                confidences[label] = float(np.clip(np.mean(members), 0.0, 1.0))
+        return confidences
+    
+    def _find_user_speaker(self, centroids: List[np.ndarray],
+                           user_embedding: Optional[np.ndarray]) -> Optional[int]:
+        """ユーザー本人と判定された話者の番号（全話者を一括で照合し、該当は最大1人）"""
+        if user_embedding is None or not centroids:
+            return None
+        
+        assignments, _ = match_speakers(
+            np.array(centroids), np.asarray(user_embedding).reshape(1, -1)
+        )
+        matched = np.flatnonzero(assignments >= 0)
+        return int(matched[0]) if len(matched) else None
+    
     async def _create_global_speakers(self, segments: List[SpeakerSegment],
-                                    user_embedding: Optional[np.ndarray] = None) -> List[GlobalSpeaker]:
-        """グローバル話者作成"""
+                                    user_embedding: Optional[np.ndarray] = None,
+                                    speaker_centroids: Optional[Dict[str, np.ndarray]] = None,
+                                    speaker_confidences: Optional[Dict[str, float]] = None,
+                                    min_speakers: int = 1,
+                                    max_speakers: int = 5) -> List[GlobalSpeaker]:
+        """グローバル話者作成（パイプラインの話者重心があればクラスタリングを省略）"""
         try:
+            if speaker_centroids is not None:
+                return self._create_speakers_from_centroids(
+                    segments, speaker_centroids, user_embedding, speaker_confidences or {}
+                )
+            
             # 埋め込みがあるセグメントのみを使用
             valid_segments = [seg for seg in segments if seg.embedding is not None]
             
@@ -229,38 +660,27 @@ class SpeakerSeparationService:
             # 埋め込み行列作成
             embeddings = np.array([seg.embedding for seg in valid_segments])
             
-            # 階層クラスタリングで話者をグループ化
-            n_clusters = min(5, len(valid_segments))
-            clustering = AgglomerativeClustering(
-                n_clusters=n_clusters,
-                metric='cosine',
-                linkage='average'
-            )
+            # 話者数を推定してクラスタリング（多数のセグメントは微小クラスタ経由）
+            n_clusters = self.clusterer.estimate_speaker_count(embeddings, min_speakers, max_speakers)
+            speaker_labels = self.clusterer.fit_predict(embeddings, n_clusters)
+            
+            # 代表埋め込み計算
+            cluster_ids = np.unique(speaker_labels)
+            representative_embeddings = [
+                np.mean(embeddings[speaker_labels == cluster_id], axis=0) for cluster_id in cluster_ids
+            ]
             
-            speaker_labels = clustering.fit_predict(embeddings)
+            # ユーザー埋め込みとの照合（全クラスタを一括）
+            user_index = self._find_user_speaker(representative_embeddings, user_embedding)
             
             # グローバル話者作成
             global_speakers = []
-            for cluster_id in np.unique(speaker_labels):
-                cluster_segments = [
-                    valid_segments[i] for i in range(len(valid_segments)) 
-                    if speaker_labels[i] == cluster_id
-                ]
-                
-                # 代表埋め込み計算
-                cluster_embeddings = np.array([seg.embedding for seg in cluster_segments])
-                representative_embedding = np.mean(cluster_embeddings, axis=0)
-                
-                # ユーザー埋め込みとの類似度チェック
-                is_user = False
-                if user_embedding is not None:
-                    similarity = cosine_similarity(
-                        representative_embedding.reshape(1, -1),
-                        user_embedding.reshape(1, -1)
-                    )[0][0]
-                    is_user = similarity > 0.8  # 閾値
+            for position, cluster_id in enumerate(cluster_ids):
+                cluster_indices = np.where(speaker_labels == cluster_id)[0]
+                cluster_segments = [valid_segments[i] for i in cluster_indices]
+                representative_embedding = representative_embeddings[position]
                 
-                speaker_name = "あなた" if is_user else f"話者{cluster_id + 1}"
+                speaker_name = "あなた" if position == user_index else f"話者{cluster_id + 1}"
                 
                 global_speaker = GlobalSpeaker(
                     id=f"SPEAKER_{cluster_id:02d}",
@@ -278,6 +698,81 @@ class SpeakerSeparationService:
             print(f"Global speaker creation failed: {str(e)}")
             return self._create_default_speakers(min(3, len(segments)))
     
+    def _create_speakers_from_centroids(self, segments: List[SpeakerSegment],
+                                        speaker_centroids: Dict[str, np.ndarray],
+                                        user_embedding: Optional[np.ndarray],
+                                        speaker_confidences: Dict[str, float]) -> List[GlobalSpeaker]:
+        """パイプラインの話者毎にグローバル話者を作成"""
+        speakers = []
+        for speaker_index, (label, centroid) in enumerate(speaker_centroids.items()):
+            speaker_segments = [seg for seg in segments if seg.speaker == label]
+            if speaker_segments:
+                speakers.append((speaker_index, label, centroid, speaker_segments))
+        
+        user_index = self._find_user_speaker([speaker[2] for speaker in speakers], user_embedding)
+        
+        global_speakers = []
+        for position, (speaker_index, label, centroid, speaker_segments) in enumerate(speakers):
+            is_user = position == user_index
+            confidence = speaker_confidences.get(
+                label, float(np.mean([seg.confidence for seg in speaker_segments]))
+            )
+            
+            global_speakers.append(GlobalSpeaker(
+                id=f"SPEAKER_{speaker_index:02d}",
+                name="あなた" if is_user else f"話者{speaker_index + 1}",
+                embedding=centroid,
+                confidence=confidence,
+                segments_count=len(speaker_segments)
+            ))
+        
+        return global_speakers
+    
+    def _apply_global_speaker_labels(self, segments: List[SpeakerSegment],
+                                     global_speakers: List[GlobalSpeaker]) -> List[SpeakerSegment]:
+        """各セグメントに最も近いグローバル話者のラベルを付与"""
+        if not global_speakers:
+            return segments
+        
+        speaker_ids = [speaker.id for speaker in global_speakers]
+        centroids = np.array([speaker.embedding for speaker in global_speakers])
+        
+        # 埋め込みのあるセグメントはコサイン類似度で割り当て
+        assigned = {}
+        for i, segment in enumerate(segments):
+            if segment.embedding is not None:
+                similarities = cosine_similarity(segment.embedding.reshape(1, -1), centroids)[0]
+                assigned[i] = speaker_ids[int(np.argmax(similarities))]
+        
+        # 埋め込みのないセグメントは同じローカル話者の多数決に従う
+        votes: Dict[str, Dict[str, int]] = {}
+        for i, speaker_id in assigned.items():
+            local_votes = votes.setdefault(segments[i].speaker, {})
+            local_votes[speaker_id] = local_votes.get(speaker_id, 0) + 1
+        
+        for i, segment in enumerate(segments):
+            if i in assigned:
+                segment.speaker = assigned[i]
+            elif segment.speaker in votes:
+                local_votes = votes[segment.speaker]
+                segment.speaker = max(local_votes, key=local_votes.get)
+        
+        return segments
+    
+    def _create_default_speakers(self, count: int) -> List[GlobalSpeaker]:
+        """埋め込みが得られない場合の既定話者"""
+        dimension = self.embedding_model.dimension if self.embedding_model is not None else SEGMENT_EMBEDDING_DIMENSION
+        return [
+            GlobalSpeaker(
+                id=f"SPEAKER_{i:02d}",
+                name=f"話者{i + 1}",
+                embedding=np.zeros(dimension),
+                confidence=0.5,
+                segments_count=0
+            )
+            for i in range(max(1, count))
+        ]
+    
     def _extract_segments(self, diarization: Annotation, waveform: torch.Tensor, 
                          sample_rate: int) -> List[SpeakerSegment]:
         """pyannote.audioの結果からセグメントを抽出"""
@@ -295,7 +790,8 @@ class SpeakerSeparationService:
     
     async def _unify_global_speakers(self, chunk_results: List[Dict], 
                                    global_embeddings: List[Dict],
-                                   user_embedding: Optional[np.ndarray] = None) -> List[Dict]:
+                                   user_embedding: Optional[np.ndarray] = None,
+                                   max_speakers: int = 5) -> List[Dict]:
         """チャンク間でのグローバル話者統合"""
         try:
             # 全埋め込みを集める
@@ -314,42 +810,42 @@ class SpeakerSeparationService:
             
             # グローバルクラスタリング
             embeddings_matrix = np.array(all_embeddings)
-            n_clusters = min(5, len(all_embeddings))
-            
-            clustering = AgglomerativeClustering(
-                n_clusters=n_clusters,
-                metric='cosine',
-                linkage='average'
+            # 話者数は1チャンク内の最大話者数以上（同一チャンク内の別話者は統合しない前提）
+            min_speakers = max(
+                (result.get("speaker_count", 1) for result in chunk_results), default=1
             )
+            n_clusters = self.clusterer.estimate_speaker_count(
+                embeddings_matrix, min(min_speakers, max_speakers), max_speakers
+            )
+            global_labels = self.clusterer.fit_predict(embeddings_matrix, n_clusters)
+            
+            # 代表埋め込み
+            cluster_ids = np.unique(global_labels)
+            representative_embeddings = [
+                np.mean(embeddings_matrix[global_labels == cluster_id], axis=0) for cluster_id in cluster_ids
+            ]
             
-            global_labels = clustering.fit_predict(embeddings_matrix)
+            # ユーザー判定（全クラスタを一括で照合）
+            user_index = self._find_user_speaker(representative_embeddings, user_embedding)
             
             # 統合話者作成
             unified_speakers = []
-            for cluster_id in np.unique(global_labels):
+            for position, cluster_id in enumerate(cluster_ids):
                 cluster_indices = np.where(global_labels == cluster_id)[0]
-                cluster_embeddings = embeddings_matrix[cluster_indices]
-                
-                # 代表埋め込み
-                representative_embedding = np.mean(cluster_embeddings, axis=0)
-                
-                # ユーザー判定
-                is_user = False
-                if user_embedding is not None:
-                    similarity = cosine_similarity(
-                        representative_embedding.reshape(1, -1),
-                        user_embedding.reshape(1, -1)
-                    )[0][0]
-                    is_user = similarity > 0.8
+                source_speakers = [embedding_info[i] for i in cluster_indices]
+                representative_embedding = representative_embeddings[position]
                 
-                speaker_name = "あなた" if is_user else f"話者{len(unified_speakers) + 1}"
+                speaker_name = "あなた" if position == user_index else f"話者{len(unified_speakers) + 1}"
                 
                 unified_speakers.append({
                     "id": f"UNIFIED_SPEAKER_{cluster_id:02d}",
                     "name": speaker_name,
                     "embedding": representative_embedding.tolist(),
+                    "embedding_model": SEGMENT_EMBEDDING_MODEL,
+                    "embedding_dim": len(representative_embedding),
                     "confidence": 0.85,
-                    "segments_count": len(cluster_indices)
+                    "segments_count": len(cluster_indices),
+                    "source_speakers": source_speakers
                 })
             
             return unified_speakers
@@ -358,41 +854,27 @@ class SpeakerSeparationService:
             print(f"Speaker unification failed: {str(e)}")
             return self._create_default_speakers_dict(3)
     
-    def _resolve_overlapping_segments(self, segments: List[Dict], 
-                                    overlap_duration: float) -> List[Dict]:
-        """重複セグメントの解決"""
-        # 時間順にソート
-        sorted_segments = sorted(segments, key=lambda x: x["start"])
-        
-        resolved_segments = []
+    def _apply_unified_speaker_labels(self, segments: List[Dict],
+                                      unified_speakers: List[Dict]) -> List[Dict]:
+        """チャンク毎の話者ラベルを統合話者ラベルに置き換え"""
+        mapping = {
+            (source["chunk_id"], source["speaker_id"]): speaker["id"]
+            for speaker in unified_speakers
+            for source in speaker.get("source_speakers", [])
+        }
         
-        for i, segment in enumerate(sorted_segments):
-            if i == 0:
-                resolved_segments.append(segment)
-                continue
-            
-            prev_segment = resolved_segments[-1]
-            
-            # 重複チェック
-            if segment["start"] < prev_segment["end"]:
-                # 重複がある場合の処理
-                if segment["confidence"] > prev_segment["confidence"]:
-                    # 新しいセグメントの信頼度が高い場合
-                    prev_segment["end"] = segment["start"]
-                    resolved_segments.append(segment)
-                else:
-                    # 前のセグメントの信頼度が高い場合
-                    segment["start"] = prev_segment["end"]
-                    if segment["end"] > segment["start"]:
-                        resolved_segments.append(segment)
-            else:
-                resolved_segments.append(segment)
+        for segment in segments:
+            chunk_id = segment.pop("chunk_id", None)
+            segment["speaker"] = mapping.get((chunk_id, segment["speaker"]), segment["speaker"])
         
-        return resolved_segments
+        return segments
     
-    async def _mock_speaker_analysis(self, audio_path: str, max_speakers: int) -> Dict[str, any]:
+    async def _mock_speaker_analysis(self, audio: AudioInput, max_speakers: int) -> Dict[str, any]:
         """pyannote.audioが利用できない場合のモック処理"""
-        duration = self._get_audio_duration(audio_path)
+        if isinstance(audio, str):
+            duration = self._get_audio_duration(audio)
+        else:
+            duration = audio["waveform"].shape[-1] / audio["sample_rate"]
         
         # モックセグメント生成
         segments = []
@@ -419,7 +901,9 @@ class SpeakerSeparationService:
             global_speakers.append({
                 "id": f"SPEAKER_{i:02d}",
                 "name": "あなた" if i == 0 else f"話者{i + 1}",
-                "embedding": np.random.randn(512).tolist(),
+                "embedding": np.random.randn(SEGMENT_EMBEDDING_DIMENSION).tolist(),
+                "embedding_model": "mock",
+                "embedding_dim": SEGMENT_EMBEDDING_DIMENSION,
                 "confidence": np.random.uniform(0.8, 0.95),
                 "segments_count": len([s for s in segments if s["speaker"] == f"SPEAKER_{i:02d}"])
             })
@@ -455,15 +939,34 @@ class SpeakerSeparationService:
         }
     
     def _speaker_to_dict(self, speaker: GlobalSpeaker) -> Dict:
-        """GlobalSpeakerを辞書に変換"""
+        """GlobalSpeakerを辞書に変換（埋め込みには計算したモデル名と次元を付ける）"""
+        embedding = speaker.embedding.tolist() if isinstance(speaker.embedding, np.ndarray) else speaker.embedding
         return {
             "id": speaker.id,
             "name": speaker.name,
-            "embedding": speaker.embedding.tolist() if isinstance(speaker.embedding, np.ndarray) else speaker.embedding,
+            "embedding": embedding,
+            "embedding_model": SEGMENT_EMBEDDING_MODEL,
+            "embedding_dim": len(embedding),
             "confidence": speaker.confidence,
             "segments_count": speaker.segments_count
         }
     
+    def _create_default_speakers_dict(self, count: int) -> List[Dict]:
+        """既定話者の辞書形式"""
+        return [self._speaker_to_dict(speaker) for speaker in self._create_default_speakers(count)]
+    
+    def _calculate_global_consistency_score(self, segments: List[Dict]) -> float:
+        """統合後セグメント（辞書形式）の話者一貫性スコア"""
+        return self._calculate_consistency_score([
+            SpeakerSegment(
+                start=segment["start"],
+                end=segment["end"],
+                speaker=segment["speaker"],
+                confidence=segment.get("confidence", 0.0)
+            )
+            for segment in segments
+        ])
+    
     def _calculate_consistency_score(self, segments: List[SpeakerSegment]) -> float:
         """話者一貫性スコア計算"""
         if len(segments) < 2:
@@ -0,0 +1,207 @@
+"""
+Firestore / Cloud Storage アクセス層
+イベントループをブロックしない非同期インターフェースと、オフライン検証用のインメモリ実装を提供する
+"""
+import os
+import base64
+import hashlib
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# バッチ書き込み操作: (操作種別 "set" | "update", ドキュメントパス, データ)
+WriteOperation = Tuple[str, str, Dict[str, Any]]
+
+# Firestoreのバッチ書き込み上限
+MAX_BATCH_SIZE = 500
+
+
+class StorageBackend(ABC):
+    """ストレージ抽象インターフェース（ドキュメントは "collection/doc/..." 形式のパスで指定）"""
+
+    @property
+    @abstractmethod
+    def server_timestamp(self) -> Any:
+        """書き込み時刻を表す値"""
+        pass
+
+    @abstractmethod
+    async def get_document(self, path: str) -> Optional[Dict[str, Any]]:
+        """ドキュメント取得（存在しない場合はNone）"""
+        pass
+
+    @abstractmethod
+    async def set_document(self, path: str, data: Dict[str, Any]):
+        """ドキュメント作成・上書き"""
+        pass
+
+    @abstractmethod
+    async def update_document(self, path: str, data: Dict[str, Any]):
+        """ドキュメント部分更新"""
+        pass
+
+    @abstractmethod
+    async def list_documents(self, collection_path: str) -> Dict[str, Dict[str, Any]]:
+        """コレクション直下の全ドキュメント（ドキュメントID -> データ）"""
+        pass
+
+    @abstractmethod
+    async def write_batch(self, operations: List[WriteOperation]):
+        """複数ドキュメントの一括書き込み"""
+        pass
+
+    @abstractmethod
+    async def get_blob_metadata(self, bucket_name: str, blob_path: str) -> Dict[str, Any]:
+        """オブジェクトのメタデータ（size, generation, md5_hash, crc32c）を取得"""
+        pass
+
+    @abstractmethod
+    async def read_blob_range(self, bucket_name: str, blob_path: str, start: int, end: int,
+                              generation: Optional[int] = None) -> bytes:
+        """オブジェクトの [start, end) バイト範囲を取得"""
+        pass
+
+
+class GCPStorageBackend(StorageBackend):
+    """非同期Firestoreクライアント + エグゼキューター経由のCloud Storage"""
+
+    def __init__(self, max_io_workers: int = int(os.environ.get("STORAGE_IO_WORKERS", 8))):
+        from google.cloud import firestore, storage
+
+        self._firestore = firestore
+        self.db = firestore.AsyncClient()
+        self.storage_client = storage.Client()
+        self.executor = ThreadPoolExecutor(max_workers=max_io_workers, thread_name_prefix="gcs-io")
+
+    @property
+    def server_timestamp(self) -> Any:
+        return self._firestore.SERVER_TIMESTAMP
+
+    async def get_document(self, path: str) -> Optional[Dict[str, Any]]:
+        doc = await self.db.document(path).get()
+        return doc.to_dict() if doc.exists else None
+
+    async def set_document(self, path: str, data: Dict[str, Any]):
+        await self.db.document(path).set(data)
+
+    async def update_document(self, path: str, data: Dict[str, Any]):
+        await self.db.document(path).update(data)
+
+    async def list_documents(self, collection_path: str) -> Dict[str, Dict[str, Any]]:
+        return {doc.id: doc.to_dict() async for doc in self.db.collection(collection_path).stream()}
+
+    async def write_batch(self, operations: List[WriteOperation]):
+        for i in range(0, len(operations), MAX_BATCH_SIZE):
+            batch = self.db.batch()
+            for operation, path, data in operations[i:i + MAX_BATCH_SIZE]:
+                doc_ref = self.db.document(path)
+                if operation == "set":
+                    batch.set(doc_ref, data)
+                elif operation == "update":
+                    batch.update(doc_ref, data)
+                else:
+                    raise ValueError(f"Unsupported batch operation: {operation}")
+            await batch.commit()
+
+    async def get_blob_metadata(self, bucket_name: str, blob_path: str) -> Dict[str, Any]:
+        bucket = self.storage_client.bucket(bucket_name)
+        loop = asyncio.get_event_loop()
+        blob = await loop.run_in_executor(self.executor, bucket.get_blob, blob_path)
+        if blob is None:
+            raise FileNotFoundError(f"Blob not found: gs://{bucket_name}/{blob_path}")
+
+        return {
+            "size": blob.size,
+            "generation": blob.generation,
+            "md5_hash": blob.md5_hash,
+            "crc32c": blob.crc32c
+        }
+
+    async def read_blob_range(self, bucket_name: str, blob_path: str, start: int, end: int,
+                              generation: Optional[int] = None) -> bytes:
+        blob = self.storage_client.bucket(bucket_name).blob(blob_path, generation=generation)
+        loop = asyncio.get_event_loop()
+        # download_as_bytesのendは末尾を含む
+        return await loop.run_in_executor(
+            self.executor,
+            lambda: blob.download_as_bytes(start=start, end=end - 1)
+        )
+
+
+class InMemoryStorageBackend(StorageBackend):
+    """インメモリ実装（ローカル開発・オフライン検証用）"""
+
+    def __init__(self):
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.blobs: Dict[Tuple[str, str], bytes] = {}
+
+    @property
+    def server_timestamp(self) -> Any:
+        return datetime.now(timezone.utc)
+
+    def put_blob(self, bucket_name: str, blob_path: str, data: bytes):
+        """オブジェクトを登録"""
+        self.blobs[(bucket_name, blob_path)] = data
+
+    async def get_document(self, path: str) -> Optional[Dict[str, Any]]:
+        doc = self.documents.get(path)
+        return dict(doc) if doc is not None else None
+
+    async def set_document(self, path: str, data: Dict[str, Any]):
+        self.documents[path] = dict(data)
+
+    async def update_document(self, path: str, data: Dict[str, Any]):
+        if path not in self.documents:
+            raise KeyError(f"Document not found: {path}")
+        self.documents[path].update(data)
+
+    async def list_documents(self, collection_path: str) -> Dict[str, Dict[str, Any]]:
+        prefix = collection_path.rstrip("/") + "/"
+        return {
+            path[len(prefix):]: dict(doc)
+            for path, doc in self.documents.items()
+            if path.startswith(prefix) and "/" not in path[len(prefix):]
+        }
+
+    async def write_batch(self, operations: List[WriteOperation]):
+        # 全操作を検証してから適用（Firestoreのバッチと同様にアトミック）
+        for operation, path, _ in operations:
+            if operation == "update" and path not in self.documents:
+                raise KeyError(f"Document not found: {path}")
+            if operation not in ("set", "update"):
+                raise ValueError(f"Unsupported batch operation: {operation}")
+
+        for operation, path, data in operations:
+            if operation == "set":
+                await self.set_document(path, data)
+            else:
+                await self.update_document(path, data)
+
+    async def get_blob_metadata(self, bucket_name: str, blob_path: str) -> Dict[str, Any]:
+        data = self.blobs.get((bucket_name, blob_path))
+        if data is None:
+            raise FileNotFoundError(f"Blob not found: gs://{bucket_name}/{blob_path}")
+
+        return {
+            "size": len(data),
+            "generation": 1,
+            "md5_hash": base64.b64encode(hashlib.md5(data).digest()).decode(),
+            "crc32c": None
+        }
+
+    async def read_blob_range(self, bucket_name: str, blob_path: str, start: int, end: int,
+                              generation: Optional[int] = None) -> bytes:
+        data = self.blobs.get((bucket_name, blob_path))
+        if data is None:
+            raise FileNotFoundError(f"Blob not found: gs://{bucket_name}/{blob_path}")
+        return data[start:end]
+
+
+def audio_document_path(user_id: str, audio_id: str) -> str:
+    """音声ファイルドキュメントのパス"""
+    return f"audios/{user_id}/files/{audio_id}"
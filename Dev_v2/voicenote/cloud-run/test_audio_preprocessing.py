@@ -0,0 +1,63 @@
+"""
+ストリーミング前処理（StreamingResampler / WindowedNoiseReducer）の単体テスト
+ブロック単位の処理結果が一括処理と一致することを確認する
+"""
+import numpy as np
+import pytest
+
+from audio_preprocessing import StreamingResampler, WindowedNoiseReducer
+
+# ブロック境界が文脈長・窓長と揃わないよう不揃いなブロック長で入力する
+BLOCK_SIZES = [1000, 7, 4410, 1, 20000, 333]
+
+
+def _feed(processor, samples: np.ndarray) -> np.ndarray:
+    outputs = []
+    position = 0
+    index = 0
+    while position < len(samples):
+        size = BLOCK_SIZES[index % len(BLOCK_SIZES)]
+        outputs.append(processor.process(samples[position:position + size]))
+        position += size
+        index += 1
+    outputs.append(processor.process(np.zeros(0, dtype=np.float32), final=True))
+    return np.concatenate(outputs)
+
+
+@pytest.mark.parametrize("source_rate", [44100, 48000, 22050, 8000])
+def test_resampler_matches_one_shot_resample(source_rate):
+    """ブロック毎のリサンプル結果が音声全体を一括でresample_polyした結果と一致する"""
+    resample_poly = pytest.importorskip("scipy.signal").resample_poly
+
+    samples = np.random.default_rng(0).standard_normal(source_rate * 3 + 123).astype(np.float32)
+    resampler = StreamingResampler(source_rate, 16000)
+
+    streamed = _feed(resampler, samples)
+    expected = resample_poly(samples, resampler.up, resampler.down)
+
+    assert len(streamed) == len(expected)
+    np.testing.assert_allclose(streamed, expected, atol=1e-5)
+
+
+def test_resampler_passes_through_same_rate():
+    """サンプリングレートが同じなら入力をそのまま返す"""
+    samples = np.arange(10, dtype=np.float32)
+    assert StreamingResampler(16000, 16000).process(samples) is samples
+
+
+@pytest.mark.parametrize("window, overlap", [(4000, 500), (4000, 0), (1000, 999)])
+def test_noise_reducer_identity_reproduces_input(window, overlap):
+    """恒等変換のreduce_fnでは窓の接合部を含めて入力がそのまま出力される"""
+    samples = np.random.default_rng(1).standard_normal(50000).astype(np.float32)
+    original = samples.copy()
+    reducer = WindowedNoiseReducer(lambda block: block, window, overlap)
+
+    output = _feed(reducer, samples)
+
+    np.testing.assert_array_equal(output, original)
+    np.testing.assert_array_equal(samples, original)
+
+
+def test_noise_reducer_rejects_overlap_longer_than_window():
+    with pytest.raises(ValueError):
+        WindowedNoiseReducer(lambda block: block, 1000, 1000)
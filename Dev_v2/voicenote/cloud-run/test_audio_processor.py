@@ -0,0 +1,147 @@
+"""
+AudioProcessorのチャンク処理（話者セグメントの割り当て・チャンク毎の文字起こし）と作業ディレクトリ整理の単体テスト
+InMemoryStorageBackendを使い、GCP認証・文字起こしAPIなしで実行できる
+"""
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import audio_processor
+from audio_processor import AudioProcessor
+from chunk_manifest import ChunkManifest
+from storage_backend import InMemoryStorageBackend
+
+SAMPLE_RATE = 100
+
+
+class RecordingTranscriptionService:
+    """文字起こし要求の区間を記録する"""
+
+    def __init__(self):
+        self.spans = []
+
+    async def transcribe_segment(self, audio_source, start_time, end_time, config):
+        self.spans.append((start_time, end_time))
+        return SimpleNamespace(text="text", confidence=0.9, provider="fake", word_timestamps=[])
+
+
+@pytest.fixture
+def processor():
+    return AudioProcessor(InMemoryStorageBackend())
+
+
+def _manifest(duration: float, chunk_seconds: float, overlap_seconds: float) -> ChunkManifest:
+    return ChunkManifest.build(int(duration * SAMPLE_RATE), SAMPLE_RATE, chunk_seconds, overlap_seconds)
+
+
+def _assigned_chunks(assigned, segments):
+    """各セグメントが割り当てられたチャンク番号の一覧"""
+    return [
+        [index for index, chunk_segments in enumerate(assigned) if any(seg is segment for seg in chunk_segments)]
+        for segment in segments
+    ]
+
+
+def test_each_segment_is_assigned_to_exactly_one_chunk(processor):
+    """チャンク境界をまたぐ・オーバーラップ内のセグメントも、重なりの最も大きいチャンク1つにだけ割り当てる"""
+    # チャンク: [0, 30], [25, 55], [50, 80], [75, 100]
+    manifest = _manifest(100, 30, 5)
+    segments = [
+        {"start": 10.0, "end": 20.0, "speaker": "A"},   # チャンク0の内側
+        {"start": 26.0, "end": 29.0, "speaker": "B"},   # オーバーラップ内（同じ重なりなら先のチャンク）
+        {"start": 28.0, "end": 45.0, "speaker": "A"},   # 境界をまたぐ（チャンク1との重なりが大きい）
+        {"start": 40.0, "end": 90.0, "speaker": "B"},   # 3チャンクにまたがる
+        {"start": 95.0, "end": 100.0, "speaker": "A"},  # 最後のチャンク
+    ]
+
+    assigned = processor._assign_segments_to_chunks(manifest, segments)
+
+    assert _assigned_chunks(assigned, segments) == [[0], [0], [1], [2], [3]]
+    assert sum(len(chunk_segments) for chunk_segments in assigned) == len(segments)
+    for chunk_segments in assigned:
+        starts = [segment["start"] for segment in chunk_segments]
+        assert starts == sorted(starts)
+
+
+def test_assignment_without_overlap(processor):
+    """オーバーラップなしでも境界をまたぐセグメントは1チャンクにのみ割り当てる"""
+    manifest = _manifest(90, 30, 0)
+    segments = [{"start": 29.0, "end": 31.0}, {"start": 59.5, "end": 62.0}]
+
+    assigned = processor._assign_segments_to_chunks(manifest, segments)
+
+    assert _assigned_chunks(assigned, segments) == [[0], [2]]
+
+
+def test_chunk_transcribes_full_segment_across_boundary(processor):
+    """チャンク境界をまたぐセグメントもチャンク範囲で切らずに全区間を文字起こしする"""
+    manifest = _manifest(90, 30, 0)
+    segment = {"start": 29.0, "end": 31.0, "speaker": "A"}
+    service = RecordingTranscriptionService()
+    processor.transcription_service = service
+    config = {"transcription_config": {"provider": "openai", "api_key": "key", "model": "whisper-1"}}
+
+    result = asyncio.run(processor._transcribe_chunk(None, manifest[0], [segment], config))
+
+    assert result["status"] == "completed"
+    assert service.spans == [(29.0, 31.0)]
+    assert result["transcription_results"][0]["start_time"] == 29.0
+    assert result["transcription_results"][0]["end_time"] == 31.0
+
+
+def _populate_work_dir(work_dir: str):
+    os.makedirs(os.path.join(work_dir, "nested"))
+    for name in ["source", "source.state.json", "processed_abc_16000.f32", "nested/tmp"]:
+        with open(os.path.join(work_dir, name), "wb") as work_file:
+            work_file.write(b"x")
+
+
+def test_failed_job_keeps_only_resumable_files(processor, tmp_path, monkeypatch):
+    """失敗したジョブの作業ディレクトリにはダウンロード再開用のファイルのみ残す"""
+    monkeypatch.setattr(audio_processor, "JOB_WORK_ROOT", str(tmp_path))
+    work_dir = str(tmp_path / "user" / "audio")
+    _populate_work_dir(work_dir)
+
+    async def fail():
+        raise RuntimeError("model load failed")
+
+    processor.initialize = fail
+    with pytest.raises(RuntimeError):
+        asyncio.run(processor.process_audio("user", "audio", {}))
+
+    assert sorted(os.listdir(work_dir)) == ["source", "source.state.json"]
+    assert not processor._active_work_dirs
+
+
+def test_completed_job_removes_work_dir(processor, tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_processor, "JOB_WORK_ROOT", str(tmp_path))
+    work_dir = str(tmp_path / "user" / "audio")
+    _populate_work_dir(work_dir)
+
+    processor._cleanup_work_dir(work_dir, succeeded=True)
+
+    assert not os.path.exists(work_dir)
+
+
+def test_purge_removes_only_expired_idle_work_dirs(processor, tmp_path, monkeypatch):
+    """保持期間を過ぎた作業ディレクトリのみ削除し、新しいもの・実行中のものは残す"""
+    monkeypatch.setattr(audio_processor, "JOB_WORK_ROOT", str(tmp_path))
+    now = time.time()
+    expired_at = now - audio_processor.JOB_WORK_TTL_SECONDS - 60
+
+    for name in ["stale", "fresh", "running"]:
+        work_dir = str(tmp_path / "user" / name)
+        _populate_work_dir(work_dir)
+        if name != "fresh":
+            for root, dirs, files in os.walk(work_dir):
+                for entry in dirs + files:
+                    os.utime(os.path.join(root, entry), (expired_at, expired_at))
+            os.utime(work_dir, (expired_at, expired_at))
+    processor._active_work_dirs.add(str(tmp_path / "user" / "running"))
+
+    processor._purge_stale_work_dirs(now)
+
+    assert sorted(os.listdir(tmp_path / "user")) == ["fresh", "running"]
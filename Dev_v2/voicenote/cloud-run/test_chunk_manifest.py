@@ -0,0 +1,24 @@
+"""
+チャンク分割マニフェスト（ChunkManifest）の単体テスト
+"""
+import pytest
+
+from chunk_manifest import ChunkManifest
+
+
+def test_chunk_manifest_boundaries():
+    """チャンクは重なり付きで連続し、最後のチャンクが音声の末尾で終わる"""
+    sample_rate = 16000
+    manifest = ChunkManifest.build(95 * sample_rate, sample_rate, chunk_seconds=30, overlap_seconds=5)
+
+    assert [chunk.start_time for chunk in manifest] == [0.0, 25.0, 50.0, 75.0]
+    assert manifest[-1].end_sample == manifest.total_samples
+    assert manifest[0].overlap_samples == 0
+    for previous, chunk in zip(manifest.chunks, manifest.chunks[1:]):
+        assert previous.end_sample - chunk.start_sample == manifest.overlap_samples
+
+
+def test_chunk_manifest_rejects_invalid_overlap():
+    """オーバーラップがチャンク長以上なら分割しない"""
+    with pytest.raises(ValueError):
+        ChunkManifest.build(16000 * 60, 16000, chunk_seconds=10, overlap_seconds=10)
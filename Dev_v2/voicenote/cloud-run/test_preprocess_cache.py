@@ -0,0 +1,83 @@
+"""
+前処理キャッシュ（PreprocessCache）の単体テスト
+"""
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+import audio_preprocessing
+from audio_preprocessing import StreamingPreprocessor
+from preprocess_cache import PreprocessCache, CACHED_BUFFER_NAME
+
+
+def _write_buffer_file(directory: str, name: str, size: int) -> str:
+    buffer_path = os.path.join(directory, f"{name}.f32")
+    with open(buffer_path, "wb") as buffer_file:
+        buffer_file.write(np.zeros(size // 4, dtype=np.float32).tobytes())
+    return buffer_path
+
+
+def _run_preprocessor(monkeypatch, work_dir: str, samples: np.ndarray) -> StreamingPreprocessor:
+    """16kHzの音声を前処理（デコード・ノイズ除去は行わない）"""
+    monkeypatch.setattr(audio_preprocessing, "reduce_noise", lambda window, sample_rate: window)
+    monkeypatch.setattr(audio_preprocessing, "open_source_blocks", lambda download, block_seconds: (16000, iter([samples])))
+
+    preprocessor = StreamingPreprocessor(work_dir, window_seconds=1.0, overlap_seconds=0.1)
+    peak = preprocessor.first_pass(SimpleNamespace(local_path="source"))
+    preprocessor.second_pass(peak)
+    return preprocessor
+
+
+def test_preprocess_cache_evicts_least_recently_used(tmp_path):
+    """容量上限を超えたら最終利用の古いエントリから削除する"""
+    cache = PreprocessCache(str(tmp_path / "cache"), max_bytes=2500)
+
+    for index, name in enumerate(["a", "b"]):
+        cache.store(name, _write_buffer_file(str(tmp_path), name, 1000))
+        os.utime(os.path.join(cache.cache_dir, name), (index + 1, index + 1))
+
+    # "a" を利用して最新にする
+    cache.lookup("a").release()
+
+    cache.store("c", _write_buffer_file(str(tmp_path), "c", 1000))
+
+    assert sorted(os.listdir(cache.cache_dir)) == ["a", "c"]
+
+
+def test_preprocess_cache_skips_oversized_entry(tmp_path):
+    """単独で容量上限を超えるエントリは登録しない"""
+    cache = PreprocessCache(str(tmp_path / "cache"), max_bytes=1000)
+    cache.store("small", _write_buffer_file(str(tmp_path), "small", 800))
+    cache.store("large", _write_buffer_file(str(tmp_path), "large", 4000))
+
+    assert os.listdir(cache.cache_dir) == ["small"]
+    assert cache.lookup("large") is None
+
+
+def test_preprocess_rerun_does_not_modify_cached_entry(tmp_path, monkeypatch):
+    """同じ作業ディレクトリで前処理をやり直しても、登録済みエントリの内容は変わらない"""
+    rng = np.random.default_rng(0)
+    work_dir = str(tmp_path / "job")
+    os.makedirs(work_dir)
+    cache = PreprocessCache(str(tmp_path / "cache"), max_bytes=10 * 1024 ** 2)
+
+    first = _run_preprocessor(monkeypatch, work_dir, rng.uniform(-0.5, 0.5, 48000).astype(np.float32))
+    cache.store("first", first.buffer_path)
+    cached_path = os.path.join(cache.cache_dir, "first", CACHED_BUFFER_NAME)
+    with open(cached_path, "rb") as cached_file:
+        cached_bytes = cached_file.read()
+
+    # 別のパラメータ・内容での再実行（短くすると切り詰めも検出できる）
+    second = _run_preprocessor(monkeypatch, work_dir, rng.uniform(-0.1, 0.1, 16000).astype(np.float32))
+
+    assert second.buffer_path != first.buffer_path
+    with open(cached_path, "rb") as cached_file:
+        assert cached_file.read() == cached_bytes
+
+    audio_buffer = cache.lookup("first")
+    try:
+        assert audio_buffer.num_samples == 48000
+        assert np.max(np.abs(audio_buffer.samples)) == 1.0
+    finally:
+        audio_buffer.release()
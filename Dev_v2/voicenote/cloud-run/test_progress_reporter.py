@@ -0,0 +1,49 @@
+"""
+処理ステータス書き込みの集約（ProgressReporter）の単体テスト
+"""
+import asyncio
+
+from progress_reporter import ProgressReporter
+from storage_backend import InMemoryStorageBackend, audio_document_path
+
+
+class CountingStorageBackend(InMemoryStorageBackend):
+    """書き込みの呼び出しを記録するインメモリストレージ"""
+
+    def __init__(self):
+        super().__init__()
+        self.updates = []
+
+    async def update_document(self, path, data):
+        self.updates.append((path, dict(data)))
+        await super().update_document(path, data)
+
+
+def test_progress_reporter_coalesces_updates():
+    """間隔内の更新は最新値にまとめて1回で書き込み、終了状態は即時に書き込む"""
+
+    async def run():
+        storage = CountingStorageBackend()
+        path = audio_document_path("user", "audio")
+        await storage.set_document(path, {})
+        reporter = ProgressReporter(storage, min_interval=0.2)
+
+        await reporter.report("user", "audio", {"status": "processing", "processingProgress": 10})
+        for progress in (20, 30, 40):
+            await reporter.report("user", "audio", {"status": "processing", "processingProgress": progress})
+        assert len(storage.updates) == 1
+
+        await asyncio.sleep(0.3)
+        assert len(storage.updates) == 2
+        assert storage.updates[1][1]["processingProgress"] == 40
+
+        await reporter.report("user", "audio", {"status": "processing", "processingProgress": 50})
+        await reporter.report("user", "audio", {"status": "completed", "processingProgress": 100})
+        assert storage.updates[-1][1] == {"status": "completed", "processingProgress": 100}
+        assert len(storage.updates) == 3
+
+        # 終了状態で遅延書き込みは取り消されている
+        await asyncio.sleep(0.3)
+        assert len(storage.updates) == 3
+
+    asyncio.run(run())
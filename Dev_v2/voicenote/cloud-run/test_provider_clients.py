@@ -0,0 +1,81 @@
+"""
+文字起こしAPIクライアントのプール（ProviderClientPool）の単体テスト
+"""
+import asyncio
+from types import SimpleNamespace
+
+import provider_clients
+from provider_clients import ProviderClientPool, client_key
+
+API_KEY = "sk-test-0123456789abcdef"
+
+
+class FakeClient:
+    def __init__(self, config):
+        self.config = config
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+def _config(api_key=API_KEY, provider="openai", model="whisper-1", settings=None):
+    return SimpleNamespace(provider=provider, api_key=api_key, model=model, language="ja-JP", settings=settings)
+
+
+def test_client_key_never_contains_raw_api_key():
+    """キーにはAPIキーのハッシュのみを含め、APIキーや設定の違いは別のキーになる"""
+    key = client_key(_config())
+
+    assert key[0] == "openai" and key[2] == "whisper-1"
+    assert all(API_KEY not in part for part in key)
+    assert client_key(_config()) == key
+    assert client_key(_config(api_key="sk-other")) != key
+    assert client_key(_config(settings={"temperature": 0})) != key
+
+
+def test_pool_shares_clients_and_stores_only_hashed_keys():
+    pool = ProviderClientPool(FakeClient)
+
+    first = pool.get(_config())
+    assert pool.get(_config()) is first
+    assert pool.get(_config(api_key="sk-other")) is not first
+    assert len(pool) == 2
+    assert API_KEY not in repr(list(pool._clients.keys()))
+
+
+def test_pool_recreates_client_after_ttl(monkeypatch):
+    """寿命を過ぎたクライアントは作り直し、古いものは破棄済みとして閉じる"""
+    now = [1000.0]
+    monkeypatch.setattr(provider_clients.time, "monotonic", lambda: now[0])
+    pool = ProviderClientPool(FakeClient, ttl_seconds=60)
+
+    first = pool.get(_config())
+    now[0] += 59
+    assert pool.get(_config()) is first
+
+    now[0] += 2
+    second = pool.get(_config())
+    assert second is not first
+    assert len(pool) == 1
+
+    asyncio.run(pool.aclose())
+    assert first.closed and second.closed
+
+
+def test_pool_evicts_least_recently_used():
+    """上限を超えたら最も長く使われていないクライアントから破棄する"""
+    pool = ProviderClientPool(FakeClient, max_size=2)
+
+    a = pool.get(_config(model="a"))
+    b = pool.get(_config(model="b"))
+    # "a" を利用して最新にする
+    assert pool.get(_config(model="a")) is a
+    pool.get(_config(model="c"))
+
+    assert len(pool) == 2
+    assert pool.get(_config(model="a")) is a
+    assert pool.get(_config(model="b")) is not b
+
+    asyncio.run(pool.aclose())
+    assert b.closed
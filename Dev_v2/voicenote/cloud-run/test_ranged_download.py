@@ -0,0 +1,60 @@
+"""
+レンジ分割ダウンロード（RangedDownload）の単体テスト
+"""
+import asyncio
+import os
+
+import pytest
+
+import ranged_download
+from ranged_download import RangedDownload
+from storage_backend import InMemoryStorageBackend
+
+
+class FlakyStorageBackend(InMemoryStorageBackend):
+    """指定した開始位置のレンジ読み出しを失敗させ、読み出しを記録するインメモリストレージ"""
+
+    def __init__(self, failing_ranges=()):
+        super().__init__()
+        self.range_reads = []
+        self.failing_ranges = set(failing_ranges)
+
+    async def read_blob_range(self, bucket_name, blob_path, start, end, generation=None):
+        self.range_reads.append(start)
+        if start in self.failing_ranges:
+            raise IOError(f"Simulated failure for range starting at {start}")
+        return await super().read_blob_range(bucket_name, blob_path, start, end, generation)
+
+
+def test_ranged_download_resumes_after_failure(tmp_path, monkeypatch):
+    """中断したダウンロードは完了済みレンジを再取得せずに再開する"""
+    monkeypatch.setattr(ranged_download, "MAX_RANGE_RETRIES", 1)
+    data = os.urandom(10 * 1024)
+    range_size = 1024
+    failing_start = 6 * range_size
+    local_path = str(tmp_path / "source")
+
+    storage = FlakyStorageBackend(failing_ranges={failing_start})
+    storage.put_blob("bucket", "audio", data)
+
+    async def run():
+        first = RangedDownload(storage, "bucket", "audio", local_path, range_size=range_size, max_parallel=1)
+        await first.start()
+        with pytest.raises(IOError):
+            await first.wait()
+        assert os.path.exists(first.state_path)
+
+        storage.failing_ranges.clear()
+        storage.range_reads.clear()
+        second = RangedDownload(storage, "bucket", "audio", local_path, range_size=range_size, max_parallel=2)
+        await second.start()
+        assert await second.wait() == local_path
+        return second
+
+    second = asyncio.run(run())
+
+    assert failing_start in storage.range_reads
+    assert len(storage.range_reads) < second.num_ranges
+    assert not os.path.exists(second.state_path)
+    with open(local_path, "rb") as local_file:
+        assert local_file.read() == data
@@ -0,0 +1,69 @@
+"""
+プロバイダ毎の送信レート制御（ProviderRateLimiter / RateLimiterRegistry）の単体テスト
+"""
+import asyncio
+import time
+
+from rate_limiter import ProviderRateLimiter, RateLimiterRegistry, rate_limit_retry_after
+
+
+class RateLimitedError(Exception):
+    """429応答を模した例外"""
+
+    def __init__(self, retry_after="0.01"):
+        super().__init__("rate limited")
+        self.status_code = 429
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after}})()
+
+
+def test_rate_limiter_aimd():
+    """429で送信レートを半減して送信を止め、成功のたびに設定値まで加算的に回復する"""
+
+    async def run():
+        limiter = ProviderRateLimiter(requests_per_second=10.0, max_concurrency=2)
+
+        limiter.on_rate_limited(0.05)
+        assert limiter.rate == 5.0
+        assert limiter.paused_until > time.monotonic()
+
+        begin = time.monotonic()
+        async with limiter.slot():
+            pass
+        assert time.monotonic() - begin >= 0.05
+
+        for _ in range(100):
+            limiter.on_success()
+        assert limiter.rate == 10.0
+
+        for _ in range(100):
+            limiter.on_rate_limited(0.0)
+        assert limiter.rate >= 0.1
+
+    asyncio.run(run())
+
+
+def test_rate_limiter_registry_retries_429():
+    """429応答のリクエストはRetry-After後に再送し、他の失敗はそのまま送出する"""
+
+    async def run():
+        config = type("Config", (), {"provider": "openai", "api_key": "key", "settings": {}})()
+        registry = RateLimiterRegistry()
+        calls = []
+
+        async def rate_limited_once():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RateLimitedError()
+            return "ok"
+
+        assert await registry.call(config, 2, rate_limited_once) == "ok"
+        assert len(calls) == 2
+        assert registry.get(config, 2).rate < registry.get(config, 2).max_rate
+
+    asyncio.run(run())
+
+
+def test_rate_limit_detection_ignores_message_text():
+    """エラーメッセージ中の「429」はレート制限とみなさない"""
+    assert rate_limit_retry_after(RuntimeError("uploaded 4290 bytes, request 429abc failed")) is None
+    assert rate_limit_retry_after(RateLimitedError("2.5")) == 2.5
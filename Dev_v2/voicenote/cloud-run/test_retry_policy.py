@@ -0,0 +1,176 @@
+"""
+再試行・ヘッジ（RetryPolicy / LatencyTracker / HedgeBudget / hedge）の単体テスト
+"""
+import time
+import asyncio
+
+import retry_policy
+from retry_policy import RetryPolicy, LatencyTracker, HedgeBudget, hedge
+from transcription_apis import TranscriptionService, APIConfig
+
+
+def test_retry_policy_retries_transient_errors():
+    """一時的な失敗は再試行し、リクエスト内容の誤りは再試行しない"""
+
+    async def run():
+        policy = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.02)
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise ConnectionError("connection reset")
+            return "ok"
+
+        assert await policy.run(flaky) == "ok"
+        assert len(calls) == 3
+
+        bad_request_calls = []
+
+        async def bad_request():
+            bad_request_calls.append(1)
+            error = RuntimeError("bad request")
+            error.status_code = 400
+            raise error
+
+        try:
+            await policy.run(bad_request)
+        except RuntimeError:
+            pass
+        assert len(bad_request_calls) == 1
+
+    asyncio.run(run())
+
+
+def test_retry_policy_backoff_bounds():
+    """バックオフは0以上、指数的な上限とmax_delay以下"""
+    policy = RetryPolicy(base_delay=0.5, max_delay=4.0)
+    for attempt in range(8):
+        delay = policy.backoff(attempt)
+        assert 0.0 <= delay <= min(4.0, 0.5 * 2 ** attempt)
+
+
+def test_hedge_waits_for_primary_slot():
+    """ヘッジの待機時間はprimaryが送信枠を確保してから数える"""
+
+    async def run():
+        started = asyncio.Event()
+        hedged = []
+
+        async def primary():
+            await asyncio.sleep(0.2)  # 送信枠待ち
+            started.set()
+            await asyncio.sleep(0.05)
+            return "primary"
+
+        async def secondary():
+            hedged.append(time.monotonic())
+            return "secondary"
+
+        assert await hedge(primary, secondary, 0.1, started=started) == "primary"
+        assert not hedged
+
+        started = asyncio.Event()
+
+        async def slow_primary():
+            await asyncio.sleep(0.1)
+            started.set()
+            await asyncio.sleep(1.0)
+            return "primary"
+
+        begin = time.monotonic()
+        assert await hedge(slow_primary, secondary, 0.1, started=started) == "secondary"
+        assert hedged[0] - begin >= 0.2
+
+    asyncio.run(run())
+
+
+def test_hedge_respects_budget():
+    """ヘッジ枠を使い切っている場合はヘッジせずprimaryを待つ"""
+
+    async def run():
+        budget = HedgeBudget(ratio=0.0, minimum=1)
+        hedged = []
+
+        async def primary():
+            await asyncio.sleep(0.1)
+            return "primary"
+
+        async def secondary():
+            hedged.append(1)
+            return "secondary"
+
+        assert budget.try_acquire()
+        with budget.track():
+            assert await hedge(primary, secondary, 0.01, budget=budget) == "primary"
+        assert not hedged
+
+        budget.release()
+        with budget.track():
+            assert await hedge(primary, secondary, 0.01, budget=budget) == "secondary"
+        assert budget.hedges == 0
+
+    asyncio.run(run())
+
+
+def test_hedge_raises_when_both_fail():
+    """primaryとヘッジの両方が失敗したら例外を送出する"""
+
+    async def run():
+        async def failing():
+            await asyncio.sleep(0.05)
+            raise ConnectionError("down")
+
+        try:
+            await hedge(failing, failing, 0.01)
+        except ConnectionError:
+            return
+        raise AssertionError("hedge should raise when both requests fail")
+
+    asyncio.run(run())
+
+
+def test_hedge_delay_scales_with_audio_length():
+    """音声長を渡した場合のヘッジ開始秒数は、音声1秒あたりのp95×音声長"""
+    tracker = LatencyTracker()
+    key = ("openai", "segment")
+    # 音声1秒あたり0.5秒で処理できている
+    for _ in range(retry_policy.HEDGE_MIN_SAMPLES):
+        tracker.record(key, 0.5)
+
+    assert tracker.hedge_delay(key, 4.0) == 2.0
+    assert tracker.hedge_delay(key, 60.0) == 30.0
+    # 短いセグメントでも下限以上待つ
+    assert tracker.hedge_delay(key, 0.1) == retry_policy.HEDGE_MIN_DELAY_SECONDS
+
+
+def test_file_transcription_is_never_hedged(monkeypatch):
+    """ファイル全体の文字起こしはp95を超えてもフォールバック先へ重複送信しない"""
+    monkeypatch.setattr(retry_policy, "HEDGE_MIN_DELAY_SECONDS", 0.01)
+
+    async def run():
+        service = TranscriptionService()
+        primary = APIConfig(provider="openai", api_key="key", model="whisper-1")
+        fallback = APIConfig(provider="deepgram", api_key="key", model="nova-2")
+        calls = []
+
+        async def fake_request(config, request, operation, timeout, started=None, audio_seconds=None):
+            calls.append(config.provider)
+            if started is not None:
+                started.set()
+            await asyncio.sleep(0.1)
+            return config.provider
+
+        service._request = fake_request
+        for operation in ("file", "segment"):
+            for _ in range(retry_policy.HEDGE_MIN_SAMPLES):
+                service.latency.record(("openai", operation), 0.001)
+
+        assert await service._request_with_fallback([primary, fallback], None, "file", 1.0) == "openai"
+        assert calls == ["openai"]
+
+        calls.clear()
+        await service._request_with_fallback([primary, fallback], None, "segment", 1.0, audio_seconds=1.0)
+        assert calls == ["openai", "deepgram"]
+
+    asyncio.run(run())
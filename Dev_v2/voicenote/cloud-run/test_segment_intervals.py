@@ -0,0 +1,89 @@
+"""
+話者セグメントの区間インデックス・重複除去（segment_intervals）の単体テスト
+"""
+import random
+
+from segment_intervals import SegmentIntervalIndex, SegmentOverlapMerger, merge_speaker_overlaps
+
+
+def test_overlap_merger_skips_duplicates():
+    """閾値以上重なる区間のみ重複とみなす"""
+    merger = SegmentOverlapMerger(overlap_threshold=0.8)
+
+    assert merger.add_if_unique({"start_time": 10.0, "end_time": 20.0})
+    # 短い方の90%が重なる → 重複
+    assert not merger.add_if_unique({"start_time": 11.0, "end_time": 20.0})
+    # 重なりは50% → 別区間
+    assert merger.add_if_unique({"start_time": 15.0, "end_time": 25.0})
+    # 長さ0の区間は重複扱いしない
+    assert merger.add_if_unique({"start_time": 30.0, "end_time": 30.0})
+    assert len(merger) == 3
+
+
+def test_overlap_merger_finds_long_earlier_segment():
+    """開始の早い長い区間との重なりも検出する（最大区間長で探索範囲を広げる）"""
+    merger = SegmentOverlapMerger(start_key="start", end_key="end")
+    merger.add({"start": 0.0, "end": 100.0})
+    merger.add({"start": 50.0, "end": 51.0})
+
+    assert merger.is_duplicate({"start": 90.0, "end": 95.0})
+
+
+def test_overlap_merger_keeps_crosstalk_between_speakers():
+    """group_key指定時は別話者の同時発話を重複とみなさない"""
+    merger = SegmentOverlapMerger(group_key="speaker_id")
+
+    assert merger.add_if_unique({"start_time": 10.0, "end_time": 20.0, "speaker_id": "A"})
+    assert merger.add_if_unique({"start_time": 10.0, "end_time": 20.0, "speaker_id": "B"})
+    assert not merger.add_if_unique({"start_time": 11.0, "end_time": 20.0, "speaker_id": "A"})
+    assert len(merger) == 2
+
+
+def test_interval_index_matches_brute_force():
+    """区間インデックスの検索結果が全件走査と一致する"""
+    rng = random.Random(0)
+    segments = []
+    for _ in range(500):
+        start = rng.uniform(0, 3600)
+        segments.append({"start": start, "end": start + rng.uniform(0.1, 120)})
+    index = SegmentIntervalIndex(segments)
+
+    for _ in range(100):
+        query_start = rng.uniform(0, 3600)
+        query_end = query_start + rng.uniform(1, 600)
+        expected = sorted(
+            (seg for seg in segments if seg["start"] < query_end and seg["end"] > query_start),
+            key=lambda seg: seg["start"]
+        )
+        assert index.overlapping(query_start, query_end) == expected
+
+
+def test_merge_speaker_overlaps_merges_same_speaker_duplicates():
+    """チャンク間オーバーラップで二重検出された同一話者のセグメントは和集合の1つになる"""
+    segments = [
+        {"start": 27.0, "end": 30.0, "speaker": "A"},  # チャンク0の末尾で切れた検出
+        {"start": 27.2, "end": 33.0, "speaker": "A"},  # チャンク1での検出
+        {"start": 40.0, "end": 45.0, "speaker": "A"},
+    ]
+
+    merged = merge_speaker_overlaps(segments)
+
+    assert [(seg["start"], seg["end"]) for seg in merged] == [(27.0, 33.0), (40.0, 45.0)]
+    # 入力は変更しない
+    assert segments[0]["end"] == 30.0
+
+
+def test_merge_speaker_overlaps_keeps_crosstalk():
+    """別話者の同時発話は重なり率に関わらず両方残す"""
+    segments = [
+        {"start": 10.0, "end": 20.0, "speaker": "A"},
+        {"start": 10.5, "end": 19.5, "speaker": "B"},
+        {"start": 15.0, "end": 25.0, "speaker": "A"},
+    ]
+
+    merged = merge_speaker_overlaps(segments)
+
+    assert [(seg["speaker"], seg["start"], seg["end"]) for seg in merged] == [
+        ("A", 10.0, 25.0),
+        ("B", 10.5, 19.5),
+    ]
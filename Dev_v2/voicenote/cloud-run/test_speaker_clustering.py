@@ -0,0 +1,73 @@
+"""
+話者埋め込みのクラスタリング（SpeakerClusterer）の単体テスト
+"""
+import numpy as np
+import pytest
+
+from speaker_clustering import SpeakerClusterer
+
+pytest.importorskip("sklearn")
+
+
+def _speaker_embeddings(speaker_count: int, per_speaker: int, dimension: int = 64, seed: int = 0):
+    """話者毎に固有の方向を持つ埋め込みと正解ラベル"""
+    rng = np.random.default_rng(seed)
+    voices = rng.standard_normal((speaker_count, dimension))
+    labels = np.repeat(np.arange(speaker_count), per_speaker)
+    embeddings = voices[labels] + 0.3 * rng.standard_normal((len(labels), dimension))
+    return embeddings.astype(np.float32), labels
+
+
+def _same_partition(predicted: np.ndarray, expected: np.ndarray) -> bool:
+    """ラベルの番号付けに依らずクラスタの分け方が一致するか"""
+    pairs = set(zip(predicted.tolist(), expected.tolist()))
+    return len(pairs) == len(set(predicted.tolist())) == len(set(expected.tolist()))
+
+
+def test_micro_cluster_path_matches_direct_clustering():
+    """微小クラスタ経由でも直接の階層クラスタリングと同じ話者分けになる"""
+    embeddings, expected = _speaker_embeddings(speaker_count=3, per_speaker=200)
+
+    direct = SpeakerClusterer(micro_cluster_threshold=10000).fit_predict(embeddings, 3)
+    micro = SpeakerClusterer(micro_cluster_threshold=100, micro_cluster_count=32).fit_predict(embeddings, 3)
+
+    assert len(micro) == len(embeddings)
+    assert _same_partition(direct, expected)
+    assert _same_partition(micro, expected)
+
+
+def test_micro_cluster_labels_are_contiguous_when_fewer_centroids_than_clusters():
+    """微小クラスタ数が話者数以下なら微小クラスタの番号（連番）をそのまま返す"""
+    embeddings, _ = _speaker_embeddings(speaker_count=2, per_speaker=50)
+
+    labels = SpeakerClusterer(micro_cluster_threshold=10, micro_cluster_count=2).fit_predict(embeddings, 4)
+
+    assert sorted(set(labels.tolist())) == [0, 1]
+
+
+@pytest.mark.parametrize("speaker_count", [2, 3, 4])
+def test_estimate_speaker_count_from_eigengap(speaker_count):
+    """固有値ギャップから話者数を推定する"""
+    embeddings, _ = _speaker_embeddings(speaker_count, per_speaker=30, seed=speaker_count)
+
+    assert SpeakerClusterer().estimate_speaker_count(embeddings, 1, 8) == speaker_count
+
+
+def test_estimate_speaker_count_single_speaker():
+    embeddings, _ = _speaker_embeddings(speaker_count=1, per_speaker=30)
+
+    assert SpeakerClusterer().estimate_speaker_count(embeddings, 1, 5) == 1
+
+
+def test_speaker_count_respects_bounds():
+    """推定値・クラスタ数はmin_speakers/max_speakersの範囲に収める"""
+    embeddings, _ = _speaker_embeddings(speaker_count=4, per_speaker=30)
+    clusterer = SpeakerClusterer()
+
+    assert clusterer.estimate_speaker_count(embeddings, 1, 2) <= 2
+    assert clusterer.estimate_speaker_count(embeddings[:30], 3, 5) >= 3
+    # 埋め込み数より多い話者数にはならない
+    assert clusterer.estimate_speaker_count(embeddings[:2], 1, 5) <= 2
+
+    labels = clusterer.fit_predict(embeddings, 4, max_speakers=2)
+    assert len(set(labels.tolist())) == 2
@@ -0,0 +1,69 @@
+"""
+話者ギャラリー（SpeakerGallery / SpeakerGalleryService）の単体テスト
+InMemoryStorageBackendを使い、オフラインで実行できる
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from model_registry import SEGMENT_EMBEDDING_MODEL, SEGMENT_EMBEDDING_DIMENSION
+from speaker_gallery import SpeakerGallery, SpeakerGalleryService, gallery_collection_path
+from storage_backend import InMemoryStorageBackend
+
+
+def test_gallery_ignores_mismatched_dimensions():
+    """次元の異なる登録話者はギャラリーに読み込まない"""
+    documents = {
+        "current": {"name": "A", "embedding": np.random.randn(256).tolist(), "lastAudioId": "audio-1"},
+        "legacy": {"name": "B", "embedding": np.random.randn(512).tolist()},
+        "empty": {"name": "C", "embedding": []}
+    }
+
+    gallery = SpeakerGallery.from_documents("user", documents, dimension=256)
+
+    assert gallery.voice_ids == ["current"]
+    assert gallery.embeddings.shape == (1, 256)
+    assert gallery.last_audio_ids == ["audio-1"]
+
+
+@pytest.mark.parametrize("embedding, embedding_model", [
+    ([0.0] * SEGMENT_EMBEDDING_DIMENSION, SEGMENT_EMBEDDING_MODEL),
+    (np.random.randn(SEGMENT_EMBEDDING_DIMENSION).tolist(), "mock"),
+])
+def test_enroll_rejects_unusable_embeddings(embedding, embedding_model):
+    """ゼロベクトル・モック結果の話者は登録しない"""
+
+    async def run():
+        storage = InMemoryStorageBackend()
+        service = SpeakerGalleryService(storage)
+        entry = {"name": "A", "embedding": embedding, "embedding_model": embedding_model}
+
+        with pytest.raises(ValueError):
+            await service.enroll_speakers("user", [entry], audio_id="audio-1")
+        assert await storage.list_documents(gallery_collection_path("user")) == {}
+
+    asyncio.run(run())
+
+
+def test_matched_voice_update_is_idempotent_per_recording():
+    """同じ録音で照合された登録話者は一度だけ更新する"""
+
+    async def run():
+        storage = InMemoryStorageBackend()
+        service = SpeakerGalleryService(storage)
+        embedding = np.random.randn(SEGMENT_EMBEDDING_DIMENSION).tolist()
+        enrolled = await service.enroll_speakers(
+            "user", [{"name": "A", "embedding": embedding, "embedding_model": SEGMENT_EMBEDDING_MODEL}],
+            audio_id="audio-1"
+        )
+        speaker = {"voice_id": enrolled[0]["voice_id"], "embedding": embedding}
+
+        for _ in range(2):
+            await service.update_matched_voices("user", "audio-2", [speaker])
+
+        documents = await storage.list_documents(gallery_collection_path("user"))
+        assert documents[enrolled[0]["voice_id"]]["sampleCount"] == 2
+        assert documents[enrolled[0]["voice_id"]]["lastAudioId"] == "audio-2"
+
+    asyncio.run(run())
@@ -0,0 +1,72 @@
+"""
+話者照合（match_speakers: 登録音声・ストリーミングの窓間対応付け）とユーザー音声プロファイルの単体テスト
+"""
+import numpy as np
+
+from model_registry import SEGMENT_EMBEDDING_MODEL, SEGMENT_EMBEDDING_DIMENSION
+from speaker_identification import match_speakers, reference_embedding, user_embedding_from_profile
+
+
+def _speaker_segments(rng, voice: np.ndarray, count: int) -> np.ndarray:
+    """同一話者の区間毎の埋め込み（話者固有の方向＋区間毎の揺らぎ）"""
+    return voice + 0.6 * rng.standard_normal((count, len(voice)))
+
+
+def test_voice_learning_embedding_matches_same_speaker_centroid():
+    """音声学習の代表埋め込みは、同じ話者の話者分離の重心と対応付けられる"""
+    rng = np.random.default_rng(0)
+    voices = rng.standard_normal((3, SEGMENT_EMBEDDING_DIMENSION))
+
+    # 話者分離パイプラインの重心（区間埋め込みの平均）
+    centroids = np.stack([_speaker_segments(rng, voice, 40).mean(axis=0) for voice in voices])
+    # 音声学習は別の録音の窓毎の埋め込みから代表埋め込みを作る（計算できない窓はNone）
+    windows = list(_speaker_segments(rng, voices[1], 30)) + [None]
+    user_embedding = reference_embedding(windows)
+
+    assert user_embedding.shape == (SEGMENT_EMBEDDING_DIMENSION,)
+    assignments, scores = match_speakers(centroids, user_embedding.reshape(1, -1))
+
+    assert assignments.tolist() == [-1, 0, -1]
+    assert scores[1] > 0.8
+
+
+def test_reference_embedding_without_valid_windows():
+    assert reference_embedding([None, None]) is None
+
+
+def test_match_speakers_with_mismatched_dimensions():
+    """埋め込みの次元が異なる場合は例外にせず、対応なしを返す"""
+    centroids = np.random.randn(3, 256)
+    user_embedding = np.random.randn(1, 192)
+
+    assignments, scores = match_speakers(centroids, user_embedding)
+
+    assert assignments.tolist() == [-1, -1, -1]
+    assert not np.any(scores)
+
+
+def test_legacy_user_profile_requires_reenrollment():
+    """話者重心と異なるモデルで登録されたプロファイルは照合に使わない"""
+    current = np.random.randn(SEGMENT_EMBEDDING_DIMENSION).tolist()
+
+    assert user_embedding_from_profile({"embedding": np.random.randn(192).tolist()}) is None
+    assert user_embedding_from_profile(
+        {"embedding": np.random.randn(192).tolist(), "embeddingModel": "speechbrain/spkrec-ecapa-voxceleb"}
+    ) is None
+    assert user_embedding_from_profile({"embedding": current, "embeddingModel": SEGMENT_EMBEDDING_MODEL}) == current
+    assert user_embedding_from_profile(None) is None
+
+
+def test_match_speakers_maximizes_total_similarity():
+    """最も似た組から貪欲に決めると対応付けられない話者が出る場合も、1対1で全話者を対応付ける"""
+    # 既存話者X, Yを基底とし、窓内話者Aは X:0.70 / Y:0.65、Bは X:0.65 / Y:0.05 の類似度
+    references = np.eye(4)[:2]
+    centroids = np.array([
+        [0.70, 0.65, np.sqrt(1 - 0.70 ** 2 - 0.65 ** 2), 0.0],
+        [0.65, 0.05, 0.0, np.sqrt(1 - 0.65 ** 2 - 0.05 ** 2)],
+    ])
+
+    assignments, scores = match_speakers(centroids, references, threshold=0.5)
+
+    assert assignments.tolist() == [1, 0]
+    np.testing.assert_allclose(scores, [0.65, 0.65], atol=1e-6)
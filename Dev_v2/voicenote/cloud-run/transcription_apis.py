@@ -1,19 +1,23 @@
 import os
+import io
 import json
-import tempfile
+import wave
 import asyncio
-from typing import Dict, List, Optional, Any, Union
+from typing import Awaitable, Callable, Dict, List, Optional, Any, Union
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
-import aiohttp
 import logging
 
-# API クライアント
-import openai
-from azure.cognitiveservices.speech import SpeechConfig, SpeechRecognizer, AudioConfig
-from google.cloud import speech
-import assemblyai as aai
-from deepgram import DeepgramClient, PrerecordedOptions
+# 各プロバイダーのSDKはそのプロバイダーのクライアント作成時に読み込む（起動時間短縮のため）
+from audio_buffer import AudioBuffer
+from provider_clients import ProviderClientPool, shared_connections
+from rate_limiter import RateLimiterRegistry
+from retry_policy import (
+    RetryPolicy, LatencyTracker, HedgeBudget, hedge, HEDGED_OPERATIONS, SEGMENT_TIMEOUT_SECONDS, FILE_TIMEOUT_SECONDS
+)
+
+# 音声ソース: ファイルパス、またはデコード済み共有バッファ
+AudioSource = Union[str, AudioBuffer]
 
 @dataclass
 class TranscriptionResult:
@@ -41,18 +45,70 @@ class TranscriptionAPI(ABC):
         self.config = config
         self.logger = logging.getLogger(f"{self.__class__.__name__}")
     
+    async def aclose(self):
+        """クライアント固有の接続を閉じる（共有接続はプール側で閉じる）"""
+        pass
+    
     @abstractmethod
     async def transcribe(self, audio_path: str) -> TranscriptionResult:
         """音声ファイルを文字起こし"""
         pass
     
     @abstractmethod
-    async def transcribe_segment(self, audio_path: str, start_time: float, end_time: float) -> TranscriptionResult:
-        """音声セグメントを文字起こし"""
+    async def transcribe_bytes(self, audio_bytes: bytes, filename: str = "segment.wav") -> TranscriptionResult:
+        """メモリ上の音声データ（WAV）を文字起こし"""
         pass
     
-    def _extract_audio_segment(self, audio_path: str, start_time: float, end_time: float) -> str:
-        """音声セグメントを抽出"""
+    async def transcribe_segment(self, audio_source: AudioSource, start_time: float, end_time: float) -> TranscriptionResult:
+        """音声セグメントを文字起こし（必要な区間のみ読み込み、一時ファイルは作らない）"""
+        loop = asyncio.get_event_loop()
+        audio_bytes = await loop.run_in_executor(
+            None, self._extract_audio_segment, audio_source, start_time, end_time
+        )
+        return await self.transcribe_bytes(audio_bytes)
+    
+    def _extract_audio_segment(self, audio_source: AudioSource, start_time: float, end_time: float) -> bytes:
+        """音声セグメントを抽出し、WAVのバイト列にエンコード"""
+        import soundfile as sf
+        
+        if isinstance(audio_source, AudioBuffer):
+            # デコード済みバッファのスライス（ゼロコピー）
+            samples = audio_source.view(start_time, end_time)
+            sample_rate = audio_source.sample_rate
+        else:
+            try:
+                samples, sample_rate = self._read_audio_range(audio_source, start_time, end_time)
+            except (RuntimeError, sf.LibsndfileError):
+                # libsndfileでシークできない形式（m4a等）はpydubで全体デコード
+                return self._extract_audio_segment_pydub(audio_source, start_time, end_time)
+        
+        output = io.BytesIO()
+        sf.write(output, samples, sample_rate, format="WAV", subtype="PCM_16")
+        return output.getvalue()
+    
+    def _read_audio_range(self, audio_path: str, start_time: float, end_time: float):
+        """WAV/FLAC等をシークして必要なサンプル範囲のみ読み込み"""
+        import soundfile as sf
+        
+        with sf.SoundFile(audio_path) as audio_file:
+            if not audio_file.seekable():
+                raise RuntimeError(f"Audio file is not seekable: {audio_path}")
+            
+            sample_rate = audio_file.samplerate
+            start_frame = min(int(start_time * sample_rate), audio_file.frames)
+            end_frame = min(int(end_time * sample_rate), audio_file.frames)
+            
+            audio_file.seek(start_frame)
+            samples = audio_file.read(max(0, end_frame - start_frame), dtype="float32")
+        
+        # モノラル化
+        if samples.ndim > 1:
+            samples = samples.mean(axis=1)
+        
+        return samples, sample_rate
+    
+    def _extract_audio_segment_pydub(self, audio_path: str, start_time: float, end_time: float) -> bytes:
+        """pydubによるセグメント抽出（シーク非対応形式のフォールバック）"""
         from pydub import AudioSegment
         
         audio = AudioSegment.from_file(audio_path)
@@ -60,30 +116,38 @@ class TranscriptionAPI(ABC):
         end_ms = int(end_time * 1000)
         segment = audio[start_ms:end_ms]
         
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-            segment.export(tmp_file.name, format="wav")
-            return tmp_file.name
+        output = io.BytesIO()
+        segment.export(output, format="wav")
+        return output.getvalue()
 
 class OpenAIWhisperAPI(TranscriptionAPI):
     """OpenAI Whisper API"""
     
     def __init__(self, config: APIConfig):
         super().__init__(config)
-        self.client = openai.AsyncOpenAI(api_key=config.api_key)
+        import openai
+        
+        # HTTP接続は全クライアントで共有（TLSセッションを再利用）
+        self.client = openai.AsyncOpenAI(api_key=config.api_key, http_client=shared_connections.http_client)
     
     async def transcribe(self, audio_path: str) -> TranscriptionResult:
         """音声ファイル全体を文字起こし"""
+        with open(audio_path, "rb") as audio_file:
+            audio_bytes = audio_file.read()
+        return await self.transcribe_bytes(audio_bytes, os.path.basename(audio_path))
+    
+    async def transcribe_bytes(self, audio_bytes: bytes, filename: str = "segment.wav") -> TranscriptionResult:
+        """メモリ上の音声データを文字起こし"""
         try:
             start_time = asyncio.get_event_loop().time()
             
-            with open(audio_path, "rb") as audio_file:
-                response = await self.client.audio.transcriptions.create(
-                    model=self.config.model,
-                    file=audio_file,
-                    language="ja",
-                    response_format="verbose_json",
-                    timestamp_granularities=["word", "segment"]
-                )
+            response = await self.client.audio.transcriptions.create(
+                model=self.config.model,
+                file=(filename, audio_bytes),
+                language="ja",
+                response_format="verbose_json",
+                timestamp_granularities=["word", "segment"]
+            )
             
             processing_time = asyncio.get_event_loop().time() - start_time
             
@@ -127,21 +191,14 @@ class OpenAIWhisperAPI(TranscriptionAPI):
         except Exception as e:
             self.logger.error(f"OpenAI Whisper transcription failed: {str(e)}")
             raise
-    
-    async def transcribe_segment(self, audio_path: str, start_time: float, end_time: float) -> TranscriptionResult:
-        """音声セグメントを文字起こし"""
-        segment_path = self._extract_audio_segment(audio_path, start_time, end_time)
-        try:
-            result = await self.transcribe(segment_path)
-            return result
-        finally:
-            os.unlink(segment_path)
 
 class AzureSpeechAPI(TranscriptionAPI):
     """Azure Speech Services API"""
     
     def __init__(self, config: APIConfig):
         super().__init__(config)
+        from azure.cognitiveservices.speech import SpeechConfig
+        
         self.speech_config = SpeechConfig(
             subscription=config.api_key,
             region=config.settings.get("region", "japaneast")
@@ -150,12 +207,39 @@ class AzureSpeechAPI(TranscriptionAPI):
     
     async def transcribe(self, audio_path: str) -> TranscriptionResult:
         """音声ファイル全体を文字起こし"""
+        from azure.cognitiveservices.speech import AudioConfig
+        
+        return await self._transcribe_audio_config(lambda: AudioConfig(filename=audio_path))
+    
+    async def transcribe_bytes(self, audio_bytes: bytes, filename: str = "segment.wav") -> TranscriptionResult:
+        """メモリ上の音声データを文字起こし（PushAudioInputStream経由）"""
+        from azure.cognitiveservices.speech import AudioConfig
+        from azure.cognitiveservices.speech.audio import AudioStreamFormat, PushAudioInputStream
+        
+        def create_audio_config():
+            with wave.open(io.BytesIO(audio_bytes), "rb") as wav_file:
+                stream_format = AudioStreamFormat(
+                    samples_per_second=wav_file.getframerate(),
+                    bits_per_sample=wav_file.getsampwidth() * 8,
+                    channels=wav_file.getnchannels()
+                )
+                pcm_data = wav_file.readframes(wav_file.getnframes())
+            
+            stream = PushAudioInputStream(stream_format=stream_format)
+            stream.write(pcm_data)
+            stream.close()
+            return AudioConfig(stream=stream)
+        
+        return await self._transcribe_audio_config(create_audio_config)
+    
+    async def _transcribe_audio_config(self, audio_config_factory) -> TranscriptionResult:
+        """AudioConfigを指定して文字起こし"""
         try:
             start_time = asyncio.get_event_loop().time()
             
             # Azure Speech APIは同期処理のため、別スレッドで実行
             loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, self._sync_transcribe, audio_path)
+            result = await loop.run_in_executor(None, self._sync_transcribe, audio_config_factory)
             
             processing_time = asyncio.get_event_loop().time() - start_time
             
@@ -173,9 +257,11 @@ class AzureSpeechAPI(TranscriptionAPI):
             self.logger.error(f"Azure Speech transcription failed: {str(e)}")
             raise
     
-    def _sync_transcribe(self, audio_path: str) -> Dict[str, Any]:
+    def _sync_transcribe(self, audio_config_factory) -> Dict[str, Any]:
         """同期音声認識"""
-        audio_config = AudioConfig(filename=audio_path)
+        from azure.cognitiveservices.speech import SpeechRecognizer
+        
+        audio_config = audio_config_factory()
         recognizer = SpeechRecognizer(
             speech_config=self.speech_config, 
             audio_config=audio_config
@@ -195,32 +281,28 @@ class AzureSpeechAPI(TranscriptionAPI):
                 }
             ]
         }
-    
-    async def transcribe_segment(self, audio_path: str, start_time: float, end_time: float) -> TranscriptionResult:
-        """音声セグメントを文字起こし"""
-        segment_path = self._extract_audio_segment(audio_path, start_time, end_time)
-        try:
-            result = await self.transcribe(segment_path)
-            return result
-        finally:
-            os.unlink(segment_path)
 
 class GoogleSpeechAPI(TranscriptionAPI):
     """Google Cloud Speech-to-Text API"""
     
     def __init__(self, config: APIConfig):
         super().__init__(config)
-        self.client = speech.SpeechClient()
+        self.client = shared_connections.google_speech_client
     
     async def transcribe(self, audio_path: str) -> TranscriptionResult:
         """音声ファイル全体を文字起こし"""
+        with open(audio_path, "rb") as audio_file:
+            content = audio_file.read()
+        return await self.transcribe_bytes(content, os.path.basename(audio_path))
+    
+    async def transcribe_bytes(self, audio_bytes: bytes, filename: str = "segment.wav") -> TranscriptionResult:
+        """メモリ上の音声データを文字起こし"""
+        from google.cloud import speech
+        
         try:
             start_time = asyncio.get_event_loop().time()
             
-            with open(audio_path, "rb") as audio_file:
-                content = audio_file.read()
-            
-            audio = speech.RecognitionAudio(content=content)
+            audio = speech.RecognitionAudio(content=audio_bytes)
             config = speech.RecognitionConfig(
                 encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
                 sample_rate_hertz=16000,
@@ -279,25 +361,34 @@ class GoogleSpeechAPI(TranscriptionAPI):
         except Exception as e:
             self.logger.error(f"Google Speech transcription failed: {str(e)}")
             raise
-    
-    async def transcribe_segment(self, audio_path: str, start_time: float, end_time: float) -> TranscriptionResult:
-        """音声セグメントを文字起こし"""
-        segment_path = self._extract_audio_segment(audio_path, start_time, end_time)
-        try:
-            result = await self.transcribe(segment_path)
-            return result
-        finally:
-            os.unlink(segment_path)
 
 class AssemblyAIAPI(TranscriptionAPI):
     """AssemblyAI API"""
     
     def __init__(self, config: APIConfig):
         super().__init__(config)
-        aai.settings.api_key = config.api_key
+        import assemblyai as aai
+        
+        # グローバル設定を書き換えず、APIキー毎のクライアント（キープアライブ付き）を使う
+        self.client = aai.Client(aai.Settings(api_key=config.api_key))
+    
+    async def aclose(self):
+        http_client = getattr(self.client, "http_client", None)
+        if http_client is not None:
+            http_client.close()
     
     async def transcribe(self, audio_path: str) -> TranscriptionResult:
         """音声ファイル全体を文字起こし"""
+        return await self._transcribe_input(audio_path)
+    
+    async def transcribe_bytes(self, audio_bytes: bytes, filename: str = "segment.wav") -> TranscriptionResult:
+        """メモリ上の音声データを文字起こし"""
+        return await self._transcribe_input(io.BytesIO(audio_bytes))
+    
+    async def _transcribe_input(self, audio_input) -> TranscriptionResult:
+        """ファイルパスまたはファイルオブジェクトを文字起こし"""
+        import assemblyai as aai
+        
         try:
             start_time = asyncio.get_event_loop().time()
             
@@ -309,12 +400,12 @@ class AssemblyAIAPI(TranscriptionAPI):
                 boost_param="high"
             )
             
-            transcriber = aai.Transcriber(config=transcriber_config)
+            transcriber = aai.Transcriber(client=self.client, config=transcriber_config)
             
             # 非同期実行
             loop = asyncio.get_event_loop()
             transcript = await loop.run_in_executor(
-                None, transcriber.transcribe, audio_path
+                None, transcriber.transcribe, audio_input
             )
             
             processing_time = asyncio.get_event_loop().time() - start_time
@@ -359,32 +450,30 @@ class AssemblyAIAPI(TranscriptionAPI):
         except Exception as e:
             self.logger.error(f"AssemblyAI transcription failed: {str(e)}")
             raise
-    
-    async def transcribe_segment(self, audio_path: str, start_time: float, end_time: float) -> TranscriptionResult:
-        """音声セグメントを文字起こし"""
-        segment_path = self._extract_audio_segment(audio_path, start_time, end_time)
-        try:
-            result = await self.transcribe(segment_path)
-            return result
-        finally:
-            os.unlink(segment_path)
 
 class DeepgramAPI(TranscriptionAPI):
     """Deepgram API"""
     
     def __init__(self, config: APIConfig):
         super().__init__(config)
+        from deepgram import DeepgramClient
+        
         self.client = DeepgramClient(config.api_key)
     
     async def transcribe(self, audio_path: str) -> TranscriptionResult:
         """音声ファイル全体を文字起こし"""
+        with open(audio_path, "rb") as audio_file:
+            buffer_data = audio_file.read()
+        return await self.transcribe_bytes(buffer_data, os.path.basename(audio_path))
+    
+    async def transcribe_bytes(self, audio_bytes: bytes, filename: str = "segment.wav") -> TranscriptionResult:
+        """メモリ上の音声データを文字起こし"""
+        from deepgram import PrerecordedOptions
+        
         try:
             start_time = asyncio.get_event_loop().time()
             
-            with open(audio_path, "rb") as audio_file:
-                buffer_data = audio_file.read()
-            
-            payload = {"buffer": buffer_data}
+            payload = {"buffer": audio_bytes}
             
             options = PrerecordedOptions(
                 model="nova-2",
@@ -445,19 +534,19 @@ class DeepgramAPI(TranscriptionAPI):
         except Exception as e:
             self.logger.error(f"Deepgram transcription failed: {str(e)}")
             raise
-    
-    async def transcribe_segment(self, audio_path: str, start_time: float, end_time: float) -> TranscriptionResult:
-        """音声セグメントを文字起こし"""
-        segment_path = self._extract_audio_segment(audio_path, start_time, end_time)
-        try:
-            result = await self.transcribe(segment_path)
-            return result
-        finally:
-            os.unlink(segment_path)
 
 class TranscriptionService:
     """音声認識API統合サービス"""
     
+    # プロバイダー毎の同時リクエスト上限（settings["max_concurrency"]で上書き可能）
+    PROVIDER_MAX_CONCURRENCY = {
+        "openai": 8,
+        "azure": 4,
+        "google": 6,
+        "assemblyai": 5,
+        "deepgram": 10
+    }
+    
     def __init__(self):
         self.providers = {
             "openai": OpenAIWhisperAPI,
@@ -467,83 +556,199 @@ class TranscriptionService:
             "deepgram": DeepgramAPI
         }
         self.logger = logging.getLogger(self.__class__.__name__)
+        # (プロバイダー, APIキーのハッシュ, モデル) 毎のクライアントをジョブ間で共有
+        self.client_pool = ProviderClientPool(self._create_client)
+        # (プロバイダー, APIキー) 毎の送信レート・同時実行数の制御（全ジョブで共有）
+        self.rate_limiters = RateLimiterRegistry()
+        # 一時的な失敗の再試行と、p95レイテンシを超えた呼び出しのヘッジ
+        self.retry_policy = RetryPolicy()
+        self.latency = LatencyTracker()
+        self.hedge_budget = HedgeBudget()
+    
+    async def initialize(self):
+        """初期化（APIクライアントは設定毎に利用時に作成するため、事前に読み込むものはない）"""
+        pass
+    
+    async def aclose(self):
+        """プール内のクライアントと共有接続を閉じる"""
+        await self.client_pool.aclose()
+        await shared_connections.aclose()
     
     def create_api_client(self, config: APIConfig) -> TranscriptionAPI:
-        """API設定からクライアントを作成"""
-        provider_class = self.providers.get(config.provider)
-        if not provider_class:
+        """API設定に対応するクライアントを取得（プールになければ作成）"""
+        if config.provider not in self.providers:
             raise ValueError(f"Unsupported provider: {config.provider}")
         
-        return provider_class(config)
+        return self.client_pool.get(config)
     
-    async def transcribe_with_fallback(self, audio_path: str, 
-                                     primary_config: APIConfig,
-                                     fallback_configs: List[APIConfig] = None) -> TranscriptionResult:
-        """フォールバック付き音声認識"""
-        configs = [primary_config]
-        if fallback_configs:
-            configs.extend(fallback_configs)
+    def _create_client(self, config: APIConfig) -> TranscriptionAPI:
+        return self.providers[config.provider](config)
+    
+    def get_max_concurrency(self, config: APIConfig) -> int:
+        """プロバイダーの同時リクエスト上限を取得"""
+        settings = config.settings or {}
+        return settings.get(
+            "max_concurrency",
+            self.PROVIDER_MAX_CONCURRENCY.get(config.provider, 1)
+        )
+    
+    def get_fallback_configs(self, config: APIConfig) -> List[APIConfig]:
+        """settings["fallback_configs"]に指定されたフォールバック先のAPI設定"""
+        settings = config.settings or {}
+        return [
+            APIConfig(
+                provider=fallback["provider"],
+                api_key=fallback.get("api_key", ""),
+                model=fallback.get("model", ""),
+                language=fallback.get("language", config.language),
+                settings=fallback.get("settings") or {}
+            )
+            for fallback in settings.get("fallback_configs", [])
+        ]
+    
+    async def _request(self, config: APIConfig, request: Callable[[TranscriptionAPI], Awaitable[Any]],
+                       operation: str, timeout: float,
+                       started: Optional[asyncio.Event] = None,
+                       audio_seconds: Optional[float] = None) -> TranscriptionResult:
+        """レート制御下でAPIを呼び出す（呼び出し毎にタイムアウト、一時的な失敗はバックオフ後に再試行）
+        
+        startedは送信枠を確保して実際に送信を始めた時点でset()される
+        audio_secondsを渡した場合、レイテンシは音声1秒あたりの処理秒数として記録する
+        """
+        api_client = self.create_api_client(config)
+        max_concurrency = self.get_max_concurrency(config)
+        latency_key = (config.provider, operation)
         
+        async def send():
+            if started is not None:
+                started.set()
+            return await self.latency.timed(latency_key, lambda: request(api_client), timeout, audio_seconds)
+        
+        async def attempt():
+            return await self.rate_limiters.call(config, max_concurrency, send)
+        
+        return await self.retry_policy.run(attempt, f"{config.provider} {operation}")
+    
+    async def _request_with_hedge(self, config: APIConfig, hedge_config: Optional[APIConfig],
+                                  request: Callable[[TranscriptionAPI], Awaitable[Any]],
+                                  operation: str, timeout: float,
+                                  audio_seconds: Optional[float] = None,
+                                  on_hedge: Optional[Callable[[], None]] = None) -> TranscriptionResult:
+        """送信開始から直近のp95レイテンシ（音声長に比例）を超えても終わらなければhedge_configにも同じリクエストを送る
+        
+        p95は送信枠内の所要時間のため、枠待ちの時間は計測に含めない（同時ヘッジ数はhedge_budgetで制限）
+        """
+        with self.hedge_budget.track():
+            delay = self.latency.hedge_delay((config.provider, operation), audio_seconds) if hedge_config else None
+            if delay is None:
+                return await self._request(config, request, operation, timeout, audio_seconds=audio_seconds)
+            
+            started = asyncio.Event()
+            
+            async def send_hedge():
+                if on_hedge is not None:
+                    on_hedge()
+                return await self._request(hedge_config, request, operation, timeout, audio_seconds=audio_seconds)
+            
+            return await hedge(
+                lambda: self._request(config, request, operation, timeout, started=started, audio_seconds=audio_seconds),
+                send_hedge,
+                delay,
+                started=started,
+                budget=self.hedge_budget
+            )
+    
+    async def _request_with_fallback(self, configs: List[APIConfig],
+                                     request: Callable[[TranscriptionAPI], Awaitable[Any]],
+                                     operation: str, timeout: float,
+                                     audio_seconds: Optional[float] = None) -> TranscriptionResult:
+        """先頭の設定から順に試行（HEDGED_OPERATIONSの操作は次の設定へヘッジし、ヘッジで失敗済みの設定は飛ばす）"""
         last_error = None
+        remaining = list(configs)
         
-        for i, config in enumerate(configs):
+        while remaining:
+            config = remaining.pop(0)
+            hedge_config = remaining[0] if remaining and operation in HEDGED_OPERATIONS else None
+            hedged = []
             try:
-                self.logger.info(f"Attempting transcription with {config.provider} (attempt {i+1})")
-                
-                api_client = self.create_api_client(config)
-                result = await api_client.transcribe(audio_path)
-                
-                self.logger.info(f"Transcription successful with {config.provider}")
-                return result
-                
+                return await self._request_with_hedge(
+                    config, hedge_config, request, operation, timeout, audio_seconds,
+                    on_hedge=lambda: hedged.append(hedge_config)
+                )
             except Exception as e:
                 last_error = e
-                self.logger.warning(f"Transcription failed with {config.provider}: {str(e)}")
-                
-                if i < len(configs) - 1:
-                    self.logger.info(f"Trying fallback provider...")
-                    continue
+                self.logger.warning(f"{operation} failed with {config.provider}: {str(e)}")
+                if hedged:
+                    # ヘッジ先も同じリクエストで失敗しているため、フォールバックとして再度呼び出さない
+                    self.logger.warning(f"{operation} also failed with hedge provider {hedge_config.provider}")
+                    remaining.pop(0)
+                if remaining:
+                    self.logger.info(f"Trying fallback provider {remaining[0].provider}...")
+        
+        raise last_error
+    
+    async def transcribe_segment(self, audio_source: AudioSource, start_time: float,
+                                 end_time: float, config: APIConfig) -> TranscriptionResult:
+        """単一セグメントの文字起こし（再試行・ヘッジ・フォールバック付き）"""
+        return await self._request_with_fallback(
+            [config] + self.get_fallback_configs(config),
+            lambda api_client: api_client.transcribe_segment(audio_source, start_time, end_time),
+            "segment",
+            SEGMENT_TIMEOUT_SECONDS,
+            audio_seconds=max(end_time - start_time, 0.0)
+        )
+    
+    async def transcribe_with_fallback(self, audio_path: str, 
+                                     primary_config: APIConfig,
+                                     fallback_configs: List[APIConfig] = None) -> TranscriptionResult:
+        """フォールバック付き音声認識（未指定ならsettings["fallback_configs"]を使用）"""
+        if fallback_configs is None:
+            fallback_configs = self.get_fallback_configs(primary_config)
+        configs = [primary_config] + list(fallback_configs)
+        
+        try:
+            self.logger.info(f"Attempting transcription with {primary_config.provider}")
+            result = await self._request_with_fallback(
+                configs,
+                lambda api_client: api_client.transcribe(audio_path),
+                "file",
+                FILE_TIMEOUT_SECONDS
+            )
+            self.logger.info(f"Transcription successful with {result.provider}")
+            return result
         
-        # 全てのプロバイダーで失敗
-        raise Exception(f"All transcription providers failed. Last error: {str(last_error)}")
+        except Exception as e:
+            # 全てのプロバイダーで失敗
+            raise Exception(f"All transcription providers failed. Last error: {str(e)}")
     
-    async def transcribe_segments_batch(self, audio_path: str, 
+    async def transcribe_segments_batch(self, audio_source: AudioSource, 
                                       segments: List[Dict[str, float]],
-                                      config: APIConfig,
-                                      batch_size: int = 5) -> List[TranscriptionResult]:
-        """セグメントのバッチ文字起こし"""
-        api_client = self.create_api_client(config)
-        results = []
+                                      config: APIConfig) -> List[TranscriptionResult]:
+        """セグメントのバッチ文字起こし
         
-        # バッチ処理
-        for i in range(0, len(segments), batch_size):
-            batch = segments[i:i + batch_size]
-            
-            # 並列実行
-            tasks = [
-                api_client.transcribe_segment(
-                    audio_path, seg["start"], seg["end"]
-                )
-                for seg in batch
-            ]
-            
-            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            for j, result in enumerate(batch_results):
-                if isinstance(result, Exception):
-                    self.logger.error(f"Segment {i+j} transcription failed: {str(result)}")
-                    # エラーセグメントには空の結果を追加
-                    results.append(TranscriptionResult(
-                        text="[転写エラー]",
-                        confidence=0.0,
-                        segments=[],
-                        language=config.language,
-                        processing_time=0.0,
-                        provider=config.provider,
-                        model=config.model
-                    ))
-                else:
-                    results.append(result)
+        固定長の波ではなく、レート制御の枠が空き次第次のセグメントを送信する（スライディングウィンドウ）
+        """
+        batch_results = await asyncio.gather(*[
+            self.transcribe_segment(audio_source, seg["start"], seg["end"], config)
+            for seg in segments
+        ], return_exceptions=True)
+        
+        results = []
+        for i, result in enumerate(batch_results):
+            if isinstance(result, Exception):
+                self.logger.error(f"Segment {i} transcription failed: {str(result)}")
+                # エラーセグメントには空の結果を追加
+                results.append(TranscriptionResult(
+                    text="[転写エラー]",
+                    confidence=0.0,
+                    segments=[],
+                    language=config.language,
+                    processing_time=0.0,
+                    provider=config.provider,
+                    model=config.model
+                ))
+            else:
+                results.append(result)
         
         return results
     
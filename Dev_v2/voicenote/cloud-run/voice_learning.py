@@ -4,16 +4,18 @@
 """
 
 import os
+import base64
 import logging
 import numpy as np
 from typing import Dict, Any, List, Optional
 import librosa
 import torch
-from pyannote.audio import Model
-from pyannote.audio.pipelines.speaker_verification import PretrainedSpeakerEmbedding
 from google.cloud import firestore, storage
 import tempfile
 
+from model_registry import model_registry, segment_embedding_key, SEGMENT_EMBEDDING_MODEL
+from speaker_identification import reference_embedding, user_embedding_from_profile
+
 logger = logging.getLogger(__name__)
 
 class VoiceLearningService:
@@ -27,14 +29,23 @@ class VoiceLearningService:
         # Storage クライアント
         self.storage_client = storage.Client()
         
-        # Speaker embedding モデル
-        self.embedding_model = PretrainedSpeakerEmbedding(
-            "speechbrain/spkrec-ecapa-voxceleb",
-            device=torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        )
+        # Speaker embedding モデル（話者分離の重心と同じ埋め込み空間で照合するため、セグメント埋め込みモデルを共有）
+        self.embedding_key = segment_embedding_key("cuda" if torch.cuda.is_available() else "cpu")
         
         logger.info("VoiceLearningService initialized")
     
+    @property
+    def embedding_model(self):
+        """話者埋め込みモデル"""
+        model = model_registry.get(self.embedding_key)
+        if model is None:
+            raise RuntimeError("Speaker embedding model is unavailable")
+        return model
+    
+    async def initialize(self):
+        """埋め込みモデルの読み込み（読み込み済みなら何もしない）"""
+        await model_registry.warm_up([self.embedding_key])
+    
     async def extract_user_embedding(
         self, 
         audio_path: str, 
@@ -44,6 +55,7 @@ class VoiceLearningService:
         """ユーザー音声からembeddingを抽出"""
         try:
             logger.info(f"Extracting user embedding for user_id: {user_id}")
+            await self.initialize()
             
             # 音声読み込み
             audio, sr = librosa.load(audio_path, sr=16000)
@@ -81,6 +93,24 @@ class VoiceLearningService:
             logger.error(f"User embedding extraction failed: {e}")
             raise
     
+    async def process_learning_audio(
+        self,
+        user_id: str,
+        audio_data: str,
+        session_id: str
+    ) -> Dict[str, Any]:
+        """Base64エンコードされた学習音声からユーザーembeddingを抽出・更新"""
+        with tempfile.NamedTemporaryFile(suffix=".audio", delete=False) as tmp_file:
+            tmp_file.write(base64.b64decode(audio_data))
+        
+        try:
+            result = await self.extract_user_embedding(tmp_file.name, user_id)
+        finally:
+            os.unlink(tmp_file.name)
+        
+        result["session_id"] = session_id
+        return result
+    
     async def compare_speaker_with_user(
         self, 
         speaker_embedding: np.ndarray, 
@@ -144,20 +174,21 @@ class VoiceLearningService:
             raise
     
     def _extract_embedding(self, audio: np.ndarray, sr: int) -> np.ndarray:
-        """音声からembeddingを抽出"""
+        """音声からembeddingを抽出（話者重心と同様に区間毎の埋め込みを平均）"""
         try:
-            # 一時ファイルに保存
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-                import soundfile as sf
-                sf.write(tmp_file.name, audio, sr)
-                
-                # Embedding抽出
-                embedding = self.embedding_model(tmp_file.name)
-                
-                # 一時ファイル削除
-                os.unlink(tmp_file.name)
-                
-                return embedding.detach().cpu().numpy()
+            window_seconds = self.embedding_model.max_segment_seconds
+            duration = len(audio) / sr
+            spans = [
+                (start, min(start + window_seconds, duration))
+                for start in np.arange(0.0, duration, window_seconds)
+            ]
+            
+            waveform = torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32)).unsqueeze(0)
+            embedding = reference_embedding(self.embedding_model.extract(waveform, sr, spans))
+            if embedding is None:
+                raise ValueError("Audio is too short to compute a speaker embedding")
+            
+            return embedding
                 
         except Exception as e:
             logger.error(f"Embedding extraction failed: {e}")
@@ -259,7 +290,8 @@ class VoiceLearningService:
             doc_ref = self.db.collection('userEmbeddings').document(user_id)
             doc = doc_ref.get()
             
-            if doc.exists:
+            # 旧モデルのプロファイルは統合せず置き換える（再登録）
+            if doc.exists and user_embedding_from_profile(doc.to_dict(), user_id) is not None:
                 # 既存データ更新
                 data = doc.to_dict()
                 audio_count = data.get('audio_count', 0) + 1
@@ -271,6 +303,8 @@ class VoiceLearningService:
             
             doc_ref.set({
                 'embedding': embedding.tolist(),
+                'embeddingModel': SEGMENT_EMBEDDING_MODEL,
+                'embeddingDim': len(embedding),
                 'quality_score': avg_quality,
                 'audio_count': audio_count,
                 'lastUpdated': firestore.SERVER_TIMESTAMP
@@ -289,8 +323,8 @@ class VoiceLearningService:
             doc = doc_ref.get()
             
             if doc.exists:
-                data = doc.to_dict()
-                embedding_list = data.get('embedding')
+                # 話者重心と異なるモデルで登録された旧プロファイルは使わない
+                embedding_list = user_embedding_from_profile(doc.to_dict(), user_id)
                 if embedding_list:
                     return np.array(embedding_list)
             
@@ -332,7 +366,16 @@ class VoiceLearningService:
             doc_ref = self.db.collection('userEmbeddings').document(user_id)
             doc = doc_ref.get()
             
-            if doc.exists:
+            if doc.exists and user_embedding_from_profile(doc.to_dict(), user_id) is None:
+                # 旧モデルのプロファイル（次回の音声学習で置き換える）
+                return {
+                    "has_embedding": False,
+                    "needs_reenrollment": True,
+                    "audio_count": 0,
+                    "quality_score": 0,
+                    "status": "reenrollment_required"
+                }
+            elif doc.exists:
                 data = doc.to_dict()
                 return {
                     "has_embedding": True,